@@ -8,134 +8,389 @@
 # -------------------------------------------------------------------------------
 import urllib.request, urllib.parse, urllib.error
 import urllib.request, urllib.error, urllib.parse
+import datetime as DT
 import json
 import time
 import gzip
 import os
+import pickle
+import shutil
 import sys
+import threading
 import numpy as np
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 __author__ = 'k5opjakk'
 
 
-def download_survey(objectid, survey_filename, save_path):
+taskURL = "http://gis.sam.usace.army.mil/server/rest/services/FRF/DownloadSourceData/" \
+          "GPServer/Download%20Source%20Data"
+
+
+def _getJSON(url, data=None):
+    """Opens url (POST if data is given) and loads the json response"""
+    if data is not None:
+        data = urllib.parse.urlencode(data).encode()
+    with urllib.request.urlopen(url, data, timeout=60) as response:
+        return json.loads(response.read().decode())
+
+
+def _atomicCopy(stream, fname, chunkSize=1 << 20):
+    """Copies a stream into fname in chunks, through a temporary file that is renamed when complete"""
+    tmpName = fname + '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+    with open(tmpName, 'wb') as fid:
+        shutil.copyfileobj(stream, fid, chunkSize)
+    os.replace(tmpName, fname)
+
+
+def _unpackSurvey(zipName, outName, chunkSize=1 << 20):
+    """Streams the (gzipped) survey file in the zip archive straight into outName, with constant memory"""
+    with zipfile.ZipFile(zipName, 'r') as z:
+        with z.open(z.namelist()[0]) as zipped:
+            if zipped.peek(2)[:2] == b'\x1f\x8b':  # gzip inside of the zip
+                with gzip.GzipFile(fileobj=zipped, mode='rb') as unzipped:
+                    _atomicCopy(unzipped, outName, chunkSize)
+            else:
+                _atomicCopy(zipped, outName, chunkSize)
+
+
+def download_survey(objectid, survey_filename, save_path, task_url=taskURL, maxPollInterval=30):
     """Downloads the survey data extracts file to specified folder location
 
+    The job is polled with intervals that start short and double up to maxPollInterval, the result is downloaded in
+    chunks and unpacked as a stream (zip -> gzip -> file), so large surveys are never held in memory.
+
     Args:
       objectid: objectid of survey to download
       survey_filename: filename of survey
       save_path: folder path to save file
+      task_url: url of the Download Source Data geoprocessing task (Default value = taskURL)
+      maxPollInterval: longest wait between checks of the job status in seconds (Default value = 30)
 
     Returns:
       path to downloaded survey file
 
+    Raises:
+      IOError: when the job can not be submitted (the service is down)
+
     """
-    task_url = "http://gis.sam.usace.army.mil/server/rest/services/FRF/DownloadSourceData/" \
-               "GPServer/Download%20Source%20Data"
-    submit_url = task_url + "/submitJob"
     try:
-        urllib.request.urlopen(submit_url)
-    except:
-        sys.exit('Service is down, please try again later')
-    data = {'objectid': objectid, 'f': 'pjson'}
-    submit_response = urllib.request.urlopen(submit_url, urllib.parse.urlencode(data))
-    submit_json = json.loads(submit_response.read())
-    if 'jobId' in submit_json:
-        job_id = submit_json['jobId']
-        status = submit_json['jobStatus']
-        job_url = task_url + "/jobs/" + job_id
-
-        while status == "esriJobSubmitted" or status == "esriJobExecuting":
-            print("checking to see if job is completed...")
-            time.sleep(4)
-
-            job_response = urllib.request.urlopen(job_url, "f=json")
-            job_json = json.loads(job_response.read())
-
-            if 'jobStatus' in job_json:
-                status = job_json['jobStatus']
-
-                if status == "esriJobSucceeded":
-                        if 'results' in job_json:
-                            results_url = job_url + "/results/"
-                            results_json = job_json['results']
-                            for param_name in list(results_json.keys()):
-                                result_url = results_url + param_name
-                                result_response = urllib.request.urlopen(result_url, "f=json")
-                                result_json = json.loads(result_response.read())
-                                # print result_json
-                                urllib.request.urlretrieve(result_json['value']['url'],
-                                                   os.path.join(save_path, survey_filename + '.zip'))
-                            z = zipfile.ZipFile(os.path.join(save_path, survey_filename + '.zip'), 'r')
-                            gzip_file = z.namelist()[0]
-                            z.extractall(save_path)
-                            z.close()
-                            in_file = gzip.GzipFile(os.path.join(save_path, gzip_file), 'rb')
-                            s = in_file.read()
-                            in_file.close()
-                            out_file = file(os.path.join(save_path, survey_filename), 'wb')
-                            out_file.write(s)
-                            out_file.close()
-                            os.remove(os.path.join(save_path, survey_filename + '.zip'))
-                            os.remove(os.path.join(save_path, gzip_file))
-                            print(("File located here: {}".format(os.path.join(save_path, survey_filename))))
-                            return os.path.join(save_path, survey_filename)
-
-                if status == "esriJobFailed":
-                        if 'messages' in job_json:
-                            print("Job Failed")
-                            raise SystemError('Esri Server Down, Contact Mobile Alabama 1-800-USACE-Mobile')
-                            #  print job_json['messages']
-    else:
+        submit_json = _getJSON(task_url + "/submitJob", {'objectid': objectid, 'f': 'pjson'})
+    except (urllib.error.URLError, ValueError):
+        raise IOError('Service is down, please try again later')
+    if 'jobId' not in submit_json:
         print("no jobId found in the response")
+        return None
+    job_url = task_url + "/jobs/" + submit_json['jobId']
+    job_json = submit_json
+    status = submit_json.get('jobStatus')
+    wait = 0.5
+    while status in ("esriJobNew", "esriJobSubmitted", "esriJobWaiting", "esriJobExecuting"):
+        print("checking to see if job is completed...")
+        time.sleep(wait)
+        wait = min(wait * 2, maxPollInterval)
+        job_json = _getJSON(job_url + "?f=json")
+        status = job_json.get('jobStatus', status)
+
+    if status == "esriJobFailed":
+        print("Job Failed")
+        raise SystemError('Esri Server Down, Contact Mobile Alabama 1-800-USACE-Mobile')
+    if status != "esriJobSucceeded" or 'results' not in job_json:
+        print("Job finished with status %s and no results" % status)
+        return None
+    zipName = os.path.join(save_path, '{}.{}.zip'.format(survey_filename, submit_json['jobId']))  # unique per job
+    for param_name in list(job_json['results'].keys()):
+        result_json = _getJSON(job_url + "/results/" + param_name + "?f=json")
+        with urllib.request.urlopen(result_json['value']['url'], timeout=60) as result_response:
+            _atomicCopy(result_response, zipName)
+    outName = os.path.join(save_path, survey_filename)
+    _unpackSurvey(zipName, outName)
+    os.remove(zipName)
+    print(("File located here: {}".format(outName)))
+    return outName
+
+
+def download_surveys(objectids, survey_filenames, save_path, workers=4, **kwargs):
+    """Downloads several surveys concurrently, see download_survey
+
+    Args:
+      objectids: list of objectids of surveys to download
+      survey_filenames: list of filenames of the surveys
+      save_path: folder path to save files
+      workers: number of surveys handled at once (Default value = 4)
+
+    Keyword Args:
+      passed to download_survey
+
+    Returns:
+      list of paths to the downloaded survey files (None for surveys that could not be downloaded)
+
+    """
+    def _download(objectid, survey_filename):
+        try:
+            return download_survey(objectid, survey_filename, save_path, **kwargs)
+        except (IOError, SystemError) as err:  # one failed survey does not stop the others
+            print('Survey %s was not downloaded: %s' % (survey_filename, err))
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_download, objectid, survey_filename)
+                   for objectid, survey_filename in zip(objectids, survey_filenames)]
+        return [future.result() for future in futures]
+
+
+class surveyCatalog:
+    """Local catalog of the surveys on a FRF survey feature service (object id, survey date and text file name).
+
+    The catalog is kept in a pickle and sorted by survey date.  sync only asks the server for surveys from the newest
+    survey date in the catalog onward (SURVEYDATE >= last, known object ids are skipped), page by page, and time
+    windows are found with a binary search of the sorted dates.
+
+    """
+
+    def __init__(self, service_url, catalogFile=None):
+        """Opens (or starts) the catalog of service_url
+
+        Args:
+          service_url: url to the feature service to query
+          catalogFile: pickle file to keep the catalog in between sessions (Default value = None, memory only)
+
+        """
+        self.service_url = service_url
+        self.catalogFile = catalogFile
+        self.objectid = np.array([], dtype=int)
+        self.survey_filename = np.array([], dtype=object)
+        self.surveydate = np.array([], dtype=float)  # epoch seconds, ascending
+        if catalogFile is not None and os.path.isfile(catalogFile):
+            with open(catalogFile, 'rb') as fid:
+                catalog = pickle.load(fid)
+            if catalog['service_url'] == service_url:
+                self.objectid, self.survey_filename, self.surveydate = catalog['objectid'], \
+                    catalog['survey_filename'], catalog['surveydate']
 
+    def _query(self, where, pageSize):
+        """Runs a query, following the pages of the result"""
+        features, offset = [], 0
+        while True:
+            query = {'where': where,
+                     'outFields': 'OBJECTID, SURVEYDATE, TEXTFILENAME',
+                     'returnIdsOnly': 'false',
+                     'returnGeometry': 'false',
+                     'orderByFields': 'SURVEYDATE ASC, OBJECTID ASC',
+                     'f': 'json'}
+            if pageSize is not None:
+                query.update({'resultOffset': offset, 'resultRecordCount': pageSize})
+            with urllib.request.urlopen(self.service_url + '/query?' + urllib.parse.urlencode(query),
+                                        timeout=60) as response:
+                data = json.loads(response.read().decode())
+            if 'error' in data:
+                raise IOError('survey query failed: %s' % data['error'])
+            page = data.get('features', [])
+            features.extend(page)
+            offset += len(page)
+            if pageSize is None or len(page) == 0 or not data.get('exceededTransferLimit', False):
+                return features
 
-def query_survey_data(service_url, grid_data=True):
+    def sync(self, pageSize=1000):
+        """Adds surveys from the newest survey date in the catalog onward
+
+        Surveys that share the newest date are asked for again, known OBJECTIDs are skipped.
+
+        Args:
+          pageSize: number of surveys asked for in each request, None for servers without pagination
+            (Default value = 1000)
+
+        Returns:
+          number of new surveys
+
+        """
+        where = "SURVEYTYPE = 'GRID'"
+        if self.surveydate.size > 0:
+            last = DT.datetime.fromtimestamp(self.surveydate[-1], DT.timezone.utc)
+            where += " AND SURVEYDATE >= timestamp '%s'" % last.strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            features = self._query(where, pageSize)
+        except urllib.error.URLError:
+            sys.exit('Service is down, please try again later')
+        attributes = [feature['attributes'] for feature in features]
+        known = set(self.objectid.tolist())
+        new = [att for att in attributes if att['OBJECTID'] not in known]
+        if len(new) > 0:
+            objectid = np.append(self.objectid, [att['OBJECTID'] for att in new]).astype(int)
+            survey_filename = np.append(self.survey_filename,
+                                        np.array([att['TEXTFILENAME'] for att in new], dtype=object))
+            surveydate = np.append(self.surveydate, [att['SURVEYDATE'] / 1000. for att in new])
+            order = np.argsort(surveydate, kind='stable')
+            self.objectid, self.survey_filename, self.surveydate = \
+                objectid[order], survey_filename[order], surveydate[order]
+            self.save()
+        return len(new)
+
+    def save(self):
+        """Writes the catalog (write then rename, so other processes never see a partial file)"""
+        if self.catalogFile is None:
+            return
+        folder = os.path.dirname(self.catalogFile)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        tmpName = self.catalogFile + '.{}.tmp'.format(os.getpid())
+        with open(tmpName, 'wb') as fid:
+            pickle.dump({'service_url': self.service_url, 'objectid': self.objectid,
+                         'survey_filename': self.survey_filename, 'surveydate': self.surveydate}, fid)
+        os.replace(tmpName, self.catalogFile)
+
+    def window(self, epochStart, epochEnd):
+        """Indices of the surveys with epochStart <= date < epochEnd"""
+        return np.arange(np.searchsorted(self.surveydate, epochStart, side='left'),
+                         np.searchsorted(self.surveydate, epochEnd, side='left'))
+
+    def latestBefore(self, epoch):
+        """Indices of the most recent surveys before epoch (all surveys on that date), empty if there are none"""
+        ii = np.searchsorted(self.surveydate, epoch, side='left')
+        if ii == 0:
+            return np.array([], dtype=int)
+        return self.window(self.surveydate[ii - 1], self.surveydate[ii - 1] + 1e-3)
+
+    def nearest(self, epoch):
+        """Index of the survey closest in time to epoch"""
+        ii = np.searchsorted(self.surveydate, epoch)
+        candidates = [jj for jj in (ii - 1, ii) if 0 <= jj < self.surveydate.size]
+        return min(candidates, key=lambda jj: abs(self.surveydate[jj] - epoch))
+
+
+def query_survey_data(service_url, grid_data=True, catalogFile=None):
     """Returns the objectid, survey_filename of the most recent survey GRID
 
+    Surveys are taken from a surveyCatalog, that only asks the server for the surveys it does not have yet.
+
     Args:
       service_url: url to the service to query
       grid_data:  (Default value = True)
+      catalogFile: pickle file to keep the catalog in between sessions (Default value = None)
 
     Returns:
-      type: number, objectid; type: string, filename
+      type: number, objectid; type: string, filename (most recent first)
 
     """
-    try:
-        urllib.request.urlopen(service_url)
-    except:
-        sys.exit('Service is down, please try again later')
-
-    rest_operation = {
-        'query': service_url + '/query?',
-        'identify': service_url + '/identify?'
-    }
-
-    parameters = urllib.parse.urlencode({
-        'where': """SURVEYTYPE = 'GRID'""",
-        'geometry': '',
-        'geometryType': '',
-        'inSR': '',
-        'spatialRel': '',
-        'outFields': 'OBJECTID, SURVEYDATE, TEXTFILENAME',
-        'returnIdsOnly': 'false',
-        'returnGeometry': 'false',
-        'orderByFields': 'SURVEYDATE DESC',
-        'f': 'json'
-    })
-    query_url = urllib.request.urlopen(rest_operation['query'] + parameters) # this was comma'd
-    data = json.load(query_url)
-    survey_filename, objectid, surveydate = [], [], []
-    for i in range(0, len(data['features'])):
-        survey_filename.append( data['features'][i]['attributes']['TEXTFILENAME'])
-        objectid.append(data['features'][i]['attributes']['OBJECTID'])
-        surveydate.append(data['features'][i]['attributes']['SURVEYDATE']/1000)
-    # turn surveydate into numpy array
-    surveydate = np.array(surveydate)
+    catalog = surveyCatalog(service_url, catalogFile=catalogFile)
+    catalog.sync()
+    objectid = catalog.objectid[::-1].tolist()
+    survey_filename = catalog.survey_filename[::-1].tolist()
+    surveydate = catalog.surveydate[::-1]
 
     return objectid, survey_filename, surveydate
 
+
+def _isNumber(token):
+    """True if the text token is a number"""
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
+
+
+def read_survey_file(survey_file, sidecar=True, chunkSize=1 << 24):
+    """Reads a survey text file (as written by download_survey) into typed columns
+
+    The data start at the first line that is followed by a line with numbers in the same columns, lines before it are
+    header lines (a header line may hold a number, eg. a year) and the last one with a name for each column gives the
+    column names.  Columns may be separated with white space or commas.  All numeric files are parsed in blocks of chunkSize
+    bytes with one np.fromstring call per block, files with text columns are parsed in chunks with the pandas C
+    parser.  The columns are kept in a binary sidecar (survey_file + '.npy', a structured array), so later reads of
+    the same survey are a memory map of the sidecar instead of a text parse.
+
+    Args:
+      survey_file: path to the survey text file
+      sidecar: write/read the binary sidecar (Default value = True)
+      chunkSize: number of bytes parsed at once (Default value = 16 MB)
+
+    Returns:
+      dictionary of column arrays keyed by column name (views of the memory-mapped sidecar when it is used)
+
+    Raises:
+      ValueError: when the file has no data lines (empty or header only)
+
+    """
+    sidecarFile = survey_file + '.npy'
+    if sidecar and os.path.isfile(sidecarFile) and os.path.getmtime(sidecarFile) >= os.path.getmtime(survey_file):
+        table = np.load(sidecarFile, mmap_mode='r')
+        return {name: table[name] for name in table.dtype.names}
+
+    # find the header, the delimiter and the number of columns from the first lines
+    header, first = None, None  # first: (line number, tokens, delimiter) of the line the data might start on
+    with open(survey_file, 'r') as fid:
+        for lineNumber, line in enumerate(fid):
+            if len(line.strip()) == 0:
+                continue
+            delimiter = ',' if ',' in line else None
+            tokens = [token.strip() for token in line.strip().split(delimiter)]
+            numbers = [_isNumber(token) for token in tokens]
+            if first is not None and numbers == [_isNumber(token) for token in first[1]]:
+                break  # numbers in the same columns on the next line, the data start at first
+            if first is not None:  # it was a header line with a number in it
+                header, first = first[1], None
+            if any(numbers):
+                first = (lineNumber, tokens, delimiter)
+            else:
+                header = tokens
+    if first is None:
+        raise ValueError('%s has no data lines' % survey_file)
+    headerLines, tokens, delimiter = first
+    nCols = len(tokens)
+    names = header if header is not None and len(header) == nCols else ['col%d' % ii for ii in range(nCols)]
+    names = [name.replace(' ', '_') or 'col%d' % ii for ii, name in enumerate(names)]
+    numeric = all(_isNumber(token) for token in tokens)
+
+    if numeric:  # bulk parse blocks of text straight to floats
+        blocks = []
+        with open(survey_file, 'rb') as fid:
+            for _ in range(headerLines):
+                fid.readline()
+            remainder = b''
+            while True:
+                chunk = fid.read(chunkSize)
+                text = remainder + chunk
+                if len(chunk) > 0:
+                    cut = text.rfind(b'\n') + 1
+                    text, remainder = text[:cut], text[cut:]
+                if delimiter == ',':
+                    text = text.replace(b',', b' ')
+                if len(text) > 0:
+                    blocks.append(np.fromstring(text.decode('ascii'), sep=' '))
+                if len(chunk) == 0:
+                    break
+        values = np.concatenate(blocks) if len(blocks) > 0 else np.array([])
+        assert values.size % nCols == 0, '%s has rows with missing values' % survey_file
+        values = values.reshape(-1, nCols)
+        table = np.empty(values.shape[0], dtype=[(name, 'f8') for name in names])
+        for ii, name in enumerate(names):
+            table[name] = values[:, ii]
+    else:  # text columns (eg. locality, date), chunked parsing with the pandas C parser
+        import pandas as pd
+        reader = pd.read_csv(survey_file, sep=',' if delimiter == ',' else r'\s+', skiprows=headerLines,
+                             header=None, names=names, chunksize=max(chunkSize // 100, 1000), engine='c')
+        frame = pd.concat(list(reader), ignore_index=True)
+        columns = {}
+        for name in names:
+            if pd.api.types.is_numeric_dtype(frame[name]):
+                columns[name] = frame[name].to_numpy()
+            else:  # fixed width strings, so the column can be memory-mapped
+                columns[name] = np.asarray(frame[name].to_numpy(), dtype=str)
+        table = np.empty(len(frame), dtype=[(name, columns[name].dtype.str) for name in names])
+        for name in names:
+            table[name] = columns[name]
+
+    if sidecar:
+        tmpName = sidecarFile + '.{}.tmp'.format(os.getpid())
+        with open(tmpName, 'wb') as fid:
+            np.save(fid, table)
+        os.replace(tmpName, sidecarFile)
+        table = np.load(sidecarFile, mmap_mode='r')
+    return {name: table[name] for name in table.dtype.names}
+
+
 if __name__ == '__main__':
     objectid, survey_filename, surveydate = query_survey_data(
         service_url='http://gis.sam.usace.army.mil/server/rest/services/FRF/FRF/FeatureServer/4')
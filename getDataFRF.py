@@ -11,6 +11,7 @@ This is a class definition designed to get data from the FRF thredds server
 """
 import datetime as DT
 import warnings, os, collections, time
+from concurrent.futures import ProcessPoolExecutor
 import netCDF4 as nc
 import numpy as np
 import pandas as pd
@@ -18,6 +19,7 @@ from testbedutils import sblib as sb
 from testbedutils import geoprocess as gp
 import pickle as pickle
 from posixpath import join as urljoin
+from getdatatestbed import instruments
 
 def gettime(allEpoch, epochStart, epochEnd):
     """this function opens the netcdf file, pulls down all of the time, then pulls the dates of interest
@@ -155,8 +157,8 @@ def removeDuplicatesFromDictionary(inputDict):
         else:
             raise NotImplementedError ('Requires keys "time" or "epochtime"')
 
-        if isinstance(inputDict[key], Iterable) and np.size(set(np.array(inputDict[key]))) != np.size(inputDict[key]):  # there's duplicate times in dictionary
-            print(' Removing Duplicates from {}'.format(inputDict['name'])) # find the duplicates
+        if isinstance(inputDict[key], Iterable) and len(set(np.array(inputDict[key]))) != np.size(inputDict[key]):  # there's duplicate times in dictionary
+            print(' Removing Duplicates from {}'.format(inputDict.get('name', key))) # find the duplicates
             _, idxUnique = np.unique(inputDict[key], return_index=True)
             inputDict = sb.reduceDict(inputDict, idxUnique)
             # try:  # python 3.6 + only
@@ -173,6 +175,281 @@ def removeDuplicatesFromDictionary(inputDict):
             # inputDict = sb.reduceDict(inputDict, idxObs)
     return inputDict
 
+
+def getBoundsSlice(coordinates, bounds=None):
+    """Converts a pair of coordinate bounds into a slice along a monotonic 1D coordinate axis.
+
+    The slice is inclusive of the nodes just outside of the bounds, so the returned window always covers the
+    requested bounds (following the xbounds/ybounds logic used through out the getters).
+
+    Args:
+        coordinates (array): 1D coordinate array (eg. xFRF, yFRF) as already pulled from the server
+        bounds (list): [min, max] bounds in the same units as coordinates, if None or not of size 2 the
+            whole axis is returned (default=None)
+
+    Returns:
+        slice: indices along the axis of coordinates that cover the bounds
+
+    """
+    if bounds is None or np.array(bounds).size != 2:
+        return slice(None)
+    bounds = np.sort(np.array(bounds).squeeze())
+    coordinates = np.array(coordinates)
+    if (bounds[0] < coordinates).all():
+        removeMin = 0  # get all data from the start of the axis
+    else:  # <= used here to handle inclusive initial index inherant in python
+        removeMin = np.argwhere(coordinates <= bounds[0]).squeeze().max()
+    if (bounds[1] > coordinates).all():
+        removeMax = None
+    else:
+        removeMax = np.argwhere(coordinates >= bounds[1]).squeeze().min() + 1  # python indexing
+    return slice(int(removeMin), removeMax if removeMax is None else int(removeMax))
+
+
+def getValidDataWindow(maskedData, window=(slice(None), slice(None))):
+    """Finds the smallest [y, x] window that contains all of the un-masked data in a 2D grid.
+
+    Args:
+        maskedData (np.ma.MaskedArray): 2D grid [y, x], as read from the server with window
+        window (tuple): (ys, xs) slices that maskedData was read with, used to return indices that are
+            relative to the full grid on the server (default is the whole grid)
+
+    Returns:
+        tuple: (ys, xs) slices on the full grid, None if all data are masked
+
+    """
+    validData = ~np.ma.getmaskarray(maskedData)
+    if not validData.any():
+        return None
+    rows = np.flatnonzero(validData.any(axis=1))
+    cols = np.flatnonzero(validData.any(axis=0))
+    y0 = window[0].start or 0
+    x0 = window[1].start or 0
+    return (slice(int(y0 + rows[0]), int(y0 + rows[-1] + 1)), slice(int(x0 + cols[0]), int(x0 + cols[-1] + 1)))
+
+
+def combineSlices(outer, inner):
+    """Intersects two slices with unit step that index the same axis
+
+    Args:
+        outer (slice): first slice (eg. from xbounds/ybounds)
+        inner (slice): second slice (eg. from a valid data window)
+
+    Returns:
+        slice: the overlap of the two slices
+
+    """
+    start = max(outer.start or 0, inner.start or 0)
+    stops = [s.stop for s in (outer, inner) if s.stop is not None]
+    stop = min(stops) if len(stops) > 0 else None
+    if stop is not None:
+        stop = max(stop, start)
+    return slice(start, stop)
+
+
+def readPointColumns(ncVar, tIdx, yIdx, xIdx, chunkSize=500):
+    """Reads the time series of a handful of [y, x] nodes of a [t, y, x] variable without pulling whole grids
+
+    Nodes are grouped by row (y index) and the columns needed on each row are grouped into contiguous runs, so each
+    server request is one slice of a row and a block of chunkSize contiguous times.
+
+    Args:
+        ncVar (netCDF4.Variable): variable dimensioned [t, y, x]
+        tIdx (array): sorted, contiguous time indices of interest
+        yIdx (array): row index of each node
+        xIdx (array): column index of each node
+        chunkSize (int): number of times pulled with each request (default=500)
+
+    Returns:
+        masked array [time, node]
+
+    """
+    tIdx, yIdx, xIdx = np.atleast_1d(tIdx), np.atleast_1d(yIdx), np.atleast_1d(xIdx)
+    out = np.ma.masked_all((tIdx.size, xIdx.size), dtype=float)
+    for t0 in range(0, tIdx.size, chunkSize):
+        tSlice = slice(int(tIdx[t0]), int(tIdx[min(t0 + chunkSize, tIdx.size) - 1]) + 1)
+        for jj in np.unique(yIdx):
+            onRow = np.flatnonzero(yIdx == jj)
+            cols, inverse = np.unique(xIdx[onRow], return_inverse=True)
+            runs = np.split(cols, np.flatnonzero(np.diff(cols) != 1) + 1)
+            data = np.ma.concatenate([np.ma.asarray(ncVar[tSlice, int(jj), int(run[0]):int(run[-1]) + 1])
+                                      for run in runs], axis=1)
+            out[t0:t0 + data.shape[0], onRow] = data[:, inverse]
+    return out
+
+
+def _readBlocks(fname, var, requests):
+    """Reads a group of blocks of readTimeBlocks in a worker process, through one dataset that is closed when done
+
+    Args:
+        fname (str): url (or file name) of the netCDF file
+        var (str): variable name
+        requests (list): indices of each block
+
+    Returns:
+        list of (data, mask) arrays of each block
+
+    """
+    out = []
+    with nc.Dataset(fname) as ncfile:
+        for request in requests:
+            blockData = ncfile[var][request]
+            out.append((np.ma.getdata(blockData), np.ma.getmaskarray(blockData)))
+    return out
+
+
+def readTimeBlocks(fname, var, idx, window=(), blockSize=100, workers=1, ncfile=None):
+    """Reads a [t, ...] variable over many time steps into an output array that is sized before any data are read
+
+    The time steps are pulled in blocks of blockSize (one request per block, contiguous blocks are requested as a
+    slice), and each block is put into its own slice of the output, so long records are not grown with np.append.
+    With workers > 1 the blocks are split between worker processes that each open (and close) their own connection
+    to fname, the netCDF library is not thread safe so threads can not be used here.  Scripts that use workers need an
+    if __name__ == '__main__' guard on platforms that spawn processes (macOS, Windows).
+
+    Args:
+        fname (str): url (or file name) of the netCDF file
+        var (str): variable name, time is the first dimension
+        idx (array): sorted time indices of interest
+        window (tuple): indices of the other dimensions (slices or ints), applied in the request (default=())
+        blockSize (int): number of time steps per request (default=100)
+        workers (int): number of worker processes, 1 reads all blocks through ncfile in this process (default=1)
+        ncfile (netCDF4.Dataset): already open dataset (default=None, opens fname)
+
+    Returns:
+        masked array [time, ...] of var
+
+    """
+    idx = np.atleast_1d(idx)
+    opened = ncfile is None
+    if opened:
+        ncfile = nc.Dataset(fname)
+    window = tuple(window)
+    blocks = [idx[b0:b0 + blockSize] for b0 in range(0, idx.size, blockSize)]
+
+    def _request(block):
+        if block[-1] - block[0] + 1 == block.size:  # contiguous times
+            return (slice(int(block[0]), int(block[-1]) + 1),) + window
+        return (block.tolist(),) + window
+
+    try:
+        first = ncfile[var][_request(blocks[0])]
+        data = np.empty((idx.size,) + first.shape[1:], dtype=first.dtype)
+        mask = np.zeros(data.shape, dtype=bool)
+        data[:blocks[0].size], mask[:blocks[0].size] = np.ma.getdata(first), np.ma.getmaskarray(first)
+
+        if len(blocks) > 1 and workers > 1:
+            nGroups = min(workers, len(blocks) - 1)
+            groups = [list(range(1, len(blocks)))[gg::nGroups] for gg in range(nGroups)]
+            with ProcessPoolExecutor(max_workers=nGroups) as pool:
+                futures = [pool.submit(_readBlocks, fname, var, [_request(blocks[bb]) for bb in group])
+                           for group in groups]
+                for group, future in zip(groups, futures):
+                    for bb, (blockData, blockMask) in zip(group, future.result()):
+                        b0 = bb * blockSize
+                        data[b0:b0 + blocks[bb].size], mask[b0:b0 + blocks[bb].size] = blockData, blockMask
+        else:
+            for bb in range(1, len(blocks)):
+                b0 = bb * blockSize
+                blockData = ncfile[var][_request(blocks[bb])]
+                data[b0:b0 + blocks[bb].size] = np.ma.getdata(blockData)
+                mask[b0:b0 + blocks[bb].size] = np.ma.getmaskarray(blockData)
+    finally:
+        if opened:
+            ncfile.close()
+    return np.ma.array(data, mask=mask, copy=False)
+
+
+def _readModelFieldWorker(start, end, THREDDS, fname, varList, prefix, local, ijLoc, model, kwargs):
+    """Reads the fields of one model run in a worker process for getDataTestBed.getModelFields"""
+    return getDataTestBed(start, end, THREDDS=THREDDS)._readModelField(fname, varList, prefix, local=local, ijLoc=ijLoc,
+                                                                      model=model, **kwargs)
+
+
+_bathyDuckGauges = ['11', '12', '13', '14', '21', '22', '23', '24']
+
+
+def _gaugeLocationWorker(start, end, THREDDS, gauge):
+    """Reads the lat/lon of one gauge (metadata only) for getObs.get_sensor_locations_from_thredds, None if the gauge
+    is not on the server"""
+    go = getObs(start, end, THREDDS=THREDDS)
+    try:
+        if gauge in _bathyDuckGauges:
+            latlon = go.getBathyDuckLoc(gaugenumber=gauge)
+        else:
+            latlon = go.getWaveGaugeLoc(gauge)
+    except IOError:
+        return None
+    # lat and lon values currently stored as 1 element arrays.
+    return float(np.ravel(latlon['Lat'])[0]), float(np.ravel(latlon['Lon'])[0])
+
+
+def rgb2gray(rgb, out=None):
+    """Converts RGB images to grayscale with the same luminance weights as skimage.color.rgb2gray
+
+    Args:
+        rgb (array): images with the color channel as the last dimension [..., 3], integer images are scaled to [0, 1]
+        out (array): float64 array with the shape of rgb[..., 0] to put the result in (default=None, allocates one)
+
+    Returns:
+        grayscale images [...]
+
+    """
+    rgb = np.ma.getdata(rgb)
+    weights = np.array([0.2125, 0.7154, 0.0721])
+    gray = np.dot(rgb[..., :3], weights, out=out)
+    if np.issubdtype(rgb.dtype, np.integer):
+        gray /= np.iinfo(rgb.dtype).max
+    return gray
+
+
+_validWindowCache = {}  # valid data windows of gridded products, keyed by server, dataset, survey time and bounds
+_modelNodeCache = {}  # KD-trees of model grid nodes, keyed by field url
+
+
+def _loadValidWindow(key, datafile=None):
+    """Looks up a cached valid data window in memory then in datafile (if given)
+
+    Args:
+        key (tuple): (THREDDS, dataloc, epoch time of survey, y bounds, x bounds)
+        datafile (str): pickle file name for windows kept between sessions (default=None)
+
+    Returns:
+        (ys, xs) slices of valid data window, None if the window has not been computed yet
+
+    """
+    if key not in _validWindowCache and datafile is not None and os.path.isfile(datafile):
+        with open(datafile, 'rb') as fid:
+            _validWindowCache.update(pickle.load(fid))
+    return _validWindowCache.get(key, None)
+
+
+def _saveValidWindow(key, window, datafile=None):
+    """Stores a valid data window in memory and in datafile (if given)
+
+    Args:
+        key (tuple): (THREDDS, dataloc, epoch time of survey, y bounds, x bounds)
+        window (tuple): (ys, xs) slices, windows of all masked surveys (None) are not kept
+        datafile (str): pickle file name for windows kept between sessions (default=None)
+
+    """
+    if window is None:
+        return
+    _validWindowCache[key] = window
+    if datafile is not None:
+        if os.path.isfile(datafile):  # keep windows that other processes added since this file was loaded
+            try:
+                with open(datafile, 'rb') as fid:
+                    _validWindowCache.update(pickle.load(fid))
+            except (EOFError, pickle.UnpicklingError):
+                pass
+            _validWindowCache[key] = window
+        # write then rename so other processes never see a partial file
+        tmpName = datafile + '.{}.tmp'.format(os.getpid())
+        with open(tmpName, 'wb') as fid:
+            pickle.dump(_validWindowCache, fid)
+        os.replace(tmpName, datafile)
+
 class getObs:
 
     def __init__(self, d1, d2, THREDDS='FRF'):
@@ -286,16 +563,12 @@ class getObs:
                     self.wavedataindex = np.expand_dims(self.wavedataindex, axis=0)
                 self.snaptime = nc.num2date(self.allEpoch[self.wavedataindex], self.ncfile['time'].units)
                 try:
-                    depth = self.ncfile['nominalDepth'][:]  # this should always go
-                except IndexError:
-                    try:
-                        depth = self.ncfile['gaugeDepth'][:]  # non directionalWaveGaugeList gauges
-                    except IndexError:
-                        depth = -999  # fill value
-                try:
-                    wave_coords = gp.FRFcoord(self.ncfile['longitude'][:], self.ncfile['latitude'][:])
-                except IndexError:
-                    wave_coords = gp.FRFcoord(self.ncfile['lon'][:], self.ncfile['lat'][:])
+                    depth = instruments.ncVariable(self.ncfile, 'depth')[:]  # non directional gauges use gaugeDepth
+                except KeyError:
+                    depth = -999  # fill value
+                lat = instruments.ncVariable(self.ncfile, 'lat')[:]
+                lon = instruments.ncVariable(self.ncfile, 'lon')[:]
+                wave_coords = gp.FRFcoord(lon, lat)
                 #######################################################################################################
                 # now that wave data index is resolved, go get data
                 self.snaptime = nc.num2date(self.allEpoch[self.wavedataindex], self.ncfile['time'].units)
@@ -305,8 +578,8 @@ class getObs:
                             'wavefreqbin': self.ncfile['waveFrequency'][:],
                             'xFRF': wave_coords['xFRF'],
                             'yFRF': wave_coords['yFRF'],
-                            'lat': self.ncfile['latitude'][:],
-                            'lon': self.ncfile['longitude'][:],
+                            'lat': lat,
+                            'lon': lon,
                             'depth': depth,
                             'Hs': self.ncfile['waveHs'][self.wavedataindex], }
                 try:
@@ -397,15 +670,11 @@ class getObs:
             print('     ---- Problem Retrieving wave data from %s\n    - in this time period start: %s  End: %s' % (gaugenumber, self.d1, self.d2))
 
             try:
-                wavespec = {'lat': self.ncfile['latitude'][:],
-                            'lon': self.ncfile['longitude'][:],
+                wavespec = {'lat': instruments.ncVariable(self.ncfile, 'lat')[:],
+                            'lon': instruments.ncVariable(self.ncfile, 'lon')[:],
                             'name': str(self.ncfile.title), }
-            except TypeError:  # when self.ncfile is None
+            except (TypeError, AttributeError):  # when self.ncfile is None
                 wavespec = None
-            except KeyError:
-                wavespec = {'lat': self.ncfile['lat'][:],
-                            'lon': self.ncfile['lon'][:],
-                            'name': str(self.ncfile.title), }
 
         return  wavespec
 
@@ -457,26 +726,7 @@ class getObs:
                 'meanP' (array): mean pressure
 
         """
-        assert gaugenumber.lower() in [2, 3, 4, 5, 6, 'awac-11m', 'awac-8m', 'awac-6m', 'awac-4.5m',
-                               'adop-3.5m'], 'Input string/number is not a valid gage name/number'
-
-        if gaugenumber in [2, 'awac-11m']:
-            gname = 'AWAC04 - 11m'
-            self.dataloc = 'oceanography/currents/awac-11m/awac-11m.ncml'
-        elif gaugenumber in [3, 'awac-8m']:
-            gname = 'AWAC 8m'
-            self.dataloc = 'oceanography/currents/awac-8m/awac-8m.ncml'
-        elif gaugenumber in [4, 'awac-6m']:
-            gname = 'AWAC 6m'
-            self.dataloc = 'oceanography/currents/awac-6m/awac-6m.ncml'
-        elif gaugenumber in [5, 'awac-4.5m']:
-            gname = 'AWAC 4.5m'
-            self.dataloc = 'oceanography/currents/awac-4.5m/awac-4.5m.ncml'
-        elif gaugenumber in [6, 'adop-3.5m']:
-            gname = 'Aquadopp 3.5m'
-            self.dataloc = 'oceanography/currents/adop-3.5m/adop-3.5m.ncml'
-        else:
-            raise NameError('Check gauge name')
+        self.dataloc = instruments.lookup('currents', gaugenumber)['dataloc']
 
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
                                            dtRound=roundto * 60) # start=self.d1, end=self.d2) < -- needs to be tested
@@ -575,20 +825,7 @@ class getObs:
         """
         # Making gauges flexible
         # different Gauges
-        if gaugenumber in ['derived', 'Derived', 0]:
-            self.dataloc = 'meteorology/wind/derived/derived.ncml'  # 932 wind gauge
-            gname = 'Derived wind gauge '
-        elif gaugenumber == 1:
-            self.dataloc = 'meteorology/wind/D932/D932.ncml'  # 932 wind gauge
-            gname = '932 wind gauge'
-        elif gaugenumber == 2:
-            gname = '832 wind gauge'
-            self.dataloc = 'meteorology/wind/D832/D832.ncml'
-        elif gaugenumber == 3:
-            gname = '732 wind gauge'
-            self.dataloc = 'meteorology/wind/D732/D732.ncml'
-        else:
-            raise NameError('Specifiy proper Gauge number')
+        self.dataloc = instruments.lookup('wind', gaugenumber)['dataloc']
 
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
                                            dtRound=collectionlength * 60) # start=self.d1, end=self.d2) <-- needs to be tested
@@ -782,7 +1019,7 @@ class getObs:
                             'name': str(self.ncfile.title), }
             return wlpacket
 
-    def getBathyFromArcServer(self, output_location, grid_data, method=1):
+    def getBathyFromArcServer(self, output_location, grid_data, method=1, catalogFile=None):
         """This function is designed to pull the raw gridded text file from the Mobile, AL geospatial data server between
         the times of interest (start, end) or the most recent file there in
 
@@ -796,6 +1033,7 @@ class getObs:
           grid_data: boolean True/False defines which grid data to get
              True returns gridded data file
              False returns transect data
+          catalogFile: pickle file of the local survey catalog, only new surveys are asked for (Default value = None)
         :return grid_fname: grid file name from Arc-server
 
         Returns:
@@ -810,37 +1048,35 @@ class getObs:
             service_url = 'http://gis.sam.usace.army.mil/server/rest/services/FRF/FRF_DEV2/FeatureServer/4'
         else:
             print('grid data must be True (returns gridded data) or False (returns transect data)')
-        # query the survey to get the file name and the ID of the file name back for the most recent survey on location
-        gridID_list, grid_fname_list, grid_date_list = DGD.query_survey_data(service_url, grid_data=grid_data)
+        # the catalog of surveys (file names and IDs) is sorted by date
+        catalog = DGD.surveyCatalog(service_url, catalogFile=catalogFile)
+        catalog.sync()
         #
         # do logic here for which survey to pull
         #
-        mask = (grid_date_list >= self.epochd1) & (grid_date_list < self.epochd2)  # boolean true/false of time
-        maskids = np.where(mask)[0]  # where the true values are
+        maskids = catalog.window(self.epochd1, self.epochd2)  # surveys between the dates of interest
         if len(maskids) == 1:  # there is 1 record found between the dates of interest
             print("One bathymetry surveys found between %s and %s" % (self.d1, self.d2))
-            gridID = gridID_list[maskids[0]]
-            grid_fname = grid_fname_list[maskids[0]]
+            gridID = catalog.objectid[maskids[0]]
+            grid_fname = catalog.survey_filename[maskids[0]]
         elif len(maskids) < 1:
             print("No bathymetry surveys found between %s and %s" % (self.d1, self.d2))
-            print("Latest survey found is %s" % sorted(grid_fname_list)[-1])
+            print("Latest survey found is %s" % sorted(catalog.survey_filename)[-1])
             if method == 0:
-                idx = np.argmin(np.abs(grid_date_list - self.epochd1))  # closest in time
+                idx = catalog.nearest(self.epochd1)  # closest in time
                 print('Bathymetry is taken as closest in TIME - NON-operational')
             # or
             elif method == 1:
-                val = (max([n for n in (grid_date_list - self.epochd1) if n < 0]))
-                idx = np.where((grid_date_list - self.epochd1) == val)[0]
+                idx = catalog.latestBefore(self.epochd1)
                 if len(idx) > 1:
-                    if grid_fname_list[idx[0]] == grid_fname_list[idx[-1]]:
-                        idx = idx[0]
-                    else:
+                    if catalog.survey_filename[idx[0]] != catalog.survey_filename[idx[-1]]:
                         print('Multiple grids are returned on the Bathy Server, they are not the same, this will cause an error')
+                idx = idx[0]
                 print('Bathymetry is taken as closest in HISTORY - operational')
 
-            grid_fname = grid_fname_list[int(idx)]
-            gridID = gridID_list[int(idx)]
-            gridtime = nc.num2date(grid_date_list[int(idx)], 'seconds since 1970-01-01')
+            grid_fname = catalog.survey_filename[int(idx)]
+            gridID = catalog.objectid[int(idx)]
+            gridtime = nc.num2date(catalog.surveydate[int(idx)], 'seconds since 1970-01-01')
             if grid_data == True:
                 print("Downloading Bathymetry GRID from %s" % gridtime)
             elif grid_data == False:
@@ -849,7 +1085,7 @@ class getObs:
         else:
             print(' There Are Multiple Surveys between %s and %s\nPlease Break Simulation up into Multiple Parts.' % (
                 self.d1, self.d2))
-            print('The latest survey is %s' % grid_fname_list[maskids[0]])
+            print('The latest survey is %s' % catalog.survey_filename[maskids[-1]])
             raise NotImplementedError
 
         #
@@ -1049,10 +1285,15 @@ class getObs:
 
         return prof_nums
 
-    def getBathyGridFromNC(self, method, removeMask=True):
+    def getBathyGridFromNC(self, method, removeMask=True, **kwargs):
         """This function gets the frf krigged grid product, it will currently break with the present link
         bathymetric data from the thredds server
 
+        Only the window of the grid that is needed is pulled from the server.  When removeMask is True, the bounding
+        box of the valid (un-masked) data of the chosen survey is computed the first time the survey is pulled and
+        cached, after that only the cells inside of that box (and xbounds/ybounds) are read for all of the 2D
+        variables.
+
         Args:
           method: defines which choice method to use
              method == 1  - > 'Bathymetry is taken as closest in HISTORY - operational'
@@ -1061,6 +1302,14 @@ class getObs:
 
           removeMask (bool): remove data that are masked (Default value = True)
 
+        Keyword Args:
+            'xbounds': = [xmin, xmax]  which will truncate the grid to xmin, xmax (frf coord)
+
+            'ybounds': = [ymin, ymax]  which will truncate the grid to ymin, ymax (frf coord)
+
+            'windowCacheFile' (str): pickle file to keep valid data windows between sessions (default=None, windows
+                are only kept in memory for this session)
+
         Returns:
             gridDict (dict): colleciton of variables with keys below, will return None if an error occurs
                'xFRF': xCoord,
@@ -1079,6 +1328,7 @@ class getObs:
 
                'easting': easting
         """
+        windowCacheFile = kwargs.get('windowCacheFile', None)
         self.dataloc = 'survey/gridded/gridded.ncml'  # location of the gridded surveys
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
                                            dtRound=1 * 60)
@@ -1087,50 +1337,66 @@ class getObs:
                                           epochEnd=self.epochd2)  # getting the index of the grid
         except IOError:
             self.bathydataindex = []
-        if self.bathydataindex != None and len(self.bathydataindex) == 1:
+        if self.bathydataindex is not None and np.size(self.bathydataindex) == 1:
             idx = self.bathydataindex
-        elif (self.bathydataindex == None or len(self.bathydataindex) < 1) & method == 1:
+        elif (self.bathydataindex is None or np.size(self.bathydataindex) < 1) & method == 1:
             # there's no exact bathy match so find the max negative number where the negitive
             # numbers are historical and the max would be the closest historical
             val = (max([n for n in (self.ncfile['time'][:] - self.epochd1) if n < 0]))
             idx = np.where((self.ncfile['time'][:] - self.epochd1) == val)[0][0]
             print('Bathymetry is taken as closest in HISTORY - operational')
-        elif (self.bathydataindex == None or len(self.bathydataindex) < 1) and method == 0:
-            idx = np.argmin(np.abs(self.ncfile['time'][:] - self.d1))  # closest in time
+        elif (self.bathydataindex is None or np.size(self.bathydataindex) < 1) and method == 0:
+            idx = np.argmin(np.abs(self.ncfile['time'][:] - self.epochd1))  # closest in time
             print('Bathymetry is taken as closest in TIME - NON-operational')
-        elif self.bathydataindex != None and len(self.bathydataindex) > 1:
-            val = (max([n for n in (self.ncfile['time'][:] - self.d1) if n < 0]))
-            idx = np.where((self.ncfile['time'] - self.d1) == val)[0][0]
+        elif self.bathydataindex is not None and np.size(self.bathydataindex) > 1:
+            val = (max([n for n in (self.ncfile['time'][:] - self.epochd1) if n < 0]))
+            idx = np.where((self.ncfile['time'][:] - self.epochd1) == val)[0][0]
 
-            print('The closest in history to your start date is %s\n' % nc.num2date(self.gridTime[idx],
+            print('The closest in history to your start date is %s\n' % nc.num2date(self.ncfile['time'][idx],
                                                                                     self.ncfile['time'].units))
             print('Please End new simulation with the date above')
             raise Exception
+        idx = int(np.squeeze(idx))
+        ###############################################################################################################
+        # set the window to read, first by requested bounds then by the (cached) valid data window of this survey
+        ###############################################################################################################
+        xCoord = self.ncfile['xFRF'][:]  # 1D coordinates are small, bounds are computed from them
+        yCoord = self.ncfile['yFRF'][:]
+        xs = getBoundsSlice(xCoord, kwargs.get('xbounds', None))
+        ys = getBoundsSlice(yCoord, kwargs.get('ybounds', None))
         # the below line was in place, it should be masking nan's but there is not supposed to be nan's
         # in the data, should only be fill values (-999)
         # elevation_points = np.ma.array(cshore_ncfile['elevation'][idx,:,:], mask=np.isnan(cshore_ncfile['elevation'][idx,:,:]))
         # remove -999's
-        elevation_points = self.ncfile['elevation'][idx, :, :]
-        if type(elevation_points) != np.ma.core.MaskedArray:
-            maskedElev = (elevation_points == self.ncfile['elevation']._FillValue)
-            elevation_points = np.ma.array(elevation_points, mask=maskedElev)
-        if elevation_points.ndim == 3:
-            elevation_points = elevation_points[0]
-        xCoord = self.ncfile['xFRF'][:]
-        yCoord = self.ncfile['yFRF'][:]
-        lat = self.ncfile['latitude'][:]
-        lon = self.ncfile['longitude'][:]
-        northing = self.ncfile['northing'][:]
-        easting = self.ncfile['easting'][:]
+        elevation_points = None
         if removeMask == True:
-            xCoord = xCoord[~np.all(elevation_points.mask, axis=0)]
-            yCoord = yCoord[~np.all(elevation_points.mask, axis=1)]
-            lon = lon[~np.all(elevation_points.mask, axis=0), :]
-            lat = lat[:, ~np.all(elevation_points.mask, axis=1)]
-            northing = northing[~np.all(elevation_points.mask, axis=0), :]
-            easting = easting[:, ~np.all(elevation_points.mask, axis=1)]
-            elevation_points = elevation_points[~np.all(elevation_points.mask, axis=1), :]  #
-            elevation_points = elevation_points[:, ~np.all(elevation_points.mask, axis=0)]
+            windowKey = (self.THREDDS, self.dataloc, float(self.allEpoch[idx]), (ys.start, ys.stop), (xs.start, xs.stop))
+            window = _loadValidWindow(windowKey, windowCacheFile)
+            if window is None:  # first time this survey is requested, read the bounded grid and find valid data
+                elevation_points = self._readMaskedElevation(idx, ys, xs)
+                window = getValidDataWindow(elevation_points, (ys, xs))
+                _saveValidWindow(windowKey, window, windowCacheFile)
+                if window is not None:  # trim in memory, no need to go back to the server for elevation
+                    elevation_points = elevation_points[window[0].start - (ys.start or 0):window[0].stop - (ys.start or 0),
+                                                        window[1].start - (xs.start or 0):window[1].stop - (xs.start or 0)]
+            if window is not None:
+                ys, xs = combineSlices(ys, window[0]), combineSlices(xs, window[1])
+        if elevation_points is None:
+            elevation_points = self._readMaskedElevation(idx, ys, xs)
+        xCoord = xCoord[xs]
+        yCoord = yCoord[ys]
+        lat = self.ncfile['latitude'][ys, xs]
+        lon = self.ncfile['longitude'][ys, xs]
+        northing = self.ncfile['northing'][ys, xs]
+        easting = self.ncfile['easting'][ys, xs]
+        if removeMask == True:  # rows/columns inside of the window that are all masked are removed, as before
+            validRows = ~np.all(np.ma.getmaskarray(elevation_points), axis=1)
+            validCols = ~np.all(np.ma.getmaskarray(elevation_points), axis=0)
+            if not (validRows.all() and validCols.all()):
+                elevation_points = elevation_points[validRows][:, validCols]
+                yCoord, xCoord = yCoord[validRows], xCoord[validCols]
+                lat, lon = lat[validRows][:, validCols], lon[validRows][:, validCols]
+                northing, easting = northing[validRows][:, validCols], easting[validRows][:, validCols]
         if elevation_points.ndim == 2:
             elevation_points = np.ma.expand_dims(elevation_points, axis=0)
 
@@ -1151,6 +1417,26 @@ class getObs:
                     }
         return gridDict
 
+    def _readMaskedElevation(self, idx, ys, xs):
+        """Reads a window of a single gridded survey and masks the fill values
+
+        Args:
+            idx (int): time index of the survey
+            ys (slice): alongshore window
+            xs (slice): cross-shore window
+
+        Returns:
+            masked array of elevations [y, x]
+
+        """
+        elevation_points = self.ncfile['elevation'][idx, ys, xs]
+        if type(elevation_points) != np.ma.core.MaskedArray:
+            maskedElev = (elevation_points == self.ncfile['elevation']._FillValue)
+            elevation_points = np.ma.array(elevation_points, mask=maskedElev)
+        if elevation_points.ndim == 3:
+            elevation_points = elevation_points[0]
+        return elevation_points
+
     def _waveGaugeURLlookup(self, gaugenumber):
         r"""A lookup table function that sets the URL backend for get wave spec and get wave gauge loc
 
@@ -1180,72 +1466,17 @@ class getObs:
 
                 100m pressure    can be [11, 'xp100m']
 
-                8m array         can be [8, '8m-Array', '8m Array', '8m array', '8m-array']
+                8m array         can be [12, '8m-Array', '8m Array', '8m array', '8m-array']
 
                 oregon inlet WR  can be ['oregonInlet', 'OI', 'oi']
 
+                aliases are not case sensitive, all gauges and their aliases are kept in the instruments registry
+
         Returns:
           Nothing, this just sets the self.dataloc data member
 
         """
-        if str(gaugenumber).lower() in ['0', 'waverider-26m', '26m']:
-            # 26 m wave rider
-            self.dataloc = 'oceanography/waves/waverider-26m/waverider-26m.ncml'  # 'oceanography/waves/waverider430/waverider430.ncml'  # 26m buoy
-        elif str(gaugenumber).lower() in ['1', 'waverider-17m', '17m']:
-            # 2D 17m waverider
-            self.dataloc = 'oceanography/waves/waverider-17m/waverider-17m.ncml'  # 17 m buoy
-        elif str(gaugenumber).lower() in ['2', 'awac-11m', '11m']:
-            self.dataloc = 'oceanography/waves/awac-11m/awac-11m.ncml'
-        elif str(gaugenumber).lower() in ['3', 'awac-8m']:
-            self.dataloc = 'oceanography/waves/awac-8m/awac-8m.ncml'
-        elif str(gaugenumber).lower() in ['4', 'awac-6m', 'awac 6m']:
-            self.dataloc = 'oceanography/waves/awac-6m/awac-6m.ncml'
-        elif str(gaugenumber).lower() in ['5', 'awac-4.5m', 'awac_4.5m']:
-            self.dataloc = 'oceanography/waves/awac-4.5m/awac-4.5m.ncml'
-        elif str(gaugenumber).lower() in ['6', 'adop-3.5m', 'aquadopp 3.5m']:
-            self.dataloc = 'oceanography/waves/adop-3.5m/adop-3.5m.ncml'
-        elif str(gaugenumber).lower() in ['7', 'adop-2m']:
-            self.dataloc = 'oceanography/waves/adop01/adop01.ncml'
-        elif str(gaugenumber).lower() in ['8', 'xp200m', 'xp200']:
-            self.dataloc = 'oceanography/waves/xp200m/xp200m.ncml'
-        elif str(gaugenumber).lower() in ['9', 'xp150m', 'xp150']:
-            self.dataloc = 'oceanography/waves/xp150m/xp150m.ncml'
-        elif str(gaugenumber).lower() in ['10', 'xp125m', 'xp125']:
-            self.dataloc = 'oceanography/waves/xp125m/xp125m.ncml'
-        elif str(gaugenumber).lower() in ['11', 'xp100m']:
-            self.dataloc = 'oceanography/waves/xp100m/xp100m.ncml'
-        elif str(gaugenumber).lower() in ['12', '8m array', '8m-array']:
-            self.dataloc = 'oceanography/waves/8m-array/8m-array.ncml'
-        # lidar wave gauges - 140 m
-        elif str(gaugenumber).lower() in ['lidarwavegauge140', 'lidargauge140', 'lidarwavegauge140m', 'lidargauge140m']:
-            self.dataloc = 'oceanography/waves/lidarWaveGauge140/lidarWaveGauge140.ncml'
-        # lidar wave gauges - 110 m
-        elif str(gaugenumber).lower() in ['lidarwavegauge110', 'lidargauge110', 'lidarwavegauge110m', 'lidargauge110m']:
-            self.dataloc = 'oceanography/waves/lidarWaveGauge110/lidarWaveGauge110.ncml'
-        # lidar wave gauges - 100 m
-        elif str(gaugenumber).lower() in ['lidarwavegauge100', 'lidargauge100', 'lidarwavegauge100m', 'lidargauge100m']:
-            self.dataloc = 'oceanography/waves/lidarWaveGauge100/lidarWaveGauge100.ncml'
-        # lidar wave gauges - 90 m
-        elif str(gaugenumber).lower() in ['lidarwavegauge90', 'lidargauge90', 'lidarwavegauge90m', 'lidargauge90m']:
-            self.dataloc = 'oceanography/waves/lidarWaveGauge90/lidarWaveGauge90.ncml'
-        # lidar wave gauges - 80 m
-        elif str(gaugenumber).lower() in ['lidarwavegauge80', 'lidargauge80', 'lidarwavegauge80m', 'lidargauge80m']:
-            self.dataloc = 'oceanography/waves/lidarWaveGauge80/lidarWaveGauge80.ncml'
-        elif str(gaugenumber).lower() in ['oregoninlet', 'oi']:
-            self.dataloc = 'oceanography/waves/waverider-oregon-inlet-nc/waverider-oregon-inlet-nc.ncml'
-        elif str(gaugenumber).lower() in ['lidarwavegauge080', 'lidarwavegauge80']:
-            self.dataloc = "oceanography/waves/lidarWaveGauge080/lidarWaveGauge080.ncml"
-        elif str(gaugenumber).lower() in ['lidarwavegauge090', 'lidarwavegauge90']:
-            self.dataloc = "oceanography/waves/lidarWaveGauge090/lidarWaveGauge090.ncml"
-        elif str(gaugenumber).lower() in ['lidarwavegauge100']:
-            self.dataloc = "oceanography/waves/lidarWaveGauge100/lidarWaveGauge100.ncml"
-        elif str(gaugenumber).lower() in ['lidarwavegauge110']:
-            self.dataloc = "oceanography/waves/lidarWaveGauge110/lidarWaveGauge110.ncml"
-        elif str(gaugenumber).lower() in ['lidarwavegauge140']:
-            self.dataloc = "oceanography/waves/lidarWaveGauge140/lidarWaveGauge140.ncml"
-        else:
-            self.gname = 'There Are no Gauge numbers here'
-            raise NameError('Bad Gauge name, specify proper gauge name/number, or add capability')
+        self.dataloc = instruments.lookup('waves', gaugenumber)['dataloc']
 
     def wlGageURLlookup(self, gaugenumber):
         """
@@ -1262,46 +1493,14 @@ class getObs:
                    150m pressure    can be [9, 'xp150m', 'xp150']
                    125m pressure    can be [10, 'xp125m', 'xp125']
                    100m pressure    can be [11, 'xp100m']
-                   8m array         can be [8, '8m-Array', '8m Array', '8m array', '8m-array']
+                   8m array         can be [12, '8m-Array', '8m Array', '8m array', '8m-array']
+               aliases are not case sensitive, all gauges and their aliases are kept in the instruments registry
         :returns: Nothing, this just sets the self.dataloc data member
 
         """
-        if gaugenumber in [2, 'AWAC-11m', 'awac-11m', 'Awac-11m']:
-            gname = 'AWAC 11m'
-            self.dataloc = 'oceanography/waves/awac-11m/awac-11m.ncml'
-        elif gaugenumber in [3, 'awac-8m', 'AWAC-8m']:
-            self.gname = 'AWAC 8m'
-            self.dataloc = 'oceanography/waves/awac-8m/awac-8m.ncml'
-        elif gaugenumber in [4, 'awac-6m', 'AWAC-6m']:
-            self.gname = 'AWAC 6m'
-            self.dataloc = 'oceanography/waves/awac-6m/awac-6m.ncml'
-        elif gaugenumber in [5, 'awac-4.5m', 'Awac-4.5m', 'awac_4.5m']:
-            self.gname = 'AWAC 4.5m'
-            self.dataloc = 'oceanography/waves/awac-4.5m/awac-4.5m.ncml'
-        elif gaugenumber in [6, 'adop-3.5m', 'aquadopp 3.5m']:
-            self.gname = 'Aquadopp 3.5m'
-            self.dataloc = 'oceanography/waves/adop-3.5m/adop-3.5m.ncml'
-        elif gaugenumber in [7, 'adop-2m']:
-            self.gname = 'Aquadopp01 - 2m'
-            self.dataloc = 'oceanography/waves/adop01/adop01.ncml'
-        elif gaugenumber in [8, 'xp200m', 'xp200']:
-            self.gname = 'Paros xp200m'
-            self.dataloc = 'oceanography/waves/xp200m/xp200m.ncml'
-        elif gaugenumber in [9, 'xp150m', 'xp150']:
-            self.gname = 'Paros xp150m'
-            self.dataloc = 'oceanography/waves/xp150m/xp150m.ncml'
-        elif gaugenumber in [10, 'xp125m', 'xp125']:
-            self.gname = 'Paros xp125m'
-            self.dataloc = 'oceanography/waves/xp125m/xp125m.ncml'
-        elif gaugenumber in [11, 'xp100m']:
-            self.gname = 'Paros xp100m'
-            self.dataloc = 'oceanography/waves/xp100m/xp100m.ncml'
-        elif gaugenumber in [12, '8m-Array', '8m Array', '8m array', '8m-array']:
-            self.gname = "8m array"
-            self.dataloc = 'oceanography/waves/8m-array/8m-array.ncml'
-        else:
-            self.gname = 'There Are no Gauge numbers here'
-            raise NameError('Bad Gauge name, specify proper gauge name/number')
+        gauge = instruments.lookup('waterLevel', gaugenumber)
+        self.gname = gauge['gname']
+        self.dataloc = gauge['dataloc']
 
     def getBathyDuckLoc(self, gaugenumber):
         """this function pulls the stateplane location (if desired) from the surveyed
@@ -1361,21 +1560,28 @@ class getObs:
             ncfile = nc.Dataset(self.FRFdataloc + self.dataloc)
         except IOError:
             ncfile = nc.Dataset(self.chlDataLoc + self.dataloc)
-        out = {'Lat': ncfile['latitude'][:],
-               'Lon': ncfile['longitude'][:]}
+        out = {'Lat': instruments.ncVariable(ncfile, 'lat')[:],
+               'Lon': instruments.ncVariable(ncfile, 'lon')[:]}
+        ncfile.close()
         return out
 
-    def get_sensor_locations_from_thredds(self):
+    def get_sensor_locations_from_thredds(self, gauges=None, workers=1):
         """Retrieves lat/lon coordinates for each gauge in gauge_list, converts
         to state plane and frf coordinates and creates a dictionary containing
         all three coordinates types with gaugenumbers as keys.
 
+        Only the location variables are read and the coordinates of all gauges are converted at once.  With
+        workers > 1 the gauges are read concurrently in worker processes (the netCDF library is not thread safe),
+        scripts that do so need an if __name__ == '__main__' guard on platforms that spawn processes (macOS, Windows).
+
         Args:
-            None
+            gauges (list): gauges to locate (default=None, self.waveGaugeList)
+            workers (int): number of gauges read at once (default=1, one after the other in this process)
 
         Returns:
             loc_dict (dict): Dictionary containing lat/lon, state plane, and frf coordinates
-                for each available gaugenumber with gaugenumbers as keys.
+                for each available gaugenumber with gaugenumbers as keys (an empty dictionary for gauges that are not
+                on the server).
 
               'lat': latitude
 
@@ -1390,105 +1596,80 @@ class getObs:
               'yFRF': FRF local coordinate system - alongshore
 
         """
-        loc_dict = {}
-        for g in self.waveGaugeList:
-            loc_dict[g] = {}
-            data = loc_dict[g]
-
-            # Get latlon from Thredds server.
-            try:
-                if g in ['11', '12', '13', '14', '21', '22', '23', '24']:
-                    latlon = self.getBathyDuckLoc(gaugenumber=g)
-                else:
-                    latlon = self.getWaveGaugeLoc(g)
-            except IOError:
-                continue
-            # lat and lon values currently stored as 1 element arrays.
-            # Cast to float for consistency.
-            lat = float(latlon['Lat'])
-            lon = float(latlon['Lon'])
-
-            # Covert latlon to stateplane.
-            coords = gp.LatLon2ncsp(lon, lat)
-            spE = coords['StateplaneE']
-            spN = coords['StateplaneN']
-
-            # Convert stateplane to frf coords.
-            frfcoords = gp.ncsp2FRF(spE, spN)
-            xfrf = frfcoords['xFRF']
-            yfrf = frfcoords['yFRF']
-
-            data['lat'] = lat
-            data['lon'] = lon
-            data['spE'] = spE
-            data['spN'] = spN
-            data['xFRF'] = xfrf
-            data['yFRF'] = yfrf
+        gauges = list(self.waveGaugeList if gauges is None else gauges)
+        jobs = [(self.d1, self.d2, self.THREDDS, g) for g in gauges]
+        if workers > 1 and len(gauges) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(gauges))) as pool:
+                latlons = list(pool.map(_gaugeLocationWorker, *zip(*jobs)))
+        else:
+            latlons = [_gaugeLocationWorker(*job) for job in jobs]
+
+        loc_dict = collections.OrderedDict((g, {}) for g in gauges)
+        found = [(g, latlon) for g, latlon in zip(gauges, latlons) if latlon is not None]
+        if len(found) == 0:
+            return loc_dict
+        lat = np.array([latlon[0] for _, latlon in found])
+        lon = np.array([latlon[1] for _, latlon in found])
+        # Covert latlon to stateplane, then to frf coords for all gauges at once.
+        coords = gp.LatLon2ncsp(lon, lat)
+        spE = np.atleast_1d(coords['StateplaneE'])
+        spN = np.atleast_1d(coords['StateplaneN'])
+        frfcoords = gp.ncsp2FRF(spE, spN)
+        xfrf = np.atleast_1d(frfcoords['xFRF'])
+        yfrf = np.atleast_1d(frfcoords['yFRF'])
+        for ii, (g, _) in enumerate(found):
+            loc_dict[g] = {'lat': float(lat[ii]),
+                           'lon': float(lon[ii]),
+                           'spE': float(spE[ii]),
+                           'spN': float(spN[ii]),
+                           'xFRF': float(xfrf[ii]),
+                           'yFRF': float(yfrf[ii])}
 
         return loc_dict
 
-    def get_sensor_locations(self, datafile='frf_sensor_locations.pkl', window_days=14):
-        """Retrieve sensor coordinate dictionary from file if there is an entry
-        within window_days of the specified timestampstr. Otherwise query the
-        Thredds server for location information and update archived data
-        accordingly.
+    def get_sensor_locations(self, datafile='frf_sensor_locations.db', window_days=14, workers=1):
+        """Retrieve sensor coordinates from the location store (see instruments.locationStore) for the gauges that
+        have a location within window_days of self.d1.  The other gauges are looked up on the Thredds server and the
+        store is updated accordingly.
 
         Args:
-          datafile (str): Name of file containing archived sensor location data.
-               Updates datafile when new information is retrieved.
-               (Default value = 'frf_sensor_locations.pkl')
-          window_days (int): Maximum interval between desired timestamp and closest timestamp
-               in datafile to use archived data. If this interval is larger than
-               window_days days, query the Thredds server. (Default value = 14)
+          datafile (str): Name of the SQLite file containing archived sensor location data.
+               Updates datafile when new information is retrieved, many processes can share it.  A pickle written by
+               earlier versions (eg. 'frf_sensor_locations.pkl') is imported into an SQLite file of the same name
+               with the extension .db, which is used from then on.  The pickle is left as it is.
+               (Default value = 'frf_sensor_locations.db')
+          window_days (int): a location retrieved from the server is used for this many days either side of the time
+               it was retrieved for, outside of that the Thredds server is queried. (Default value = 14)
+          workers (int): number of gauges looked up on the server at once, see get_sensor_locations_from_thredds
+               (default=1)
 
         Returns:
-          sensor_locations (dict):  Coordinates in lat/lon, stateplane, and frf for each available
-               gaugenumber (gauges 0 to 12).
-          
+          sensor_locations (dict):  Coordinates in lat/lon, stateplane, and frf for each gauge in self.waveGaugeList
+               (an empty dictionary when no data are available, this is also kept in the store for the window).
+
         Notes:
             Updates datafile when new information is retrieved.
 
         """
-        try:
-            with open(datafile, 'rb') as fid:  # this will close a file when done loading it
-                loc_dict = pickle.load(fid)
-        except IOError:
-            # now create pickle if one's not around
-            loc_dict = {}
-            # this should be date of searching( or date of gauge placement more accurately)
-            timestamp = self.d1 # DT.strptime(timestampstr, '%Y%m%d_%H%M')
-            loc_dict[timestamp] = self.get_sensor_locations_from_thredds() #timestamp)
-            with open(datafile, 'wb') as fid:
-                pickle.dump(loc_dict, fid)
-
-        available_timestamps = np.array(list(loc_dict.keys()))
-        idx = np.abs(self.d1 - available_timestamps).argmin()
-        nearest_timestamp = available_timestamps[idx]
-        if abs(self.d1 - nearest_timestamp).days < window_days:
-            # if there is data, and its within the window
-            archived_sensor_locations = loc_dict[nearest_timestamp]
-            # MPG: only use locations specified in self.waveGaugeList (for the case
-            # that there are archived locations that should not be used).
-            sensor_locations = collections.OrderedDict()
-
-            for g in self.waveGaugeList:
-                if g in archived_sensor_locations:
-                    sensor_locations[g] = archived_sensor_locations[g]
-                elif g not in archived_sensor_locations:
-                    sensor_locations = collections.OrderedDict()
-                    sensor_locations = self.get_sensor_locations_from_thredds()
-                    return sensor_locations
-                else:
-                    # MPG: use empty dict as a placeholder to indicate that no
-                    # data is available.
-                    sensor_locations[g] = {}
-        else:
-            sensor_locations = self.get_sensor_locations_from_thredds()
-            loc_dict[self.d1] = sensor_locations
-            with open(datafile, 'wb') as fid:
-                pickle.dump(loc_dict, fid)
-
-        return sensor_locations
+        legacy = None
+        if not instruments.locationStore.isStore(datafile):  # the location pickle of earlier versions
+            legacy, datafile = datafile, os.path.splitext(datafile)[0] + '.db'
+            assert legacy != datafile, '%s is not an SQLite location store, locations are no longer kept in a ' \
+                                       'pickle' % legacy
+            print('%s is a location pickle of an earlier version, locations are kept in %s now' % (legacy, datafile))
+            if os.path.isfile(datafile):
+                legacy = None  # imported before
+        with instruments.locationStore(datafile) as store:
+            if legacy is not None:
+                store.importPickle(legacy, window_days * 24 * 3600.)
+            sensor_locations = store.locations(self.waveGaugeList, self.epochd1)
+            missing = [g for g in self.waveGaugeList if g not in sensor_locations]
+            if len(missing) > 0:
+                retrieved = self.get_sensor_locations_from_thredds(gauges=missing, workers=workers)
+                store.add(retrieved, self.epochd1, window_days * 24 * 3600.)
+                sensor_locations.update(retrieved)
+
+        return collections.OrderedDict((g, sensor_locations.get(g, {})) for g in self.waveGaugeList)
 
     def getLidarRunup(self, removeMasked=True):
         """This function will get the wave runup measurements from the lidar mounted in the dune
@@ -1694,39 +1875,11 @@ class getObs:
 
         """
         # location of the data
-        gauge_list = ['Alt03', 'Alt04', 'Alt05',
-                      'Alt769-150', 'Alt769-200', 'Alt769-250', 'Alt769-300', 'Alt769-350',
-                      'Alt861-150', 'Alt861-200', 'Alt861-250', 'Alt861-300', 'Alt861-350']
-        if gaugeName not in gauge_list:
-            raise NotImplementedError('Input string is not a valid gage name, please check')
-        if gaugeName in ['Alt05']:
-            self.dataloc = 'geomorphology/altimeter/Alt05-altimeter/Alt05-altimeter.ncml'
-        elif gaugeName in ['Alt04']:
-            self.dataloc = 'geomorphology/altimeter/Alt04-altimeter/Alt04-altimeter.ncml'
-        elif gaugeName in ['Alt03']:
-            self.dataloc = 'geomorphology/altimeter/Alt03-altimeter/Alt03-altimeter.ncml'
-        elif gaugeName in ['Alt769-150']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-150-altimeter/Alt769-150-altimeter.ncml'
-        elif gaugeName in ['Alt769-200']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-200-altimeter/Alt769-200-altimeter.ncml'
-        elif gaugeName in ['Alt769-250']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-250-altimeter/Alt769-250-altimeter.ncml'
-        elif gaugeName in ['Alt769-300']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-300-altimeter/Alt769-300-altimeter.ncml'
-        elif gaugeName in ['Alt769-350']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-350-altimeter/Alt769-350-altimeter.ncml'
-        elif gaugeName in ['Alt861-150']:
-            self.dataloc = 'geomorphology/altimeter/Alt861-150-altimeter/Alt861-150-altimeter.ncml'
-        elif gaugeName in ['Alt861-200']:
-            self.dataloc = 'geomorphology/altimeter/Alt861-200-altimeter/Alt861-200-altimeter.ncml'
-        elif gaugeName in ['Alt861-250']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-250-altimeter/Alt769-250-altimeter.ncml'
-        elif gaugeName in ['Alt861-300']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-300-altimeter/Alt769-300-altimeter.ncml'
-        elif gaugeName in ['Alt861-350']:
-            self.dataloc = 'geomorphology/altimeter/Alt769-350-altimeter/Alt769-350-altimeter.ncml'
-        else:
-            raise NotImplementedError('Please use one of the following keys\n'.format(gauge_list))
+        try:
+            self.dataloc = instruments.lookup('altimeter', gaugeName)['dataloc']
+        except NameError:
+            raise NotImplementedError('Input string is not a valid gage name, please use one of the following keys\n'
+                                      '{}'.format(instruments.names('altimeter')))
 
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
                                            dtRound=1 * 60)
@@ -1890,78 +2043,125 @@ class getObs:
             out = None
         return out
 
-    def getLidarDEM(self, **kwargs):
-        r"""this function will get the lidar DEM data, beach topography data
-
-            This function is not finished being developed
+    def _lidarDEMWindow(self, stride=1, **kwargs):
+        """Opens the dune lidar DEM and sets the time indices and the (strided) window of interest
 
         Args:
+            stride (int): keep every stride-th node in x and y (Default value = 1)
 
         Keyword Args:
            'xbounds': frf cross-shore bounds
            'ybounds': frf alongshore bounds
 
         Returns:
-          dictionary with lidar beach topography
-            keys to be determined
+            time indices (None if no data), ys, xs slices
 
         """
         self.dataloc = 'geomorphology/DEMs/duneLidarDEM/duneLidarDEM.ncml'
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
                                            dtRound=1 * 60)
-        self.idxDEM = gettime(allEpoch=self.allEpoch, epochStart=self.epochd1,
-                                          epochEnd=self.epochd2)
-        self.DEMtime = nc.num2date(self.allEpoch[self.idxDEM], 'seconds since 1970-01-01')
+        self.idxDEM = gettime(allEpoch=self.allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
+        if self.idxDEM is None:
+            return None, None, None
+        xs = getBoundsSlice(self.ncfile['xFRF'][:], kwargs.get('xbounds', None))
+        ys = getBoundsSlice(self.ncfile['yFRF'][:], kwargs.get('ybounds', None))
+        xs = slice(xs.start, xs.stop, int(stride))
+        ys = slice(ys.start, ys.stop, int(stride))
+        return np.atleast_1d(self.idxDEM), ys, xs
+
+    def getLidarDEM(self, stride=1, **kwargs):
+        r"""this function will get the lidar DEM data, beach topography data
 
-        if 'xbounds' in kwargs and np.array(kwargs['xbounds']).size == 2:
-            if kwargs['xbounds'][0] > kwargs['xbounds'][1]:
-                kwargs['xbounds'] = np.flip(kwargs['xbounds'], axis=0)
-            # first min of x
-            if (kwargs['xbounds'][0] < self.ncfile['xm'][:]).all():
-                # then set xmin to 0
-                removeMinX = 0
-            else:  # <= used here to handle inclusive initial index inherant in python
-                removeMinX = np.argwhere(self.ncfile['xFRF'][:] <= kwargs['xbounds'][0]).squeeze().max()
-            # now max of x
-            if (kwargs['xbounds'][1] > self.ncfile['xFRF'][:]).all():
-                removeMaxX = None
-            else:
-                removeMaxX = np.argwhere(
-                    self.ncfile['xFRF'][:] >= kwargs['xbounds'][1]).squeeze().min() + 1  # python indexing
-            xs = slice(removeMinX, removeMaxX)
-        else:
-            xs = slice(None)
+        Only the bounded window is read from the server.  The stride gives decimated (overview) levels of the DEM,
+        these are strided reads on the server so a coarse DEM costs stride**2 less to pull. For long time periods use
+        iterLidarDEM to stream one DEM at a time.
 
-        if 'ybounds' in kwargs and np.array(kwargs['ybounds']).size == 2:
-            if kwargs['ybounds'][0] > kwargs['ybounds'][1]:
-                kwargs['ybounds'] = np.flip(kwargs['ybounds'], axis=0)
-            # first min of y
-            if (kwargs['ybounds'][0] < self.ncfile['yFRF'][:]).all():
-                # then set the ymin to first index [0]
-                removeMinY = 0  # ie get all data
-            else:
-                removeMinY = np.argwhere(self.ncfile['yFRF'][:] <= kwargs['ybounds'][0]).squeeze().max()
-            ## now max of y
-            if (kwargs['ybounds'][1] > self.ncfile['yFRF'][:]).all():
-                removeMaxY = None
-            else:
-                removeMaxY = np.argwhere(
-                    self.ncfile['yFRF'][:] >= kwargs['ybounds'][1]).squeeze().min() + 1  # python indexing
-            ys = slice(removeMinY, removeMaxY)
-        else:
-            ys = slice(None)
-        DEMdata = {'key': 'Nothin Here Yet'}
+        Args:
+            stride (int): keep every stride-th node in x and y, eg. 1 full resolution, 4 for a quick look
+                (Default value = 1)
+
+        Keyword Args:
+           'xbounds': frf cross-shore bounds
+           'ybounds': frf alongshore bounds
+
+        Returns:
+          dictionary with lidar beach topography, None if there are no data in the time period
+            'time': datetime objects of each DEM
+
+            'epochtime': epoch time of each DEM
+
+            'xFRF': cross-shore coordinates [x]
+
+            'yFRF': alongshore coordinates [y]
+
+            'elevation': masked array of elevations [t, y, x]
+
+        """
+        idx, ys, xs = self._lidarDEMWindow(stride=stride, **kwargs)
+        if idx is None:
+            print('There is no lidar DEM data during this time period')
+            return None
+        self.DEMtime = nc.num2date(self.allEpoch[idx], 'seconds since 1970-01-01')
+        tSlice = slice(int(idx.min()), int(idx.max()) + 1)  # time indices are contiguous
+        DEMdata = {'time': self.DEMtime,
+                   'epochtime': self.allEpoch[idx],
+                   'xFRF': self.ncfile['xFRF'][xs],
+                   'yFRF': self.ncfile['yFRF'][ys],
+                   'elevation': self.ncfile['elevation'][tSlice, ys, xs], }
 
         return DEMdata
 
-    def getBathyRegionalDEM(self, utmEmin, utmEmax, utmNmin, utmNmax):
+    def iterLidarDEM(self, stride=1, **kwargs):
+        r"""Streams the lidar DEMs in the time period one time step at a time (see getLidarDEM)
+
+        Args:
+            stride (int): keep every stride-th node in x and y (Default value = 1)
+
+        Keyword Args:
+           'xbounds': frf cross-shore bounds
+           'ybounds': frf alongshore bounds
+
+        Yields:
+          dictionary for each time step with keys
+            'time': datetime object of the DEM
+
+            'epochtime': epoch time of the DEM
+
+            'xFRF': cross-shore coordinates [x]
+
+            'yFRF': alongshore coordinates [y]
+
+            'elevation': masked array of elevations [y, x]
+
+        """
+        idx, ys, xs = self._lidarDEMWindow(stride=stride, **kwargs)
+        if idx is None:
+            print('There is no lidar DEM data during this time period')
+            return
+        ncfile, allEpoch = self.ncfile, self.allEpoch
+        xFRF = ncfile['xFRF'][xs]
+        yFRF = ncfile['yFRF'][ys]
+        for ii in idx:
+            yield {'time': nc.num2date(allEpoch[ii], 'seconds since 1970-01-01'),
+                   'epochtime': allEpoch[ii],
+                   'xFRF': xFRF,
+                   'yFRF': yFRF,
+                   'elevation': ncfile['elevation'][ii, ys, xs], }
+
+    def getBathyRegionalDEM(self, utmEmin, utmEmax, utmNmin, utmNmax, tileDir=None):
         """grabs bathymery from the regional background grid
 
+        The regional DEM is static, if tileDir is given the DEM is kept locally as memory-mapped tiles (see
+        localTiles.tileStore) and the bounding box is assembled from them, tiles are only downloaded the first time
+        they are touched.
+
         Args:
           utmEmin: left side of DEM bounding box in UTM
           utmEmax: right side of DEM bounding box in UTM
           utmNmin: bottom of DEM bounding box in UTM
           utmNmax: top of DEM bounding box in UTM
+          tileDir (str): folder for local tiles of the DEM, if None the data are read from the server every call
+            (Default value = None)
 
         Returns:
           dictionary comprising a smaller rectangular piece of the DEM data, bounded by inputs above
@@ -1977,13 +2177,20 @@ class getObs:
 
 
         """
-
+        demVariables = ['utmEasting', 'utmNorthing', 'latitude', 'longitude', 'bottomElevation']
         self.dataloc = 'integratedBathyProduct/RegionalBackgroundDEM/backgroundDEM.nc'
-        self.ncfile = nc.Dataset(self.crunchDataLoc + self.dataloc)
-
-        # get a 1D ARRAY of the utmE and utmN of the rectangular grid (NOT the full grid!!!)
-        utmE_all = self.ncfile['utmEasting'][0, :]
-        utmN_all = self.ncfile['utmNorthing'][:, 0]
+        if tileDir is not None:
+            from getdatatestbed.localTiles import tileStore
+            tiles = tileStore(tileDir, ncfileURL=self.crunchDataLoc + self.dataloc, variables=demVariables,
+                              axes={'utmE': lambda ncfile: ncfile['utmEasting'][0, :],
+                                    'utmN': lambda ncfile: ncfile['utmNorthing'][:, 0]})
+            utmE_all = tiles.axis('utmE')
+            utmN_all = tiles.axis('utmN')
+        else:
+            self.ncfile = nc.Dataset(self.crunchDataLoc + self.dataloc)
+            # get a 1D ARRAY of the utmE and utmN of the rectangular grid (NOT the full grid!!!)
+            utmE_all = self.ncfile['utmEasting'][0, :]
+            utmN_all = self.ncfile['utmNorthing'][:, 0]
 
         # find indices I need to pull...
         ni_min = np.where(utmE_all >= utmEmin)[0][0]
@@ -1995,21 +2202,27 @@ class getObs:
                     np.size(nj_max) >= 1), 'getBathyDEM Error: bounding box is too close to edge of DEM domain'
 
         out = {}
-        out['utmEasting'] = self.ncfile['utmEasting'][nj_min:nj_max + 1, ni_min:ni_max + 1]
-        out['utmNorthing'] = self.ncfile['utmNorthing'][nj_min:nj_max + 1, ni_min:ni_max + 1]
-        out['latitude'] = self.ncfile['latitude'][nj_min:nj_max + 1, ni_min:ni_max + 1]
-        out['longitude'] = self.ncfile['longitude'][nj_min:nj_max + 1, ni_min:ni_max + 1]
-        out['bottomElevation'] = self.ncfile['bottomElevation'][nj_min:nj_max + 1, ni_min:ni_max + 1]
+        for var in demVariables:
+            if tileDir is not None:
+                out[var] = tiles.getWindow(var, slice(nj_min, nj_max + 1), slice(ni_min, ni_max + 1))
+            else:
+                out[var] = self.ncfile[var][nj_min:nj_max + 1, ni_min:ni_max + 1]
 
         return out
 
-    def getBathyGridcBathy(self, **kwargs):
+    def getBathyGridcBathy(self, products=None, **kwargs):
         """this function gets the cbathy data from the below address, assumes fill value of -999
 
+        Each variable is read from the server once, values less than or equal to the fill value are masked locally.
+
+        Args:
+            products (list): subset of cBathy products (output keys listed below) to retrieve, None retrieves them all
+                eg. ['depthKF', 'P'] (Default value = None)
+
         Keyword Args:
-            xbound: = [xmin, xmax]  which will truncate the cbathy domain to xmin, xmax (frf coord)
+            xbounds: = [xmin, xmax]  which will truncate the cbathy domain to xmin, xmax (frf coord)
 
-            ybound: = [ymin, ymax]  which will truncate the cbathy domain to ymin, ymax (frf coord)
+            ybounds: = [ymin, ymax]  which will truncate the cbathy domain to ymin, ymax (frf coord)
 
         Returns:
             dictionary with keys below, will return None if error is found
@@ -2019,98 +2232,66 @@ class getObs:
 
                 'ym': frf ycoordinates
 
-                'depth': raw cbathy depths
+                'depthKF':  kalman filtered hourly depth
 
-                'depthfC: same as depth
+                'depthKFError': errors associated with the kalman filter (square root of P, if not in the file)
 
-                'depthKF':  kalman filtered hourly depth
+                'depthfC': raw cbathy depths
 
-                'depthKFError': errors associated with the kalman filter
+                'depthfCError': errors associated with the raw cbathy depths
 
                 'fB':  ?
 
                 'k':  ??
 
+                'P': kalman filter error variance
+
         """
         fillValue = -999  # assumed fill value from the rest of the files taken as less than or equal to
+        # output key: variable name on the server (depthKFError is handled below)
+        productVariables = collections.OrderedDict([('depthKF', 'depthKF'), ('depthKFError', 'depthKFError'),
+                                                    ('depthfC', 'depthfC'), ('depthfCError', 'depthErrorfC'),
+                                                    ('fB', 'fB'), ('k', 'k'), ('P', 'PKF')])
+        if products is None:
+            products = list(productVariables.keys())
+        assert set(products).issubset(productVariables.keys()), 'products must be in %s' % list(productVariables.keys())
         self.dataloc = 'projects/bathyduck/data/cbathy_old/cbathy.ncml'
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
                                            dtRound=30 * 60)
         self.cbidx = gettime(allEpoch=self.allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
-
-        self.cbtime = nc.num2date(self.allEpoch[self.cbidx], 'seconds since 1970-01-01')
-        # mask = (time > start) & (time < end)
-        # assert (emask == mask).all(), 'epoch time is not working'
-        # idx = np.where(emask)[0] # this leaves a list that keeps the data iteratable with a size 1.... DON'T CHANGE
-        if np.size(self.cbidx) == 1 and self.cbidx == None:
+        if self.cbidx is None:
             cbdata = None  # throw a kick out if there's no data avaiable
             return cbdata
+        self.cbtime = nc.num2date(self.allEpoch[self.cbidx], 'seconds since 1970-01-01')
         # truncating data from experimental parameters to
-        if 'xbounds' in kwargs and np.array(kwargs['xbounds']).size == 2:
-            if kwargs['xbounds'][0] > kwargs['xbounds'][1]:
-                kwargs['xbounds'] = np.flip(kwargs['xbounds'], axis=0)
-            # first min of x
-            if (kwargs['xbounds'][0] < self.ncfile['xm'][:]).all():
-                # then set xmin to 0
-                removeMinX = 0
-            else:  # <= used here to handle inclusive initial index inherant in python
-                removeMinX = np.argwhere(self.ncfile['xm'][:] <= kwargs['xbounds'][0]).squeeze().max()
-            # now max of x
-            if (kwargs['xbounds'][1] > self.ncfile['xm'][:]).all():
-                removeMaxX = None
-            else:
-                removeMaxX = np.argwhere(
-                    self.ncfile['xm'][:] >= kwargs['xbounds'][1]).squeeze().min() + 1  # python indexing
-            xs = slice(removeMinX, removeMaxX)
-        else:
-            xs = slice(None)
+        xm = self.ncfile['xm'][:]
+        ym = self.ncfile['ym'][:]
+        xs = getBoundsSlice(xm, kwargs.get('xbounds', None))
+        ys = getBoundsSlice(ym, kwargs.get('ybounds', None))
 
-        if 'ybounds' in kwargs and np.array(kwargs['ybounds']).size == 2:
-            if kwargs['ybounds'][0] > kwargs['ybounds'][1]:
-                kwargs['ybounds'] = np.flip(kwargs['ybounds'], axis=0)
-            # first min of y
-            if (kwargs['ybounds'][0] < self.ncfile['ym'][:]).all():
-                # then set the ymin to first index [0]
-                removeMinY = 0  # ie get all data
-            else:
-                removeMinY = np.argwhere(self.ncfile['ym'][:] <= kwargs['ybounds'][0]).squeeze().max()
-            ## now max of y
-            if (kwargs['ybounds'][1] > self.ncfile['ym'][:]).all():
-                removeMaxY = None
-            else:
-                removeMaxY = np.argwhere(
-                    self.ncfile['ym'][:] >= kwargs['ybounds'][1]).squeeze().min() + 1  # python indexing
-            ys = slice(removeMinY, removeMaxY)
-        else:
-            ys = slice(None)
+        def readMasked(varName):
+            # single read, the mask is made locally and the data are not copied
+            data = np.ma.masked_less_equal(self.ncfile[varName][self.cbidx, ys, xs], fillValue, copy=False)
+            data.fill_value = np.nan
+            return data
 
         try:
             cbdata = {'time': self.cbtime,  # round the time to the nearest 30 minutes
                       'epochtime': self.allEpoch[self.cbidx],
-                      'xm': self.ncfile['xm'][xs],
-                      'ym': self.ncfile['ym'][ys],
-                      'depthKF': np.ma.array(self.ncfile['depthKF'][self.cbidx, ys, xs],
-                                             mask=(self.ncfile['depthKF'][self.cbidx, ys, xs] <= fillValue),
-                                             fill_value=np.nan),
-                      'depthKFError': np.ma.array(self.ncfile['depthKF'][self.cbidx, ys, xs],
-                                                  mask=(self.ncfile['depthKF'][self.cbidx, ys, xs] <= fillValue),
-                                                  fill_value=np.nan),
-                      'depthfC': np.ma.array(self.ncfile['depthfC'][self.cbidx, ys, xs],
-                                             mask=(self.ncfile['depthfC'][self.cbidx, ys, xs] <= fillValue),
-                                             fill_value=np.nan),
-                      'depthfCError': np.ma.array(self.ncfile['depthErrorfC'][self.cbidx, ys, xs],
-                                                  mask=(self.ncfile['depthErrorfC'][self.cbidx, ys, xs] <= fillValue),
-                                                  fill_value=np.nan),
-                      'fB': np.ma.array(self.ncfile['fB'][self.cbidx, ys, xs, :],
-                                        mask=(self.ncfile['fB'][self.cbidx, ys, xs, :] <= fillValue),
-                                        fill_value=np.nan),
-                      'k': np.ma.array(self.ncfile['k'][self.cbidx, ys, xs, :],
-                                       mask=(self.ncfile['k'][self.cbidx, ys, xs, :] <= fillValue), fill_value=np.nan),
-                      'P': np.ma.array(self.ncfile['PKF'][self.cbidx, ys, xs],
-                                       mask=(self.ncfile['PKF'][self.cbidx, ys, xs] <= fillValue),
-                                       fill_value=np.nan)}  # may need to be masked
-
-            assert ~cbdata['depthKF'].mask.all(), 'all Cbathy kalman filtered data retrieved are masked '
+                      'xm': xm[xs],
+                      'ym': ym[ys], }
+            for product in products:
+                if product == 'depthKFError' and productVariables[product] not in self.ncfile.variables:
+                    if 'P' not in cbdata:
+                        cbdata['P'] = readMasked(productVariables['P'])
+                    cbdata[product] = np.ma.sqrt(cbdata['P'])
+                elif product not in cbdata:
+                    cbdata[product] = readMasked(productVariables[product])
+            for product in list(cbdata.keys()):  # P may have been read only to make depthKFError
+                if product in productVariables and product not in products:
+                    del cbdata[product]
+
+            assert ~cbdata[products[0]].mask.all(), 'all Cbathy %s data retrieved are masked ' % products[0]
             print('Grabbed cBathy Data, successfully')
 
         except (IndexError, AssertionError):  # there's no data in the Cbathy
@@ -2118,22 +2299,82 @@ class getObs:
 
         return cbdata
 
-    def getArgus(self, type, **kwargs):
-        """Grabs argus data from the bathyDuck time period, particularly staple products.
-          Currently this is only retrieves variance and timex images.
+    def getcBathyPoints(self, points, products=('depthKF', 'P'), chunkSize=500):
+        """Gets cBathy time series at a handful of FRF locations, without pulling the full grids
+
+        The points are mapped to the nearest cBathy nodes once, then only those [t, y, x] cells are read for all of
+        the times between d1 and d2, in blocks of chunkSize times. Values less than or equal to the fill value (-999)
+        are masked.
+
+        Args:
+            points (list): list of (xFRF, yFRF) tuples, eg. altimeter or survey locations
+            products (list): cBathy products to retrieve, any of 'depthKF', 'depthfC', 'depthfCError', 'P'
+                (Default value = ('depthKF', 'P'))
+            chunkSize (int): number of times read with each server request (Default value = 500)
+
+        Returns:
+            dictionary with keys below, None if there are no data in the time period
+                'time': datetime objects [time]
+
+                'epochtime': epoch time [time]
+
+                'xm': cross-shore location of the cBathy node used for each point
+
+                'ym': alongshore location of the cBathy node used for each point
+
+                'xIdx', 'yIdx': indices of the cBathy node used for each point
+
+                each product in products: masked array [time, point]
+
+                'depthKFError': square root of the kalman filter error variance [time, point], when 'P' is retrieved
+
+        """
+        fillValue = -999  # assumed fill value, taken as less than or equal to
+        productVariables = {'depthKF': 'depthKF', 'depthfC': 'depthfC', 'depthfCError': 'depthErrorfC', 'P': 'PKF'}
+        assert set(products).issubset(productVariables.keys()), 'products must be in %s' % list(productVariables.keys())
+        self.dataloc = 'projects/bathyduck/data/cbathy_old/cbathy.ncml'
+        self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
+                                           dtRound=30 * 60)
+        self.cbidx = gettime(allEpoch=self.allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
+        if self.cbidx is None:
+            print('There is no cBathy data during this time period')
+            return None
+        idx = np.atleast_1d(self.cbidx)
+        xm = self.ncfile['xm'][:]
+        ym = self.ncfile['ym'][:]
+        points = np.atleast_2d(np.array(points, dtype=float))
+        xIdx = np.abs(xm[np.newaxis, :] - points[:, [0]]).argmin(axis=1)
+        yIdx = np.abs(ym[np.newaxis, :] - points[:, [1]]).argmin(axis=1)
+
+        out = {'time': nc.num2date(self.allEpoch[idx], 'seconds since 1970-01-01'),
+               'epochtime': self.allEpoch[idx],
+               'xm': xm[xIdx],
+               'ym': ym[yIdx],
+               'xIdx': xIdx,
+               'yIdx': yIdx, }
+        for product in products:
+            data = readPointColumns(self.ncfile[productVariables[product]], idx, yIdx, xIdx, chunkSize=chunkSize)
+            out[product] = np.ma.masked_less_equal(data, fillValue, copy=False)
+        if 'P' in out:
+            out['depthKFError'] = np.ma.sqrt(out['P'])
+        return out
+
+    def _argusWindow(self, type, stride=1, **kwargs):
+        """Opens the Argus product, finds the time indices and the (strided) window of interest
 
         Args:
             type (str): this is a string that describes the video product eg var, timex
+            stride (int): keep every stride-th pixel in x and y (Default value = 1)
 
         Keyword Args:
-            xbound: = [xmin, xmax]  which will truncate the cbathy domain to xmin, xmax (frf coord)
+            xbounds: = [xmin, xmax]  which will truncate the domain to xmin, xmax (frf coord)
 
-            ybound: = [ymin, ymax]  which will truncate the cbathy domain to ymin, ymax (frf coord)
+            ybounds: = [ymin, ymax]  which will truncate the domain to ymin, ymax (frf coord)
 
         Returns:
+            time indices (None if there are no data), xs, ys slices
 
         """
-        from skimage import color
         if type.lower() not in ['var', 'timex']:
             raise NotImplementedError("These data are not currently available through this function")
         elif type.lower() in ['var', 'variance']:
@@ -2147,57 +2388,169 @@ class getObs:
         self.idxArgus = gettime(allEpoch=self.allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
 
         ###### sub divide bounds in kwargs
-        if 'xbounds' in kwargs and np.array(kwargs['xbounds']).size == 2:
-            if kwargs['xbounds'][0] > kwargs['xbounds'][1]:
-                kwargs['xbounds'] = np.flip(kwargs['xbounds'], axis=0)
-            # first min of x
-            if (kwargs['xbounds'][0] < self.ncfile['x'][:]).all():
-                # then set xmin to 0
-                removeMinX = 0
-            else:  # <= used here to handle inclusive initial index inherant in python
-                removeMinX = np.argwhere(self.ncfile['x'][:] <= kwargs['xbounds'][0]).squeeze().max()
-            # now max of x
-            if (kwargs['xbounds'][1] > self.ncfile['x'][:]).all():
-                removeMaxX = None
-            else:
-                removeMaxX = np.argwhere(
-                    self.ncfile['x'][:] >= kwargs['xbounds'][1]).squeeze().min() + 1  # python indexing
-            xs = slice(removeMinX, removeMaxX)
-        else:
-            xs = slice(None)
+        xs = getBoundsSlice(self.ncfile['x'][:], kwargs.get('xbounds', None))
+        ys = getBoundsSlice(self.ncfile['y'][:], kwargs.get('ybounds', None))
+        xs = slice(xs.start, xs.stop, int(stride))
+        ys = slice(ys.start, ys.stop, int(stride))
+        return self.idxArgus, xs, ys
 
-        if 'ybounds' in kwargs and np.array(kwargs['ybounds']).size == 2:
-            if kwargs['ybounds'][0] > kwargs['ybounds'][1]:
-                kwargs['ybounds'] = np.flip(kwargs['ybounds'], axis=0)
-            # first min of y
-            if (kwargs['ybounds'][0] < self.ncfile['y'][:]).all():
-                # then set the ymin to first index [0]
-                removeMinY = 0  # ie get all data
-            else:
-                removeMinY = np.argwhere(self.ncfile['y'][:] <= kwargs['ybounds'][0]).squeeze().max()
-            ## now max of y
-            if (kwargs['ybounds'][1] > self.ncfile['y'][:]).all():
-                removeMaxY = None
-            else:
-                removeMaxY = np.argwhere(
-                    self.ncfile['y'][:] >= kwargs['ybounds'][1]).squeeze().min() + 1  # python indexing
-            ys = slice(removeMinY, removeMaxY)
-        else:
-            ys = slice(None)
+    def getArgus(self, type, **kwargs):
+        """Grabs argus data from the bathyDuck time period, particularly staple products.
+          Currently this is only retrieves variance and timex images.
+
+        This reads all of the frames in the time period at once, for more than a few frames use iterArgus.
+
+        The BathyDuck images are historical, if storeDir is given frames are kept in a local compressed image store
+        (see localTiles.imageStore), only frames that are not already in the store are pulled from the server.
+
+        Args:
+            type (str): this is a string that describes the video product eg var, timex
+
+        Keyword Args:
+            xbounds: = [xmin, xmax]  which will truncate the cbathy domain to xmin, xmax (frf coord)
+
+            ybounds: = [ymin, ymax]  which will truncate the cbathy domain to ymin, ymax (frf coord)
+
+            storeDir (str): folder of the local image store, built on demand (default=None, read from the server)
+
+        Returns:
+
+        """
+        if kwargs.get('storeDir', None) is not None:
+            return self._getArgusFromStore(type, **kwargs)
+        idxArgus, xs, ys = self._argusWindow(type, **kwargs)
         try:
-            timeArgus = nc.num2date(self.allEpoch[self.idxArgus], 'seconds since 1970-01-01')
-            Ip = self.ncfile['Ip'][self.idxArgus, xs, ys]
+            timeArgus = nc.num2date(self.allEpoch[idxArgus], 'seconds since 1970-01-01')
+            Ip = self.ncfile['Ip'][idxArgus, xs, ys]
             out = {'time': timeArgus,
-                   'epochtime': self.allEpoch[self.idxArgus],
+                   'epochtime': self.allEpoch[idxArgus],
                    'rgb': Ip,
-                   'bw': color.rgb2gray(Ip),
+                   'bw': rgb2gray(Ip),
                    'xFRF': self.ncfile['x'][xs],
                    'yFRF': self.ncfile['y'][ys],}
 
-        except(IndexError, AssertionError):
+        except(IndexError, AssertionError, TypeError):
             out = None
         return out
 
+    def _getArgusFromStore(self, type, storeDir, **kwargs):
+        """Serves getArgus from the local image store, copying frames that are missing from the server first
+
+        Args:
+            type (str): this is a string that describes the video product eg var, timex
+            storeDir (str): folder of the local image store
+
+        Keyword Args:
+            xbounds: = [xmin, xmax]  which will truncate the domain to xmin, xmax (frf coord)
+
+            ybounds: = [ymin, ymax]  which will truncate the domain to ymin, ymax (frf coord)
+
+        Returns:
+            same dictionary as getArgus, None if there are no frames in the time period
+
+        """
+        from getdatatestbed.localTiles import imageStore
+        with imageStore(os.path.join(storeDir, 'argus_{}.nc'.format(type.lower()))) as store:
+            remote = None
+            if not store.exists:  # first use, take the time axis and image size from the server
+                self._argusWindow(type)
+                remote = self.ncfile
+                store.create(remote, self.allEpoch)
+            elif self.epochd2 > store.allEpoch()[-1]:  # frames may have been published since the store was made
+                self._argusWindow(type)
+                remote = self.ncfile
+                if not store.extend(self.allEpoch):
+                    print('The server time axis of Argus %s changed, rebuilding the local store' % type)
+                    store.create(remote, self.allEpoch)
+            allEpoch = store.allEpoch()
+            idxArgus = gettime(allEpoch=allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
+            if idxArgus is None:
+                return None
+            idxArgus = np.atleast_1d(idxArgus)
+            missing = idxArgus[~store.isCached(idxArgus)]
+            if missing.size > 0:
+                if remote is None:
+                    self._argusWindow(type)
+                    remote = self.ncfile
+                print('Adding %d Argus %s frames to local store' % (missing.size, type))
+                store.add(remote, missing)
+            xs = getBoundsSlice(store.ncfile['x'][:], kwargs.get('xbounds', None))
+            ys = getBoundsSlice(store.ncfile['y'][:], kwargs.get('ybounds', None))
+            Ip = store.getFrames(idxArgus, xs, ys)
+            out = {'time': nc.num2date(allEpoch[idxArgus], 'seconds since 1970-01-01'),
+                   'epochtime': allEpoch[idxArgus],
+                   'rgb': Ip,
+                   'bw': rgb2gray(Ip),
+                   'xFRF': store.ncfile['x'][xs],
+                   'yFRF': store.ncfile['y'][ys], }
+        return out
+
+    def iterArgus(self, type, batchSize=1, stride=1, timeStride=1, outType='gray', **kwargs):
+        """Streams Argus frames in the time period, a batch of frames at a time, in bounded memory.
+
+        Frames are decimated at read time (strided server reads) and converted into a buffer that is allocated once
+        and re-used for every batch, copy the output if it is needed after the next batch is read.
+
+        Args:
+            type (str): this is a string that describes the video product eg var, timex
+            batchSize (int): number of frames read per server request (Default value = 1)
+            stride (int): keep every stride-th pixel in x and y (Default value = 1)
+            timeStride (int): keep every timeStride-th frame (Default value = 1)
+            outType (str): 'gray' grayscale as float in [0, 1] (same as getArgus 'bw'), 'uint8' grayscale as uint8,
+                'rgb' frames as they are on the server (Default value = 'gray')
+
+        Keyword Args:
+            xbounds: = [xmin, xmax]  which will truncate the domain to xmin, xmax (frf coord)
+
+            ybounds: = [ymin, ymax]  which will truncate the domain to ymin, ymax (frf coord)
+
+        Yields:
+            dictionary with keys below for each batch
+                'time': datetime objects [batch]
+
+                'epochtime': epoch time [batch]
+
+                'frames': images [batch, x, y] ([batch, x, y, 3] for outType 'rgb')
+
+                'xFRF': cross-shore coordinates
+
+                'yFRF': alongshore coordinates
+
+        """
+        assert outType in ['gray', 'uint8', 'rgb'], 'outType must be one of gray, uint8 or rgb'
+        idxArgus, xs, ys = self._argusWindow(type, stride=stride, **kwargs)
+        if idxArgus is None:
+            print('There is no Argus %s data during this time period' % type)
+            return
+        ncfile, allEpoch = self.ncfile, self.allEpoch
+        idxArgus = np.atleast_1d(idxArgus)[::int(timeStride)]
+        xFRF = ncfile['x'][xs]
+        yFRF = ncfile['y'][ys]
+        buffer, grayBuffer = None, None
+        for b0 in range(0, idxArgus.size, batchSize):
+            idxBatch = idxArgus[b0:b0 + batchSize]
+            if timeStride == 1:  # contiguous frames are one request
+                Ip = ncfile['Ip'][int(idxBatch[0]):int(idxBatch[-1]) + 1, xs, ys]
+            else:
+                Ip = ncfile['Ip'][idxBatch.tolist(), xs, ys]
+            Ip = np.ma.getdata(Ip)
+            if outType == 'rgb':
+                frames = Ip
+            else:
+                if buffer is None or buffer.shape[0] < Ip.shape[0]:  # only allocated for the first (largest) batch
+                    buffer = np.empty(Ip.shape[:-1], dtype=float)
+                    grayBuffer = np.empty(Ip.shape[:-1], dtype=np.uint8)
+                frames = rgb2gray(Ip, out=buffer[:Ip.shape[0]])
+                if outType == 'uint8':
+                    np.rint(np.multiply(frames, 255, out=frames), out=frames)
+                    np.copyto(grayBuffer[:Ip.shape[0]], frames, casting='unsafe')
+                    frames = grayBuffer[:Ip.shape[0]]
+            yield {'time': nc.num2date(allEpoch[idxBatch], 'seconds since 1970-01-01'),
+                   'epochtime': allEpoch[idxBatch],
+                   'frames': frames,
+                   'xFRF': xFRF,
+                   'yFRF': yFRF, }
+
 class getDataTestBed:
     # def __init__(self, start, end):
     #     """Data are returned in self.datainex are inclusive, exclusive at start, end, respectively
@@ -2412,6 +2765,7 @@ class getDataTestBed:
 
             ForcedSurveyDate (str): This is to force a date of survey gathering (Default value = None) if set to 'all'
                 it will pull multiple bathys, this can choke up the server, and is recommended to set xbounds and ybounds
+                or use iterBathyIntegratedTransect to stream the surveys one at a time
 
         Keyword Args:
            'cBKF': if true will get cBathy original Kalman Filter
@@ -2469,12 +2823,7 @@ class getDataTestBed:
         ####################################################################
         #  Set URL based on Keyword, Default to surveyed bathymetry        #
         ####################################################################
-        if 'cBKF_T' in kwargs and kwargs['cBKF_T'] == True:
-            self.dataloc = 'integratedBathyProduct/cBKF-T/cBKF-T.ncml'
-        elif 'cBKF' in kwargs and kwargs['cBKF'] == True:
-            self.dataloc = 'integratedBathyProduct/cBKF/cBKF.ncml'
-        else:
-            self.dataloc = 'integratedBathyProduct/survey/survey.ncml'
+        self.dataloc = self._integratedBathyDataloc(**kwargs)
         ####################################################################
         #   go get the index and return based on method chosen             #
         ####################################################################
@@ -2596,13 +2945,233 @@ class getDataTestBed:
 
         return gridDict
 
+    def _integratedBathyDataloc(self, **kwargs):
+        """Sets the URL back end of the integrated bathymetry products based on keyword, defaults to surveyed bathymetry
+
+        Keyword Args:
+           'cBKF': if true will get cBathy original Kalman Filter
+
+           'cBKF_T': if true will get wave height thresholded Kalman filter
+
+        Returns:
+            dataloc (str): location of the product on the server
+
+        """
+        if 'cBKF_T' in kwargs and kwargs['cBKF_T'] == True:
+            dataloc = 'integratedBathyProduct/cBKF-T/cBKF-T.ncml'
+        elif 'cBKF' in kwargs and kwargs['cBKF'] == True:
+            dataloc = 'integratedBathyProduct/cBKF/cBKF.ncml'
+        else:
+            dataloc = 'integratedBathyProduct/survey/survey.ncml'
+        return dataloc
+
+    def iterBathyIntegratedTransect(self, prefetch=False, **kwargs):
+        r"""Streams integrated bathymetries between start and end, one at a time.
+
+        This is a generator alternative to getBathyIntegratedTransect with forceReturnAll, only one bounded grid (two
+        with prefetch) is held in memory and each server request is for a single survey.  With prefetch the next survey
+        is read by a worker process, with its own connection to the server, while the caller works on the current one.
+        The netCDF library is not thread safe, so a thread can not be used for this.  Scripts that use prefetch need an
+        if __name__ == '__main__' guard on platforms that spawn processes (macOS, Windows).
+
+        Args:
+            prefetch (bool): read the next survey in a worker process while the current one is used (Default value =
+                False, surveys are read when they are asked for)
+
+        Keyword Args:
+           'cBKF': if true will get cBathy original Kalman Filter
+
+           'cBKF_T': if true will get wave height thresholded Kalman filter
+
+            'xbounds': = [xmin, xmax]  which will truncate the domain to xmin, xmax (frf coord)
+
+            'ybounds': = [ymin, ymax]  which will truncate the domain to ymin, ymax (frf coord)
+
+            'forceReturnAllPlusOne' (bool): also yield the bathymetry just before the start date (first)
+
+        Yields:
+          dictionary with keys (same as getBathyIntegratedTransect)
+            'xFRF': x coordinate in FRF
+
+            'yFRF': y coorindate in FRF
+
+            'elevation': bathymetry [y, x]
+
+            'time': time in Datetime objects
+
+            'lat': latitude
+
+            'lon': longitude
+
+            'surveyNumber': FRF survey number (metadata), surveyed product only
+
+        """
+        dataloc = self._integratedBathyDataloc(**kwargs)
+        ncfile, allEpoch = getnc(dataLoc=dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
+                                 dtRound=1 * 60, start=self.start, end=self.end)
+        idx = gettime(allEpoch=allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
+        if idx is None:
+            print('There are no integrated bathymetries between %s and %s' % (self.start, self.end))
+            return
+        idx = np.atleast_1d(idx)
+        if kwargs.get('forceReturnAllPlusOne', False) and idx.min() > 0:
+            idx = np.append(idx.min() - 1, idx)
+        # coordinates are the same for every survey, pull them once
+        xs = getBoundsSlice(ncfile['xFRF'][:], kwargs.get('xbounds', None))
+        ys = getBoundsSlice(ncfile['yFRF'][:], kwargs.get('ybounds', None))
+        xCoord = ncfile['xFRF'][xs]
+        yCoord = ncfile['yFRF'][ys]
+        lat = ncfile['latitude'][ys, xs]
+        lon = ncfile['longitude'][ys, xs]
+        isSurvey = dataloc.endswith('survey.ncml')
+
+        def _gridDict(ii, elevation):
+            gridDict = {'xFRF': xCoord,
+                        'yFRF': yCoord,
+                        'elevation': elevation,
+                        'time': nc.num2date(allEpoch[ii], 'seconds since 1970-01-01'),
+                        'lat': lat,
+                        'lon': lon, }
+            if isSurvey:
+                gridDict['surveyNumber'] = ncfile['surveyNumber'][ii]
+            return gridDict
+
+        if prefetch == False:
+            for ii in idx:
+                yield _gridDict(ii, ncfile['elevation'][ii, ys, xs])
+            return
+        fname = ncfile.filepath()
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(_readBlocks, fname, 'elevation', [(int(idx[0]), ys, xs)])
+            for nn, ii in enumerate(idx):
+                (data, mask), = pending.result()
+                if nn + 1 < idx.size:  # start on the next survey before handing this one over
+                    pending = pool.submit(_readBlocks, fname, 'elevation', [(int(idx[nn + 1]), ys, xs)])
+                yield _gridDict(ii, np.ma.masked_array(data, mask=mask))
+
+    def getBathyIntegratedPoints(self, points=None, yFRF=None, chunkSize=500, **kwargs):
+        r"""Gets the elevation history of a few points, or a single cross-shore line, from the integrated bathymetry.
+
+        The requested locations are mapped to the nearest grid nodes once, then only those [time, y, x] cells are
+        read from the server for all bathymetries between start and end, in blocks of chunkSize times.
+
+        Args:
+            points (list): list of (xFRF, yFRF) tuples of locations of interest (Default value = None)
+
+            yFRF (float): alongshore location of a cross-shore line, all cross-shore nodes (within xbounds) along it
+                are returned, used when points is None (Default value = None)
+
+            chunkSize (int): number of bathymetries read per server request (Default value = 500)
+
+        Keyword Args:
+           'cBKF': if true will get cBathy original Kalman Filter
+
+           'cBKF_T': if true will get wave height thresholded Kalman filter
+
+           'xbounds': = [xmin, xmax] which will truncate the line to xmin, xmax (frf coord), used with yFRF
+
+        Returns:
+          dictionary with keys below, None if there are no bathymetries in the time period
+            'time': time in Datetime objects [survey]
+
+            'epochtime': time in epoch [survey]
+
+            'elevation': masked array of bathymetry [survey, point]
+
+            'xFRF': x coordinate of the grid node used for each point
+
+            'yFRF': y coordinate of the grid node used for each point
+
+            'xIdx': cross-shore index of each point on the grid
+
+            'yIdx': alongshore index of each point on the grid
+
+            'surveyNumber': FRF survey number (metadata), surveyed product only
+
+        """
+        assert points is not None or yFRF is not None, 'please provide points or a yFRF line'
+        dataloc = self._integratedBathyDataloc(**kwargs)
+        ncfile, allEpoch = getnc(dataLoc=dataloc, THREDDS=self.THREDDS, callingClass=self.callingClass,
+                                 dtRound=1 * 60, start=self.start, end=self.end)
+        idx = gettime(allEpoch=allEpoch, epochStart=self.epochd1, epochEnd=self.epochd2)
+        if idx is None:
+            print('There are no integrated bathymetries between %s and %s' % (self.start, self.end))
+            return None
+        idx = np.atleast_1d(idx)
+        # map locations to grid indices once
+        xCoord = ncfile['xFRF'][:]
+        yCoord = ncfile['yFRF'][:]
+        if points is not None:
+            points = np.atleast_2d(np.array(points, dtype=float))
+            xIdx = np.abs(xCoord[np.newaxis, :] - points[:, [0]]).argmin(axis=1)
+            yIdx = np.abs(yCoord[np.newaxis, :] - points[:, [1]]).argmin(axis=1)
+        else:
+            xs = getBoundsSlice(xCoord, kwargs.get('xbounds', None))
+            xIdx = np.arange(xCoord.size)[xs]
+            yIdx = np.full(xIdx.shape, np.abs(yCoord - yFRF).argmin())
+        elevation = readPointColumns(ncfile['elevation'], idx, yIdx, xIdx, chunkSize=chunkSize)
+
+        out = {'time': nc.num2date(allEpoch[idx], 'seconds since 1970-01-01'),
+               'epochtime': allEpoch[idx],
+               'elevation': elevation,
+               'xFRF': xCoord[xIdx],
+               'yFRF': yCoord[yIdx],
+               'xIdx': xIdx,
+               'yIdx': yIdx, }
+        if dataloc.endswith('survey.ncml'):
+            out['surveyNumber'] = ncfile['surveyNumber'][idx]
+        return out
+
     def getStwaveField(self, var, prefix, local=True, ijLoc=None, model='STWAVE'):
         warnings.warn('Using depricated function name: getStwaveField')
         return self.getModelField(var, prefix, local, ijLoc, model)
 
+    def _modelFieldURL(self, prefix, local=True, model='STWAVE'):
+        """Builds the url of the spatial field ncml file of a model run
+
+        Args:
+            prefix (str): this dictates which model run data are retrieved from
+            local (bool): pull from the nested grid or the regional grid (Default value = True)
+            model (str): one of: STWAVE, CMS (other models can be added)
+
+        Returns:
+            fname (str): url of the field data
+
+        """
+        if local == True:
+            grid = 'Local'
+        elif local == False:
+            grid = 'Regional'
+        if prefix == 'CBHPStatic' and local == True:  # this is needed because projects are stored in weird place
+            fname = 'http://bones/thredds/dodsC/CMTB/projects/bathyDuck_SingleBathy_CBHP/Local_Field/Local_Field.ncml'
+        elif prefix == 'CBHPStatic' and local == False:
+            fname = 'http://bones/thredds/dodsC/CMTB/projects/bathyDuck_SingleBathy_CBHP/Regional_Field/Regional_Field.ncml'
+        elif model == 'STWAVE':  # this is standard operational model url Structure
+            fname = self.crunchDataLoc + u'waveModels/%s/%s/%s-Field/%s-Field.ncml' % (model, prefix, grid, grid)
+        elif model == 'CMS':  # this is standard operational model url Structure
+            fname = self.crunchDataLoc + u'waveModels/%s/%s/Field/Field.ncml' % (model, prefix)
+        return fname
+
+    @staticmethod
+    def _openModelField(fname):
+        """Opens a model field file, retrying while the server is busy"""
+        n = 0
+        while n < 15:
+            try:
+                return nc.Dataset(fname)
+            except IOError:
+                print('Error reading {}, trying again'.format(fname))
+                time.sleep(10)
+                n += 1
+        raise RuntimeError('Data not accessible right now')
+
     def getModelField(self, var, prefix, local=True, ijLoc=None, model='STWAVE', **kwargs):
         """retrives data from spatial data CMSWave and STWAVE model
 
+        The output is sized from the time indices first, then filled with blocks of time steps, with ijLoc/bounds
+        applied in each request.  Blocks are read one after another unless the workers keyword asks for worker
+        processes.
+
         Args:
             local (bool): defines whether the data is from the nested simulation or the regional simulation (Default value = True)
 
@@ -2617,9 +3186,13 @@ class getDataTestBed:
 
             model (str): one of: STWAVE, CMS (other models can be added)
         Keyword Args:
-            xbound: = [xmin, xmax]  which will truncate the cbathy domain to xmin, xmax (frf coord)
+            xbounds: = [xmin, xmax]  which will truncate the cbathy domain to xmin, xmax (frf coord)
 
-            ybound: = [ymin, ymax]  which will truncate the cbathy domain to ymin, ymax (frf coord)
+            ybounds: = [ymin, ymax]  which will truncate the cbathy domain to ymin, ymax (frf coord)
+
+            blockSize (int): number of time steps pulled with each request (default=100)
+
+            workers (int): number of worker processes reading time blocks, see readTimeBlocks (default=1)
 
         Returns:
             a dictionary with keys below, see netCDF file for more metadata
@@ -2635,148 +3208,215 @@ class getDataTestBed:
             'yFRF' (int): y location of data
 
         """
-        if local == True:
-            grid = 'Local'
-        elif local == False:
-            grid = 'Regional'
-        ############## setting up the ncfile ############################
-        if prefix == 'CBHPStatic' and local == True:  # this is needed because projects are stored in weird place
-            fname = 'http://bones/thredds/dodsC/CMTB/projects/bathyDuck_SingleBathy_CBHP/Local_Field/Local_Field.ncml'
-        elif prefix == 'CBHPStatic' and local == False:
-            fname = 'http://bones/thredds/dodsC/CMTB/projects/bathyDuck_SingleBathy_CBHP/Regional_Field/Regional_Field.ncml'
-        elif model == 'STWAVE':  # this is standard operational model url Structure
-            fname = self.crunchDataLoc + u'waveModels/%s/%s/%s-Field/%s-Field.ncml' % (model, prefix, grid, grid)
-        elif model == 'CMS':  # this is standard operational model url Structure
-            fname = self.crunchDataLoc + u'waveModels/%s/%s/Field/Field.ncml' % (model, prefix)
-        finished = False
-        n = 0
-        while not finished and n < 15:
-            try:
-                ncfile = nc.Dataset(fname)
-                finished = True
-            except IOError:
-                print('Error reading {}, trying again'.format(fname))
-                time.sleep(10)
-                n+=1
-        if not finished:
-            raise (RuntimeError, 'Data not accessible right now')
+        fname = self._modelFieldURL(prefix, local=local, model=model)
+        field = self._readModelField(fname, [var], prefix, local=local, ijLoc=ijLoc, model=model, **kwargs)
+        assert field is not None, " there's no data"
+        return field
+
+    def _readModelField(self, fname, varList, prefix, local=True, ijLoc=None, model='STWAVE', **kwargs):
+        """Reads one or more variables from a model field file, the time and grid indices are worked out once and
+        used for every variable
 
-        assert var in ncfile.variables.keys(), 'variable called is not in file please use\n%s' % ncfile.variables.keys()
+        Args:
+            fname (str): url of the field data
+            varList (list): variables to read
+            prefix (str): model run, for status messages
+            local (bool): nested or regional grid, for status messages (Default value = True)
+            ijLoc (tuple): see getModelField (Default value = None)
+            model (str): one of: STWAVE, CMS (Default value = 'STWAVE')
+
+        Keyword Args:
+            see getModelField
 
-        mask = (ncfile['time'][:] >= nc.date2num(self.start, ncfile['time'].units)) & (
-                ncfile['time'][:] <= nc.date2num(self.end, ncfile['time'].units))
+        Returns:
+            field dictionary as returned by getModelField with a key for each variable, None if there's no data
+
+        """
+        ncfile = self._openModelField(fname)
+        for var in varList:
+            assert var in ncfile.variables.keys(), 'variable called is not in file please use\n%s' % ncfile.variables.keys()
+
+        allTime = ncfile['time'][:]  # time is only pulled once
+        mask = (allTime >= nc.date2num(self.start, ncfile['time'].units)) & (
+                allTime <= nc.date2num(self.end, ncfile['time'].units))
         idx = np.where(mask)[0]
-        assert np.size(idx > 0), " there's no data"
+        if np.size(idx) == 0:
+            print('There is no %s %s data between %s and %s' % (prefix, model, self.start, self.end))
+            return None
         if model == 'STWAVE':
-            print('getting %s %s  %s %s Data' % (prefix, model, grid, var))
+            print('getting %s %s  %s %s Data' % (prefix, model, 'Local' if local else 'Regional', ', '.join(varList)))
         elif model == 'CMS':
-            print('getting %s %s  %s Data' % (prefix, model, var))
+            print('getting %s %s  %s Data' % (prefix, model, ', '.join(varList)))
         ##############################################################################################################
         # now creating tool to remove single data point
-        if ijLoc != None:
+        if ijLoc is not None:
             assert len(ijLoc) == 2, 'if giving a postion, must be a tuple of i, j location (of length 2)'
-            if type(ijLoc[0]) == int:
-                x = ncfile[var].shape[1] - ijLoc[0]  # the data are stored with inverse indicies to grid node locations
+            if isinstance(ijLoc[0], (int, np.integer)):
+                x = ncfile[varList[0]].shape[1] - ijLoc[0]  # the data are stored with inverse indicies to grid node locations
                 y = ijLoc[1]  # use location given by function call
             else:  # ijLoc[0] == slice:
                 x = ijLoc[0]
-                y = np.argmin(np.abs(ncfile['yFRF'][:] - ijLoc[1]))
-
+                y = int(np.argmin(np.abs(ncfile['yFRF'][:] - ijLoc[1])))
         else:
             x = slice(None)  # take entire data
             y = slice(None)  # take entire data
         ############################################ xbounds/ybounds #################################################
         ###### sub divide bounds by x and y to get subdomain
-        if 'xbounds' in kwargs and np.array(kwargs['xbounds']).size == 2:
-            if kwargs['xbounds'][0] > kwargs['xbounds'][1]:
-                kwargs['xbounds'] = np.flip(kwargs['xbounds'], axis=0)
-            # first min of x
-            if (kwargs['xbounds'][0] < ncfile['xFRF'][:]).all():
-                # then set xmin to 0
-                removeMinX = 0
-            else:  # <= used here to handle inclusive initial index inherant in python
-                removeMinX = np.argwhere(ncfile['xFRF'][:] <= kwargs['xbounds'][0]).squeeze().max()
-            # now max of x
-            if (kwargs['xbounds'][1] > ncfile['xFRF'][:]).all():
-                removeMaxX = None
-            else:
-                removeMaxX = np.argwhere(
-                    ncfile['x'][:] >= kwargs['xbounds'][1]).squeeze().min() + 1  # python indexing
-            x = slice(removeMinX, removeMaxX)
-        else:
-            x = slice(None)
-
-        if 'ybounds' in kwargs and np.array(kwargs['ybounds']).size == 2:
-            if kwargs['ybounds'][0] > kwargs['ybounds'][1]:
-                kwargs['ybounds'] = np.flip(kwargs['ybounds'], axis=0)
-            # first min of y
-            if (kwargs['ybounds'][0] < ncfile['yFRF'][:]).all():
-                # then set the ymin to first index [0]
-                removeMinY = 0  # ie get all data
-            else:
-                removeMinY = np.argwhere(ncfile['yFRF'][:] <= kwargs['ybounds'][0]).squeeze().max()
-            ## now max of y
-            if (kwargs['ybounds'][1] > ncfile['yFRF'][:]).all():
-                removeMaxY = None
-            else:
-                removeMaxY = np.argwhere(
-                    ncfile['yFRF'][:] >= kwargs['ybounds'][1]).squeeze().min() + 1  # python indexing
-            y = slice(removeMinY, removeMaxY)
-        else:
-            y = slice(None)
+        if np.array(kwargs.get('xbounds', None)).size == 2:
+            x = getBoundsSlice(ncfile['xFRF'][:], kwargs['xbounds'])
+        if np.array(kwargs.get('ybounds', None)).size == 2:
+            y = getBoundsSlice(ncfile['yFRF'][:], kwargs['ybounds'])
         ################################################################################################################
-        if ncfile[var].ndim > 2 and idx.shape[0] > 100:  # looping through ... if necessary
-            list = np.round(np.linspace(idx.min(), idx.max(), idx.max() - idx.min(), endpoint=True, dtype=int))
-            # if idx.max() not in list:
-            #     list = np.append(list, idx.max())
-            xFRF = ncfile['xFRF'][x]
-            yFRF = ncfile['yFRF'][y]
-            if len(list) < 100:
-                dataVar = np.array(ncfile[var][np.squeeze(list)])
-                timeVar = nc.num2date(ncfile['time'][np.squeeze(list)], ncfile['time'].units)
-            else:
-                for num, minidx in enumerate(list):
-                    if len(list) < 100:
-                        dataVar = np.array(ncfile[var][np.squeeze(list)])
-                        timeVar = nc.num2date(ncfile['time'][np.squeeze(list)], ncfile['time'].units)
-                    elif num == 0:
-                        dataVar = np.array(ncfile[var][range(minidx, list[num + 1]), y, x])
-                        timeVar = nc.num2date(np.array(ncfile['time'][range(minidx, list[num + 1])]), ncfile['time'].units)
-                    elif minidx == list[-1]:
-                        lastIdx = (idx - minidx)[(idx - minidx) >= 0] + minidx
-                        dataVar = np.append(dataVar, ncfile[var][lastIdx, y, x], axis=0)
-                        timeVar = np.append(timeVar, nc.num2date(ncfile['time'][lastIdx], ncfile['time'].units), axis=0)
-                    else:
-                        dataVar = np.append(dataVar, ncfile[var][range(minidx, list[num + 1]), y, x], axis=0)
-                        timeVar = np.append(timeVar, nc.num2date(ncfile['time'][range(minidx, list[num + 1])],
-                                                                 ncfile['time'].units), axis=0)
-
-        elif ncfile[var].ndim > 2:
-            dataVar = ncfile[var][idx, y, x]
-            xFRF = ncfile['xFRF'][x]
-            yFRF = ncfile['yFRF'][y]
-            timeVar = nc.num2date(ncfile['time'][np.squeeze(idx)], ncfile['time'].units)
-        else:  # probably bathymetry date variable
-            dataVar = ncfile[var][idx]
-            xFRF = ncfile['xFRF'][x]
-            yFRF = ncfile['yFRF'][y]
-            timeVar = nc.num2date(ncfile['time'][np.squeeze(idx)], ncfile['time'].units)
         # package for output
-        field = {'time': timeVar,
-                 'epochtime': ncfile['time'][idx],  # pulling down epoch time of interest
-                  var: dataVar,
-                 'xFRF': xFRF,
-                 'yFRF': yFRF,
+        field = {'time': nc.num2date(allTime[idx], ncfile['time'].units),
+                 'epochtime': allTime[idx],  # epoch time of interest
+                 'xFRF': ncfile['xFRF'][x],
+                 'yFRF': ncfile['yFRF'][y],
                  }
-        try:
-            field['bathymetryDate'] = ncfile['bathymetryDate'][idx]
-        except IndexError:
-            field['bathymetryDate'] = np.ones_like(field['time'])
-
-        assert field[var].shape[0] == len(field['time']), " the indexing is wrong for pulling down the spatial output"
+        for var in varList:
+            if ncfile[var].ndim > 2:
+                field[var] = readTimeBlocks(fname, var, idx, window=(y, x), blockSize=kwargs.get('blockSize', 100),
+                                            workers=kwargs.get('workers', 1), ncfile=ncfile)
+            else:  # probably bathymetry date variable
+                field[var] = ncfile[var][idx]
+            assert field[var].shape[0] == len(field['time']), " the indexing is wrong for pulling down the spatial output"
+        if 'bathymetryDate' not in field:
+            try:
+                field['bathymetryDate'] = ncfile['bathymetryDate'][idx]
+            except IndexError:
+                field['bathymetryDate'] = np.ones_like(field['time'])
         field = removeDuplicatesFromDictionary(field)
         return field
 
+    def getModelFields(self, var, prefix, local=True, ijLoc=None, model='STWAVE', workers=1, **kwargs):
+        """retrives several variables from several model runs of spatial data CMSWave and STWAVE model
+
+        Each run (prefix) is opened once and its time/grid indices are shared by all of the variables.  With
+        workers > 1 runs are pulled from the server concurrently by worker processes (scripts that do so need an
+        if __name__ == '__main__' guard on platforms that spawn processes, macOS and Windows).
+
+        Args:
+            var (str, list): variable (or list of variables) from the spatial data ncml file
+
+            prefix (str, list): model run (or list of model runs) eg. ['CB', 'HP', 'CBHP', 'FP']
+
+            local (bool): pull from the nested grid or the regional grid (Default value = True)
+
+            ijLoc (tuple): see getModelField (Default value = None)
+
+            model (str): one of: STWAVE, CMS (Default value = 'STWAVE')
+
+            workers (int): number of runs read at once by worker processes, each run is read serially (Default value = 1,
+                one run after the other)
+
+        Keyword Args:
+            same as getModelField (except workers)
+
+        Returns:
+            dictionary of field dictionaries (see getModelField) keyed by prefix, each holding every variable, so data
+            are indexed as [prefix][var].  A prefix with no data in the time period is None
+
+        """
+        varList = [var] if isinstance(var, str) else list(var)
+        prefixList = [prefix] if isinstance(prefix, str) else list(prefix)
+        fnames = [self._modelFieldURL(pp, local=local, model=model) for pp in prefixList]
+        if len(prefixList) == 1 or workers <= 1:
+            return {pp: self._readModelField(fname, varList, pp, local=local, ijLoc=ijLoc, model=model, **kwargs)
+                    for fname, pp in zip(fnames, prefixList)}
+        with ProcessPoolExecutor(max_workers=min(workers, len(prefixList))) as pool:
+            futures = [pool.submit(_readModelFieldWorker, self.start, self.end, self.THREDDS, fname, varList, pp, local,
+                                   ijLoc, model, kwargs) for fname, pp in zip(fnames, prefixList)]
+            fields = [future.result() for future in futures]
+        return dict(zip(prefixList, fields))
+
+    @staticmethod
+    def _modelNodeTree(fname, ncfile):
+        """Gets the KD-tree of the grid nodes of a model field, building it on the first call for fname
+
+        Args:
+            fname (str): url of the field data, used as the cache key
+            ncfile (netCDF4.Dataset): open field data with xFRF and yFRF
+
+        Returns:
+            (tree, shape) the scipy.spatial.cKDTree of the [y, x] nodes and the [y, x] shape of the grid
+
+        """
+        if fname not in _modelNodeCache:
+            from scipy.spatial import cKDTree
+            xFRF, yFRF = ncfile['xFRF'][:], ncfile['yFRF'][:]
+            if xFRF.ndim == 1:  # rectilinear grid
+                xFRF, yFRF = np.meshgrid(xFRF, yFRF)
+            _modelNodeCache[fname] = (cKDTree(np.column_stack((np.ravel(xFRF), np.ravel(yFRF)))), xFRF.shape)
+        return _modelNodeCache[fname]
+
+    def getModelStations(self, stations, var, prefix, local=True, model='STWAVE', chunkSize=500):
+        """Gets time series of spatial model output at many stations (eg. gauge locations)
+
+        Stations are mapped to the nearest grid node with a KD-tree that is kept for each field file, then only those
+        [t, j, i] cells are read from the server for every variable, in blocks of chunkSize times.
+
+        Args:
+            stations (list): list of (xFRF, yFRF) tuples of station locations
+
+            var (str, list): variable (or list of variables) from the spatial data ncml file
+
+            prefix (str): this dictates which model run data are retrieved from
+
+            local (bool): pull from the nested grid or the regional grid (Default value = True)
+
+            model (str): one of: STWAVE, CMS (Default value = 'STWAVE')
+
+            chunkSize (int): number of time steps read per server request (Default value = 500)
+
+        Returns:
+            a dictionary with keys below
+
+            'time' (obj):  date time object [time]
+
+            'epochtime' (float): epoch time [time]
+
+            var: masked array of each variable [time, station]
+
+            'xFRF': x location of the grid node used for each station
+
+            'yFRF': y location of the grid node used for each station
+
+            'xIdx': x index of each station on the grid
+
+            'yIdx': y index of each station on the grid
+
+            'distance': distance between each station and its grid node
+
+        """
+        varList = [var] if isinstance(var, str) else list(var)
+        fname = self._modelFieldURL(prefix, local=local, model=model)
+        ncfile = self._openModelField(fname)
+        for vv in varList:
+            assert vv in ncfile.variables.keys(), '%s is not in file please use\n%s' % (vv, ncfile.variables.keys())
+
+        allTime = ncfile['time'][:]
+        mask = (allTime >= nc.date2num(self.start, ncfile['time'].units)) & (
+                allTime <= nc.date2num(self.end, ncfile['time'].units))
+        idx = np.where(mask)[0]
+        assert np.size(idx) > 0, " there's no data"
+        print('getting %s %s %s at %d stations' % (prefix, model, ', '.join(varList), len(stations)))
+        # map stations to grid nodes once
+        tree, shape = self._modelNodeTree(fname, ncfile)
+        stations = np.atleast_2d(np.array(stations, dtype=float))
+        distance, node = tree.query(stations)
+        yIdx, xIdx = np.unravel_index(node, shape)
+
+        out = {'time': nc.num2date(allTime[idx], ncfile['time'].units),
+               'epochtime': allTime[idx],
+               'xFRF': tree.data[node, 0],
+               'yFRF': tree.data[node, 1],
+               'xIdx': xIdx,
+               'yIdx': yIdx,
+               'distance': distance, }
+        for vv in varList:
+            out[vv] = readPointColumns(ncfile[vv], idx, yIdx, xIdx, chunkSize=chunkSize)
+        return out
+
     def getWaveSpecSTWAVE(self, prefix, gaugenumber, local=True, model='STWAVE'):
         warnings.warn('Using depricated function name')
 
@@ -2858,45 +3498,8 @@ class getDataTestBed:
             urlFront = 'projects/%s/CBThresh_0_paperSubmittedV1' % model
 
         ############### now identify file name #################
-        if gaugenumber in [0, 'waverider-26m', 'Waverider-26m', '26m']:
-            # 26 m wave rider
-            fname = 'waverider-26m/waverider-26m.ncml'
-            gname = '26m Waverider Buoy'
-        elif gaugenumber in [1, 'Waverider-17m', 'waverider-17m']:
-            # 2D 17m waverider
-            fname = 'waverider-17m/waverider-17m.ncml'
-            gname = '17m Waverider Buoy'
-        elif gaugenumber in [2, 'AWAC-11m', 'awac-11m', 'Awac-11m']:
-            gname = 'AWAC04 - 11m'
-            fname = 'awac-11m/awac-11m.ncml'
-        elif gaugenumber in [3, 'awac-8m', 'AWAC-8m', 'Awac-8m', 'awac 8m',
-                             '8m-Array', '8m Array', '8m array', '8m-array']:
-            gname = 'AWAC 8m'
-            fname = '8m-array/8m-array.ncml'
-        elif gaugenumber in [4, 'awac-6m', 'AWAC-6m']:
-            gname = 'AWAC 6m'
-            fname = 'awac-6m/awac-6m.ncml'
-        elif gaugenumber in [5, 'awac-4.5m', 'Awac-4.5m']:
-            gname = 'AWAC 4.5m'
-            fname = 'awac-4.5m/awac-4.5m.ncml'
-        elif gaugenumber in [6, 'adop-3.5m', 'aquadopp 3.5m']:
-            gname = 'Aquadopp 3.5m'
-            fname = 'adop-3.5m/adop-3.5m.ncml'
-        elif gaugenumber in [8, 'xp200m', 'xp200']:
-            gname = 'Paros xp200m'
-            fname = 'xp200m/xp200m.ncml'
-        elif gaugenumber in [9, 'xp150m', 'xp150']:
-            gname = 'Paros xp150m'
-            fname = 'xp150m/xp150m.ncml'
-        elif gaugenumber == 10 or gaugenumber == 'xp125m':
-            gname = 'Paros xp125m'
-            fname = 'xp125m/xp125m.ncml'
-        elif gaugenumber == 11 or gaugenumber == 'xp100m':
-            gname = 'Paros xp100m'
-            fname = 'xp100m/xp100m.ncml'
-        else:
-            gname = 'There Are no Gauge numbers here'
-            raise NameError('Bad Gauge name, specify proper gauge name/number')
+        gauge = instruments.lookup('modelWaves', gaugenumber)
+        fname, gname = gauge['dataloc'], gauge['gname']
         # parsing out data of interest in time
         self.dataloc = urlFront + '/' + fname
         self.ncfile, self.allEpoch = getnc(dataLoc=self.dataloc, THREDDS=self.THREDDS,
@@ -1,8 +1,315 @@
+import collections
 import datetime as DT
+import fnmatch
+import ftplib
+import hashlib
+import http.client
 import netCDF4 as nc
 import os
+import pickle
+import re
 import numpy as np
 import sys
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parseWW3Spectra(bulletin):
+    """Parses a WAVEWATCH III spectral bulletin (eg. multi_1.44100.spec from the NCEP nomads server)
+    into sorted spectra [t, freq, dir].
+
+    The date lines are found in one pass, then the spectral values of all of the times are converted with a single
+    np.fromstring call into one array.  Directions are converted from oceanographic (radians) to meteorological
+    (degrees) convention and the spectra from m^2 s rad^-1 to m^2 s deg^-1 (to keep FRF gauge data conventions),
+    frequencies and directions are sorted in ascending order, for all times at once.
+
+    Args:
+        bulletin: the bulletin as bytes or a string, a file name, or an open (binary or text) file/stream
+
+    Returns:
+        dictionary with keys (see forecastData.getWW3)
+          :key 'wavedirbin': directions [deg]
+          :key 'wavefreqbin': frequencies [Hz]
+          :key 'buoyNum': buoy number
+          :key 'dWED': 2dimensional wave spectra [t, freq, dir]
+          :key 'lat': latitude
+          :key 'lon': longitude
+          :key 'Depth': depth
+          :key 'time': date time
+
+    """
+    if hasattr(bulletin, 'read'):
+        bulletin = bulletin.read()
+    elif isinstance(bulletin, str) and '\n' not in bulletin and os.path.isfile(bulletin):
+        with open(bulletin, 'rb') as fid:
+            bulletin = fid.read()
+    if isinstance(bulletin, bytes):
+        bulletin = bulletin.decode('ascii', 'replace')
+    lines = bulletin.splitlines()
+    # header  'WAVEWATCH III SPECTRA'  nFreq nDir nPoints 'description'
+    header = re.match(r"\s*'[^']*'\s+(\d+)\s+(\d+)\s+(\d+)", lines[0])
+    assert header is not None, 'this is not a WAVEWATCH III spectral bulletin'
+    nFreq, nDir = int(header.group(1)), int(header.group(2))
+    nFreqLines, nDirLines = int(np.ceil(nFreq / 8.)), int(np.ceil(nDir / 7.))  # 8 frequencies, 7 directions per line
+    frequencies = np.fromstring(' '.join(lines[1:1 + nFreqLines]), sep=' ')
+    directions = np.fromstring(' '.join(lines[1 + nFreqLines:1 + nFreqLines + nDirLines]), sep=' ')
+    assert frequencies.size == nFreq and directions.size == nDir, 'could not read the spectral bins'
+
+    # locate the date lines (yyyymmdd hhmmss) of each spectrum
+    dateLine = re.compile(r'\s*(\d{8})\s+(\d{6})\s*$')
+    dateLines = [ii for ii, line in enumerate(lines) if dateLine.match(line)]
+    forcastDates = np.array([DT.datetime.strptime(''.join(lines[ll].split()), '%Y%m%d%H%M%S') for ll in dateLines])
+    numLinesPerSpec = int(np.ceil(nFreq * nDir / float(len(lines[dateLines[0] + 2].split()))))
+    # station line  'name'  lon lat depth ...  (only grab it once, it does not change)
+    station = re.match(r"\s*'([^']*)'\s+(.*)", lines[dateLines[0] + 1])
+    buoyStats = station.group(2).split()
+    buoyNum = int(station.group(1).strip())
+    lon, lat, Depth = float(buoyStats[0]), float(buoyStats[1]), float(buoyStats[2])
+
+    # all spectra at once, values are stored with frequency changing fastest
+    spectraText = ' '.join(' '.join(lines[ll + 2:ll + 2 + numLinesPerSpec]) for ll in dateLines)
+    spectra = np.fromstring(spectraText, sep=' ')
+    assert spectra.size == len(dateLines) * nFreq * nDir, 'the bulletin is incomplete'
+    spectra = spectra.reshape(len(dateLines), nDir, nFreq).transpose(0, 2, 1)
+
+    # MPG: convert directions from radians to degrees, then from oceanographic to meteorological
+    # convention to be consistent w/ FRF wave gauge data.
+    directions = np.rad2deg(directions)
+    directions = np.where(directions < 180.0, directions + 180.0, directions - 180.0)
+    # MPG: sort directions and frequencies.
+    didx = directions.argsort()
+    fidx = frequencies.argsort()
+    # MPG: convert dWED from rad^-1 to deg^-1 to be consistent w/ FRF wave gauge data.
+    spectra = spectra[:, fidx][:, :, didx] * 2 * np.pi / 180.0
+
+    out = {'wavedirbin': directions[didx],
+           'wavefreqbin': frequencies[fidx],
+           'buoyNum': buoyNum,
+           'dWED': spectra,
+           'lat': lat,
+           'lon': lon,
+           'Depth': Depth,
+           'time': forcastDates}
+    return out
+
+
+class httpPool:
+    """Kept-alive HTTP(S) connections that are shared by the requests of each thread (one connection per host per
+    thread), so many small downloads from the same server do not each pay for a new connection."""
+
+    def __init__(self, timeout=60, maxRedirects=5):
+        """
+        Args:
+            timeout (float): socket timeout in seconds (default=60)
+            maxRedirects (int): number of redirects to follow (default=5)
+
+        """
+        self.timeout = timeout
+        self.maxRedirects = maxRedirects
+        self._local = threading.local()
+
+    def _connection(self, scheme, netloc, fresh=False):
+        connections = self._local.__dict__.setdefault('connections', {})
+        if fresh and (scheme, netloc) in connections:
+            connections.pop((scheme, netloc)).close()
+        if (scheme, netloc) not in connections:
+            connType = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[(scheme, netloc)] = connType(netloc, timeout=self.timeout)
+        return connections[(scheme, netloc)]
+
+    def get(self, url, headers=None):
+        """GET request on a pooled connection, following redirects
+
+        Args:
+            url (str): http(s) url
+            headers (dict): request headers (default=None)
+
+        Returns:
+            status (int), response headers (dict with lower case keys), body (bytes)
+
+        """
+        for _ in range(self.maxRedirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path + ('?' + parts.query if parts.query else '')
+            for attempt in range(2):  # a kept-alive connection might have been closed by the server, retry once
+                conn = self._connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+                try:
+                    conn.request('GET', path or '/', headers=headers or {})
+                    response = conn.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    conn.close()
+                    if attempt > 0:
+                        raise
+            responseHeaders = {key.lower(): value for key, value in response.getheaders()}
+            if response.status in (301, 302, 303, 307, 308) and 'location' in responseHeaders:
+                url = urllib.parse.urljoin(url, responseHeaders['location'])
+                continue
+            return response.status, responseHeaders, body
+        raise IOError('too many redirects for %s' % url)
+
+
+def getCachedURL(url, cacheFile=None, pool=None, revalidate=True):
+    """Gets a (raw) file from a url, keeping a copy on disk that is revalidated with a conditional request
+
+    The ETag and Last-Modified headers of the server are kept next to the cached file (cacheFile + '.pkl'), a cached
+    file is revalidated with If-None-Match/If-Modified-Since so unchanged files are not sent again.  Files are written
+    to a temporary file and renamed, so other processes never see a partial file.
+
+    Args:
+        url (str): http(s) url of the file
+        cacheFile (str): where to keep the file, if None the file is not cached (default=None)
+        pool (httpPool): pooled connections to use (default=None, a new pool)
+        revalidate (bool): check cached files with the server, if False cached files are used as they are
+            (default=True)
+
+    Returns:
+        contents of the file (bytes), None if the file is not on the server
+
+    """
+    pool = httpPool() if pool is None else pool
+    cached = cacheFile is not None and os.path.isfile(cacheFile)
+    if cached and not revalidate:
+        with open(cacheFile, 'rb') as fid:
+            return fid.read()
+    headers, meta = {}, {}
+    if cached and os.path.isfile(cacheFile + '.pkl'):
+        with open(cacheFile + '.pkl', 'rb') as fid:
+            meta = pickle.load(fid)
+        if meta.get('etag') is not None:
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last-modified') is not None:
+            headers['If-Modified-Since'] = meta['last-modified']
+    status, responseHeaders, body = pool.get(url, headers=headers)
+    if status == 304:  # not modified
+        with open(cacheFile, 'rb') as fid:
+            return fid.read()
+    elif status == 404:
+        return None
+    elif status != 200:
+        raise IOError('%s returned HTTP status %d' % (url, status))
+    if cacheFile is not None:
+        folder = os.path.dirname(cacheFile)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        meta = {key: responseHeaders.get(key) for key in ('etag', 'last-modified')}
+        for fname, contents in ((cacheFile, body), (cacheFile + '.pkl', pickle.dumps(meta))):
+            tmpName = fname + '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+            with open(tmpName, 'wb') as fid:
+                fid.write(contents)
+            os.replace(tmpName, fname)
+    return body
+
+
+def downloadFTP(urls, path, workers=4, checksums=None):
+    """Downloads files from ftp servers into path with a pool of workers, each worker keeps its own connection.
+
+    Files are pulled into 'name.part' and renamed when they are complete, so a file with the final name is always
+    whole, and partial files from an interrupted download are resumed (REST).  Files that are already in path with the
+    size of the file on the server (and the md5 in checksums, if given) are not downloaded again.
+
+    Args:
+        urls (list): ftp urls of the files
+        path (str): directory to put the files in
+        workers (int): number of concurrent downloads (default=4)
+        checksums (dict): md5 hex digests keyed by file name, used to check files that are present (default=None)
+
+    Returns:
+        manifest (list): a dictionary for each url with keys
+            'url': url of the file
+
+            'file': local file name
+
+            'status': one of 'present', 'downloaded', 'resumed', 'missing' (not on the server) or 'failed'
+
+            'size': size of the local file in bytes (None if there is no file)
+
+    """
+    if not os.path.exists(path):
+        os.makedirs(path, exist_ok=True)
+    checksums = {} if checksums is None else checksums
+    local = threading.local()
+    connections, lock = [], threading.Lock()
+
+    def _ftp(host, fresh=False):
+        hosts = local.__dict__.setdefault('hosts', {})
+        if fresh and host in hosts:
+            hosts.pop(host).close()
+        if host not in hosts:
+            ftp = ftplib.FTP(host, timeout=60)
+            ftp.login()
+            ftp.voidcmd('TYPE I')  # binary, needed for SIZE
+            hosts[host] = ftp
+            with lock:
+                connections.append(ftp)
+        return hosts[host]
+
+    def _md5(fname):
+        md5 = hashlib.md5()
+        with open(fname, 'rb') as fid:
+            for block in iter(lambda: fid.read(1 << 20), b''):
+                md5.update(block)
+        return md5.hexdigest()
+
+    def _isComplete(fname, remoteSize, expected):
+        return (os.path.isfile(fname) and (remoteSize is None or os.path.getsize(fname) == remoteSize)
+                and (expected is None or _md5(fname) == expected))
+
+    def _download(url):
+        parts = urllib.parse.urlsplit(url)
+        baseName = os.path.basename(parts.path)
+        fname = os.path.join(path, baseName)
+        entry = {'url': url, 'file': fname, 'status': 'failed', 'size': None}
+        expected = checksums.get(baseName)
+        for attempt in range(2):  # reconnect once if the server dropped the connection
+            try:
+                ftp = _ftp(parts.netloc, fresh=attempt > 0)
+                try:
+                    remoteSize = ftp.size(parts.path)
+                except ftplib.error_perm:
+                    remoteSize = None  # not on the server, or SIZE is not supported
+                if _isComplete(fname, remoteSize, expected):
+                    entry['status'] = 'present'
+                    break
+                partName = fname + '.part'
+                offset = os.path.getsize(partName) if os.path.isfile(partName) else 0
+                if remoteSize is None or offset >= remoteSize:
+                    offset = 0  # can not resume this one
+                with open(partName, 'ab' if offset > 0 else 'wb') as fid:
+                    ftp.retrbinary('RETR ' + parts.path, fid.write, rest=offset if offset > 0 else None)
+                if remoteSize is not None and os.path.getsize(partName) != remoteSize:
+                    raise IOError('%s is incomplete' % partName)
+                if expected is not None and _md5(partName) != expected:
+                    os.remove(partName)
+                    raise IOError('%s does not match its checksum' % baseName)
+                os.replace(partName, fname)
+                entry['status'] = 'resumed' if offset > 0 else 'downloaded'
+                print('Retrieved %s' % baseName)
+                break
+            except ftplib.error_perm:
+                entry['status'] = 'missing'
+                if os.path.isfile(fname + '.part') and os.path.getsize(fname + '.part') == 0:
+                    os.remove(fname + '.part')
+                break
+            except (ftplib.Error, OSError, EOFError) as err:
+                entry['error'] = str(err)
+        if os.path.isfile(fname):
+            entry['size'] = os.path.getsize(fname)
+        return entry
+
+    urls = list(collections.OrderedDict.fromkeys(urls))  # a file is only pulled by one worker
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            manifest = list(pool.map(_download, urls))
+    finally:
+        for ftp in connections:
+            try:
+                ftp.quit()
+            except (ftplib.Error, OSError, EOFError):
+                ftp.close()
+    return manifest
 
 class forecastData:
     def __init__(self, d1):
@@ -53,113 +360,116 @@ class forecastData:
         """
         import urllib.request, urllib.parse, urllib.error
         assert type(forecastHour) is str, 'Forecast hour variable must be a string'
-        forecastHour = forecastHour.zfill(2)
-        urlBack = '/bulls.t%sz/' %forecastHour +'multi_1.%d.spec' %buoyNumber
-        ftpURL = self.dataLocNCEP + 'multi_1.' + self.d1.strftime('%Y%m%d') + urlBack
+        ftpURL = self._ww3URL(self.d1, forecastHour, buoyNumber)
         ftpstream = urllib.request.urlopen(ftpURL)  # open url
-        lines = ftpstream.readlines()  # read the lines of the url into an array of lines
+        bulletin = ftpstream.read()  # read the whole bulletin
         ftpstream.close()  # close connection with the server
-        # # # # # # # # # # # # now the forecast spectra are in lines # # # # # # # # # # # #
-        frequencies, directions, forcastDates, forcastDateLines = [], [], [], []
-
-        for ii, line in enumerate(lines):  # read through each line
-            split = line.split()   # split the current line up
-            if split[0].strip("'")  == 'WAVEWATCH':  # is it the header of the file?
-                nFreq = int(split[3])  # number of Frequencies
-                nDir = int(split[4])
-            elif len(split) == 8 or nFreq - len(frequencies) == len(split) and len(frequencies) != nFreq: # this is frequencies
-                frequencies.extend(split)
-            elif (len(split) == 7 or nDir - len(directions) == len(split)) and len(directions) != nDir:  # this is directions
-                directions.extend(split)
-            elif len(split[0]) == 8  and len(split) == 2: ## this is the date line for the beggining of a spectra
-                # MPG: Include time component (second entry in date line).
-                timestampstr = split[0] + split[1] 
-                timestamp = DT.datetime.strptime(timestampstr, '%Y%m%d%H%M%S')
-                forcastDates.append(timestamp)
-                forcastDateLines.append(ii)
-        
-        # MPG: convert directions and frequencies from list(string) to 
-        # np.array(float).
-        directions = np.array(directions).astype('float')
-        frequencies = np.array(frequencies).astype('float')
-
-        # MPG: convert directions from radians to degrees.
-        directions = np.rad2deg(directions)
-
-        # MPG: convert directions from oceanographic to meteorological 
-        # convention to be consistent w/ FRF wave gauge data.
-        small_angle = directions < 180.0
-        directions[small_angle] = 180.0 + directions[small_angle]
-        directions[~small_angle] = directions[~small_angle] - 180.0
-
-        # MPG: sort directions and frequencies.
-        didx = directions.argsort()
-        fidx = frequencies.argsort()
-        directions = directions[didx]
-        frequencies = frequencies[fidx]
-        
-        ## now go back through 'lines' and parse spectra
-        spectra = np.ones((len(forcastDateLines), nFreq, nDir), dtype=float) * 1e-8
-        buoyNum, lon, lat, Depth, Hm0, Dp, b, c = [], [], [], [], [], [], [], []
-        for ll in forcastDateLines:
-            numLinesPerSpec = np.ceil(nFreq*float(nDir)/len(lines[ll+2].split())).astype(int)
-            buoyStats = lines[ll+1].split()
-            if ll == forcastDateLines[0]:  # if its not going to change only grab it once
-                buoyNum = int(buoyStats[0].strip("'"))
-                lon = float(buoyStats[2])
-                lat = float(buoyStats[3])
-                Depth = float(buoyStats[4])
-            # Hm0.append(float(buoyStats[5])) # these need to be converted to meters ... is this actually wind?
-            # Dp.append(float(buoyStats[6])) # these are not exported   ... are these wind?
-            # b.append(float(buoyStats[7]))  # not sure what this field is .... wind speed?
-            # c.append(float(buoyStats[8]))  # not sure what this field is  ... wind dir?
-
-            tt = np.floor(float(ll) / (numLinesPerSpec - 1)).astype(int)  # time index
-            linear = []
-            for ss in range(numLinesPerSpec):
-                # data =
-                linear.extend(lines[ss + ll + 2].split())
-            spectra[tt] = np.array(linear, dtype=float).reshape(nDir, nFreq).T
-            spectra[tt] = spectra[tt][fidx][:,didx]
-
-        # MPG: convert dWED from rad^-1 to deg^-1 to be consistent w/
-        # FRF wave gauge data.
-        spectra = spectra*2*np.pi / 180.0
-        
-        out = {'wavedirbin': directions,
-               'wavefreqbin': frequencies,
-               'buoyNum': buoyNum,
-               'dWED': spectra,
+        return parseWW3Spectra(bulletin)
+
+    def _ww3URL(self, date, forecastHour, buoyNumber):
+        """url of the spectral bulletin of a buoy for a forecast cycle"""
+        urlBack = '/bulls.t%sz/' % str(forecastHour).zfill(2) + 'multi_1.%d.spec' % int(buoyNumber)
+        return self.dataLocNCEP + 'multi_1.' + date.strftime('%Y%m%d') + urlBack
+
+    def getWW3Cycles(self, forecastHours, buoyNumbers, dates=None, cacheDir=None, revalidate=True, workers=8):
+        """Gets spectral forecasts of many buoys for many forecast cycles concurrently, see getWW3 for the conversions
+
+        Bulletins are pulled with pooled (kept-alive) connections by a pool of workers.  With cacheDir, the raw
+        bulletins are kept on disk as cacheDir/YYYYMMDD/tHHz/multi_1.BUOY.spec and are only sent again by the server
+        if they have changed (conditional requests), so a cycle is only downloaded once across scripts.
+
+        Args:
+          forecastHours (list): forecast cycles eg. ['00', '06', '12', '18']
+          buoyNumbers (list): buoys eg. [44100, 44056]
+          dates (list): dates of the cycles (Default value = None, the date of d1)
+          cacheDir (str): folder to keep the raw bulletins in (Default value = None, no cache)
+          revalidate (bool): check cached bulletins with the server, False works offline (Default value = True)
+          workers (int): number of concurrent downloads (Default value = 8)
+
+        Returns:
+          A dictionary of stacked spectra, masked where a bulletin is missing or shorter than the longest one
+          :key 'cycles': list of (date, forecastHour) of the cycles [cycle]
+          :key 'buoyNum': buoy numbers [buoy]
+          :key 'wavedirbin': directions
+          :key 'wavefreqbin': frequencies
+          :key 'dWED': 2dimensional wave spectra [cycle, buoy, t, freq, dir]
+          :key 'time': date time of each spectrum [cycle, buoy, t]
+          :key 'lat': latitude [buoy]
+          :key 'lon': longitude [buoy]
+          :key 'Depth': depth [buoy]
+
+        """
+        dates = [self.d1] if dates is None else list(dates)
+        cycles = [(date, str(hour).zfill(2)) for date in dates for hour in forecastHours]
+        buoyNumbers = [int(buoy) for buoy in buoyNumbers]
+        pool = httpPool()
+
+        def _getBulletin(task):
+            (date, hour), buoy = task
+            cacheFile = None
+            if cacheDir is not None:
+                cacheFile = os.path.join(cacheDir, date.strftime('%Y%m%d'), 't%sz' % hour, 'multi_1.%d.spec' % buoy)
+            bulletin = getCachedURL(self._ww3URL(date, hour, buoy), cacheFile=cacheFile, pool=pool,
+                                    revalidate=revalidate)
+            if bulletin is None:
+                print('No WW3 bulletin for buoy %d, cycle %s %sz' % (buoy, date.strftime('%Y%m%d'), hour))
+                return None
+            return parseWW3Spectra(bulletin)
+
+        tasks = [(cycle, buoy) for cycle in cycles for buoy in buoyNumbers]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(_getBulletin, tasks))
+        found = [spec for spec in parsed if spec is not None]
+        assert len(found) > 0, 'There are no WW3 bulletins for these cycles and buoys'
+
+        nTimes = max(spec['dWED'].shape[0] for spec in found)
+        shape = (len(cycles), len(buoyNumbers), nTimes)
+        dWED = np.ma.masked_all(shape + found[0]['dWED'].shape[1:])
+        times = np.ma.masked_all(shape, dtype=object)
+        lat, lon, Depth = (np.ma.masked_all(len(buoyNumbers)) for _ in range(3))
+        for (cycle, buoy), spec in zip(tasks, parsed):
+            if spec is None:
+                continue
+            cc, bb = cycles.index(cycle), buoyNumbers.index(buoy)
+            nt = spec['dWED'].shape[0]
+            dWED[cc, bb, :nt] = spec['dWED']
+            times[cc, bb, :nt] = spec['time']
+            lat[bb], lon[bb], Depth[bb] = spec['lat'], spec['lon'], spec['Depth']
+        out = {'cycles': cycles,
+               'buoyNum': np.array(buoyNumbers),
+               'wavedirbin': found[0]['wavedirbin'],
+               'wavefreqbin': found[0]['wavefreqbin'],
+               'dWED': dWED,
+               'time': times,
                'lat': lat,
                'lon': lon,
-               'Depth': Depth,
-               'time': np.array(forcastDates)}
-
+               'Depth': Depth}
         return out
 
-    def get_CbathyFromFTP(self, dlist, path, timex=True):
+    def get_CbathyFromFTP(self, dlist, path, timex=True, workers=4, checksums=None):
         """this function downloads argus cbathy bathy data from the argus ftp server
         times must be on the hour or half hour, it will return dates from a list
         provided as dlist.  dlist can be a single point (not in list) in time or
         a list of datetimes
         # written by Ty Hesser
         # modified by Spicer Bak
-        
+
+        Files are pulled in parallel (see downloadFTP), files that are already in path are skipped and
+        interrupted downloads are resumed.  The working directory is not changed.
 
         Args:
             dlist(list, np.array): a list of  datetime dataList for cbathy data to be collected
             path (str): directory to put the cbathy file(s)
             timex:  (Default value = True)
+            workers (int): number of concurrent downloads (Default value = 4)
+            checksums (dict): md5 of files keyed by file name, to check files that are already in path
+                (Default value = None)
 
         Returns:
-            oflist (list): list of strings of files to be downloaded
+            oflist (list): manifest of the files, a dictionary for each file with keys 'url', 'file', 'status'
+                and 'size' (see downloadFTP)
 
         """
-
-        curdir = os.getcwd()  # remembering where i am now
-        if not os.path.exists(path):
-            os.mkdir(path)
-        os.chdir(path)  # changing locations to where data should be downloaded to
         # defining month string to month numbers
         mon = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul',
                8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
@@ -169,8 +479,9 @@ class forecastData:
         if type(dlist) == DT.datetime:
             dlist = [dlist]  # making it into a list if its a single value
         assert type(dlist[0]) == DT.datetime, 'This function requires datetime dataList'
-        # begin looping through data, acquiring cbathy data
-        oflist = []
+        # begin looping through data, building the list of files
+        OSUserver = "ftp://cil-ftp.coas.oregonstate.edu/pub/argus02b/"  # the oregon state server
+        addrs = []
         for ii in range(0, len(dlist)):
             # assert dlist[ii].minute == 0 or dlist[ii].minute == 30, 'the minutes on your datetime object are not 0 or 30'
             if timex == True:
@@ -181,46 +492,46 @@ class forecastData:
 
             # creating month/day hours of timestamp that is being looked for
             yearc = din_m.strftime('%Y')  # string year
-            # monthc = din_m.strftime('%m') # string month
             monthc = mon[din_m.month]  # making a month string
             tt = din_m.timetuple()  # making time tuple to make more strings
             dayc = din_m.strftime('%d')  # making a day string
             hourc = din_m.strftime('%H')
-            mmc = str(tt.tm_min)  # making a minute string
-            if len(mmc) == 1:
-                mmc = '0' + mmc
-            ssc = str(tt.tm_sec)
-            if len(ssc) == 1:
-                ssc = '0' + ssc
+            mmc = '%02d' % tt.tm_min  # making a minute string
+            ssc = '%02d' % tt.tm_sec
             # creating epoch time
             eptm = str(int(nc.date2num(din_m, 'seconds since 1970-01-01')))
 
             # creating the url to download the cbathy data from
             # frfserver = "'\\134.164.129.42\cil\argus02b\'"                       # at the frf
-            OSUserver = "ftp://cil-ftp.coas.oregonstate.edu/pub/argus02b/"  # the oregon state server
             svr = OSUserver + yearc + "/cx/"  # server base
             daynum = str(tt.tm_yday)  # day number in a year
             fldr = daynum + "_" + monthc + "." + dayc  # defining the folder (date) structure to be used
             fname = "/" + eptm + '.' + dow[tt.tm_wday] + '.' + monthc + '.' + dayc + \
                     "_" + hourc + '_' + mmc + \
                     '_' + ssc + '.GMT.' + yearc + ".argus02b.cx.cBathy.mat"
-            # fname = '/1445709540.Sat.Oct.24_17_59_00.GMT.2015.argus02b.cx.cBathy.mat'  # copied and pasted
             if timex == True:
                 fname = '/*timex.merge.mat'
-            addr = svr + fldr + fname
-            print("checking " + fldr + fname)
-            if os.path.isfile(fname[1:]):
-                print("already downloaded: %s" % fname)
-            elif not os.path.isfile(fname[1:]):
-                # try:
-                # dlfname = wget.download(addr)
-                os.system('wget %s' % addr)
-                # oflist.append(dlfname)
-                # print 'Retrieved %s' %dlfname
-                # except IOError:
-                #    print "There is no file on the server, It's probably dark outside"
-
-        os.chdir(curdir)
-        #    import urllib
-        #    urllib.urlretrieve(fn4)
+            addrs.append(svr + fldr + fname)
+
+        # wild cards are matched against a listing of the folder (each folder is only listed once)
+        urls, listings = [], {}
+        for addr in addrs:
+            folder, pattern = addr.rsplit('/', 1)
+            if not any(char in pattern for char in '*?['):
+                urls.append(addr)
+                continue
+            if folder not in listings:
+                host, remoteFolder = folder[len('ftp://'):].split('/', 1)
+                try:
+                    ftp = ftplib.FTP(host, timeout=60)
+                    ftp.login()
+                    listings[folder] = [os.path.basename(name) for name in ftp.nlst('/' + remoteFolder)]
+                    ftp.quit()
+                except ftplib.all_errors:
+                    print("There is no folder %s on the server" % folder)
+                    listings[folder] = []
+            urls.extend(folder + '/' + name for name in fnmatch.filter(listings[folder], pattern))
+        urls = list(collections.OrderedDict.fromkeys(urls))
+        print("checking %d files" % len(urls))
+        oflist = downloadFTP(urls, path, workers=workers, checksums=checksums)
         return oflist
@@ -1,12 +1,229 @@
 from .getDataFRF import getObs
-from testbedutils.anglesLib import vectorRotation
 import datetime as DT
+import functools
+import hashlib
+import threading
 import numpy as np
-from testbedutils.gridTools import findNearestUnstructNode
-import testbedutils.sblib as sb
 import netCDF4 as nc
+from concurrent.futures import ProcessPoolExecutor
 
-def alt_PlotData(name, mod_time, mod_times, THREDDS='FRF'):
+plotPadding = DT.timedelta(minutes=3)  # margin the plot helpers pull around the model times
+
+_staticKeys = {'xFRF', 'yFRF', 'lat', 'lon', 'latitude', 'longitude', 'wavefreqbin', 'wavedirbin', 'name', 'gageName',
+               'stationName'}  # keys that are never sliced in time
+
+
+def _subWindow(result, start, end):
+    """Takes the records of a getObs result dictionary between start (inclusive) and end (exclusive), as getObs
+
+    Every array (or list) whose first dimension is as long as the time record is sliced, except for the keys in
+    _staticKeys (eg. gauge location, spectral bins)
+
+    """
+    if not isinstance(result, dict) or ('epochtime' not in result and 'time' not in result):
+        return result
+    timeunits = 'seconds since 1970-01-01 00:00:00'
+    if 'epochtime' in result:
+        epoch = np.asarray(result['epochtime'], dtype=float)
+    else:
+        epoch = np.asarray(nc.date2num(result['time'], timeunits), dtype=float)
+    idx = np.flatnonzero((epoch >= nc.date2num(start, timeunits)) & (epoch < nc.date2num(end, timeunits)))
+    if idx.size == epoch.size:
+        return result
+    out = {}
+    for key, value in result.items():
+        if key not in _staticKeys and np.ndim(value) > 0 and len(value) == epoch.size:
+            out[key] = value[idx] if hasattr(value, 'shape') else [value[ii] for ii in idx]
+        else:
+            out[key] = value
+    return out
+
+
+def _fetchObs(start, end, THREDDS, method, args, kwargs):
+    """Calls one getObs getter, this is run by the worker processes of plotDataSession.prefetch"""
+    return getattr(getObs(start, end, THREDDS), method)(*args, **kwargs)
+
+
+class plotDataSession:
+    """Shares getObs data between the plot data helpers (alt_PlotData, wave_PlotData, lidar_PlotData) of a plotting
+    script.
+
+    Getter results are kept by (method, args), with the time window they were pulled for.  A request for a window
+    inside of a kept window is sliced out of the kept result, so snapshots of a model run only pull each dataset from
+    THREDDS once.  A miss pulls the whole session window (or more, if the request is larger).  The session window is
+    padded by the same margin as the helpers (plotPadding), so data pulled for the session (eg. with prefetch) cover
+    every request of the helpers for the same model times.
+
+    Example:
+        session = plotDataSession(modelTimes[0], modelTimes[-1])
+        session.prefetch([('getALT', ('Alt03',)), ('getALT', ('Alt04',)), ('getWaveSpec', (), {'gaugenumber': 'awac-6m'})])
+        for tt in modelTimes:
+            alt = alt_PlotData('Alt03', tt, modelTimes, session=session)
+
+    """
+
+    def __init__(self, start, end, THREDDS='FRF', padding=plotPadding):
+        """
+        Args:
+            start (datetime): first model time
+            end (datetime): last model time
+            THREDDS (str): which THREDDS server to pull from (default='FRF')
+            padding (timedelta): margin added to both ends of the session window (default=plotPadding, as the helpers)
+
+        """
+        self.start = start - padding
+        self.end = end + padding
+        self.THREDDS = THREDDS
+        self._cache = {}  # (method, args, kwargs): [(start, end, result), ...]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(method, args, kwargs):
+        return method, tuple(args), tuple(sorted(kwargs.items()))
+
+    def _lookup(self, key, start, end):
+        with self._lock:
+            for cStart, cEnd, result in self._cache.get(key, []):
+                if cStart <= start and end <= cEnd:
+                    return True, _subWindow(result, start, end)
+        return False, None
+
+    def _store(self, key, start, end, result):
+        with self._lock:
+            self._cache.setdefault(key, []).append((start, end, result))
+
+    def get(self, method, *args, start=None, end=None, **kwargs):
+        """Calls a getObs getter through the session cache
+
+        Args:
+            method (str): name of the getObs method eg. 'getALT'
+            *args: arguments of the method
+            start (datetime): start of the window (default=None, the session start)
+            end (datetime): end of the window (default=None, the session end)
+            **kwargs: keyword arguments of the method
+
+        Returns:
+            the result of the getter for the window
+
+        """
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        key = self._key(method, args, kwargs)
+        found, result = self._lookup(key, start, end)
+        if found:
+            return result
+        fetchStart, fetchEnd = min(start, self.start), max(end, self.end)
+        result = _fetchObs(fetchStart, fetchEnd, self.THREDDS, method, args, kwargs)
+        self._store(key, fetchStart, fetchEnd, result)
+        return _subWindow(result, start, end)
+
+    def prefetch(self, calls, workers=1):
+        """Pulls many getters for the session window up front (eg. all stations of a plot)
+
+        With workers > 1 the getters are run concurrently in worker processes (the netCDF library is not thread safe),
+        scripts that do so need an if __name__ == '__main__' guard on platforms that spawn processes (macOS, Windows).
+
+        Args:
+            calls (list): (method, args) or (method, args, kwargs) tuples eg. [('getALT', ('Alt03',))]
+            workers (int): number of concurrent getters (default=1, one after the other in this process)
+
+        """
+        todo = []
+        for call in calls:
+            method, args, kwargs = call[0], tuple(call[1]), (call[2] if len(call) > 2 else {})
+            key = self._key(method, args, kwargs)
+            if not self._lookup(key, self.start, self.end)[0] and key not in [kk for kk, _, _ in todo]:
+                todo.append((key, args, kwargs))
+        if len(todo) == 0:
+            return
+        if workers == 1:
+            for key, args, kwargs in todo:
+                try:
+                    self._store(key, self.start, self.end,
+                                _fetchObs(self.start, self.end, self.THREDDS, key[0], args, kwargs))
+                except Exception as err:  # the getter is tried again (and raises) when it is asked for
+                    print('Could not prefetch %s%s: %s' % (key[0], key[1], err))
+            return
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = [pool.submit(_fetchObs, self.start, self.end, self.THREDDS, key[0], args, kwargs)
+                       for key, args, kwargs in todo]
+            for (key, _, _), future in zip(todo, futures):
+                try:
+                    self._store(key, self.start, self.end, future.result())
+                except Exception as err:  # the getter is tried again (and raises) when it is asked for
+                    print('Could not prefetch %s%s: %s' % (key[0], key[1], err))
+
+    def window(self, start, end):
+        """Returns a getObs look-alike for one time window, whose getters go through the session"""
+        return _sessionWindow(self, start, end)
+
+
+class _sessionWindow:
+    """getObs look-alike, getter calls are sent to a plotDataSession with a fixed time window"""
+
+    def __init__(self, session, start, end):
+        self.session = session
+        self.start = start
+        self.end = end
+
+    def __getattr__(self, method):
+        return functools.partial(self.session.get, method, start=self.start, end=self.end)
+
+
+def _epochTimes(times):
+    """Returns times (datetimes or epoch times) as a float array of epoch times"""
+    times = np.ma.getdata(np.asarray(times))
+    if np.issubdtype(times.dtype, np.number):
+        return times.astype(float)
+    return np.asarray(nc.date2num(list(times), 'seconds since 1970-01-01 00:00:00'), dtype=float)
+
+
+def _nearestIndex(sortedTime, times):
+    """Indices of the closest record of sortedTime to each of times (the first one on a tie, as argmin)"""
+    right = np.clip(np.searchsorted(sortedTime, times), 0, sortedTime.size - 1)
+    left = np.clip(right - 1, 0, sortedTime.size - 1)
+    return np.where(np.abs(times - sortedTime[left]) <= np.abs(sortedTime[right] - times), left, right)
+
+
+def snapshotIndex(dataTime, modelTimes):
+    """Finds the data record to show with each model snapshot, for all of the snapshots at once
+
+    Args:
+        dataTime: sorted times of the data (datetimes or epoch times)
+        modelTimes: a model time or array of model times (datetimes or epoch times)
+
+    Returns:
+        index of the closest data record for each model time
+
+    """
+    return _nearestIndex(_epochTimes(dataTime), _epochTimes(np.atleast_1d(modelTimes)))
+
+
+def _plotInd(dataTime, mod_time):
+    """The plot_ind flags (1 at the record closest to mod_time, 0 elsewhere)"""
+    plot_ind = np.zeros(np.size(dataTime), dtype=int)
+    plot_ind[snapshotIndex(dataTime, mod_time)[0]] = 1
+    return plot_ind
+
+
+def rotateVectors(u, v, theta):
+    """Rotates whole arrays of vector components counter-clockwise by theta, same as vectorRotation of each pair
+
+    Args:
+        u: x components (masks are kept)
+        v: y components
+        theta: rotation in degrees
+
+    Returns:
+        rotated u, v
+
+    """
+    theta = np.deg2rad(theta)
+    u, v = np.ma.asarray(u, dtype=float), np.ma.asarray(v, dtype=float)
+    return u * np.cos(theta) - v * np.sin(theta), u * np.sin(theta) + v * np.cos(theta)
+
+
+def alt_PlotData(name, mod_time, mod_times, THREDDS='FRF', session=None):
     """This function is just to remove clutter in my plot functions
     all it does is pull out altimeter data and put it into the appropriate dictionary keys.
     If None, it will return masked arrays.
@@ -16,6 +233,7 @@ def alt_PlotData(name, mod_time, mod_times, THREDDS='FRF'):
         mod_time: start time of the model
         time: array of model datetimes
         mod: array of model observations at that instrument location corresponding to variable "comp_time"
+        session (plotDataSession): shares the pulled data with the other snapshots of a plot (default=None)
 
     Returns:
         Altimeter data dictionary with keys:
@@ -24,11 +242,12 @@ def alt_PlotData(name, mod_time, mod_times, THREDDS='FRF'):
             'time' - timestamps of the data
             'xFRF' - position of the gage
             'plot_ind' - this just tells it which data point it should plot for the snapshots
+            'snapshot_ind' - index of the data point to plot for each of mod_times
 
     """
-    t1 = mod_times[0] - DT.timedelta(days=0, hours=0, minutes=3)
-    t2 = mod_times[-1] + DT.timedelta(days=0, hours=0, minutes=3)
-    frf_Data = getObs(t1, t2, THREDDS)
+    t1 = mod_times[0] - plotPadding
+    t2 = mod_times[-1] + plotPadding
+    frf_Data = getObs(t1, t2, THREDDS) if session is None else session.window(t1, t2)
 
     try:
         dict = {}
@@ -37,8 +256,8 @@ def alt_PlotData(name, mod_time, mod_times, THREDDS='FRF'):
         dict['time'] = alt_data['time']
         dict['name'] = alt_data['gageName']
         dict['xFRF'] = round(alt_data['xFRF'])
-        plot_ind = np.where(abs(dict['time'] - mod_time) == min(abs(dict['time'] - mod_time)), 1, 0)
-        dict['plot_ind'] = plot_ind
+        dict['plot_ind'] = _plotInd(dict['time'], mod_time)
+        dict['snapshot_ind'] = snapshotIndex(dict['time'], mod_times)
         dict['TS_toggle'] = True
 
     except:
@@ -53,11 +272,13 @@ def alt_PlotData(name, mod_time, mod_times, THREDDS='FRF'):
         fill_ind = np.zeros(np.shape(dict['time']))
         fill_ind[0] = 1
         dict['plot_ind'] = fill_ind
+        dict['snapshot_ind'] = np.zeros(len(mod_times), dtype=int)
         dict['TS_toggle'] = False
 
     return dict
 
-def wave_PlotData(name, mod_time, time, THREDDS='FRF'):
+
+def wave_PlotData(name, mod_time, time, THREDDS='FRF', session=None):
     """
     This function is just to remove clutter in my plotting scripts
     all it does is pull out altimeter data and put it into the appropriate dictionary keys.
@@ -68,6 +289,7 @@ def wave_PlotData(name, mod_time, time, THREDDS='FRF'):
     :param name: name of the wave gage you want
     :param mod_time: start time of the model
     :param time: array of model datetimes
+    :param session: plotDataSession that shares the pulled data with the other snapshots of a plot (default=None)
 
     :return: Altimeter data dictionary with keys:
             'Hs' - significant wave height
@@ -75,12 +297,13 @@ def wave_PlotData(name, mod_time, time, THREDDS='FRF'):
             'wave_time' - timestamps of the data
             'xFRF' - position of the gage
             'plot_ind' - this just tells it which data point it should plot for the snapshots
+            'snapshot_ind' - index of the data point to plot for each of the model times (also 'snapshot_ind_V')
     """
 
-    t1 = time[0] - DT.timedelta(days=0, hours=0, minutes=3)
-    t2 = time[-1] + DT.timedelta(days=0, hours=0, minutes=3)
+    t1 = time[0] - plotPadding
+    t2 = time[-1] + plotPadding
 
-    frf_Data = getObs(t1, t2, THREDDS)
+    frf_Data = getObs(t1, t2, THREDDS) if session is None else session.window(t1, t2)
 
     try:
 
@@ -93,13 +316,13 @@ def wave_PlotData(name, mod_time, time, THREDDS='FRF'):
         dict['cur_time'] = cur_data['time']
         dict['Hs'] = wave_data['Hs']
         dict['xFRF'] = wave_data['xFRF']
-        dict['plot_ind'] = np.where(abs(dict['wave_time'] - mod_time) == min(abs(dict['wave_time'] - mod_time)), 1, 0)
-        dict['plot_ind_V'] = np.where(abs(dict['cur_time'] - mod_time) == min(abs(dict['cur_time'] - mod_time)), 1, 0)
+        dict['plot_ind'] = _plotInd(dict['wave_time'], mod_time)
+        dict['plot_ind_V'] = _plotInd(dict['cur_time'], mod_time)
+        dict['snapshot_ind'] = snapshotIndex(dict['wave_time'], time)
+        dict['snapshot_ind_V'] = snapshotIndex(dict['cur_time'], time)
         # rotate my velocities!!!
-        test_fun = lambda x: vectorRotation(x, theta=360 - (71.8 + (90 - 71.8) + 71.8))
-        newV = [test_fun(x) for x in zip(cur_data['aveU'], cur_data['aveV'])]
-        dict['U'] = zip(*newV)[0]
-        dict['V'] = zip(*newV)[1]
+        theta = 360 - (71.8 + (90 - 71.8) + 71.8)
+        dict['U'], dict['V'] = rotateVectors(cur_data['aveU'], cur_data['aveV'], theta=theta)
         dict['TS_toggle'] = True
 
     except:
@@ -116,18 +339,21 @@ def wave_PlotData(name, mod_time, time, THREDDS='FRF'):
         fill_ind[0] = 1
         dict['plot_ind'] = fill_ind
         dict['plot_ind_V'] = fill_ind
+        dict['snapshot_ind'] = np.zeros(len(time), dtype=int)
+        dict['snapshot_ind_V'] = dict['snapshot_ind']
         dict['U'] = np.ma.array(fill_x, mask=np.ones(np.shape(dict['wave_time'])))
         dict['V'] = np.ma.array(fill_x, mask=np.ones(np.shape(dict['wave_time'])))
         dict['TS_toggle'] = False
 
     return dict
 
-def lidar_PlotData(time, THREDDS='FRF'):
 
-    t1 = time[0] - DT.timedelta(days=0, hours=0, minutes=3)
-    t2 = time[-1] + DT.timedelta(days=0, hours=0, minutes=3)
+def lidar_PlotData(time, THREDDS='FRF', session=None):
+
+    t1 = time[0] - plotPadding
+    t2 = time[-1] + plotPadding
 
-    frf_Data = getObs(t1, t2, THREDDS)
+    frf_Data = getObs(t1, t2, THREDDS) if session is None else session.window(t1, t2)
 
     try:
         dict = {}
@@ -159,6 +385,153 @@ def lidar_PlotData(time, THREDDS='FRF'):
 
     return dict
 
+
+_meshTreeCache = {}  # KD-trees of unstructured mesh nodes, keyed by a hash of the node coordinates
+_stationNodeCache = {}  # (node, distance) of station locations, keyed by mesh hash and location
+
+
+def _meshKey(xFRF, yFRF):
+    """Hash of the mesh node coordinates, so a mesh is only put in a KD-tree once"""
+    meshHash = hashlib.sha1(np.ascontiguousarray(xFRF, dtype=np.float64).tobytes())
+    meshHash.update(np.ascontiguousarray(yFRF, dtype=np.float64).tobytes())
+    return meshHash.hexdigest()
+
+
+def nearestMeshNodes(cmsfDict, xFRF, yFRF):
+    """Finds the closest model node to each location (the same answer as findNearestUnstructNode).
+
+    The KD-tree of the mesh nodes is built once per mesh and the node of each location is kept, so repeated plots
+    of the same run (or of runs on the same mesh) do not search the mesh again.
+
+    Args:
+        cmsfDict: keys (that are used...):
+                    'xFRF' - xFRF of the mesh nodes
+                    'yFRF' - yFRF of the mesh nodes
+        xFRF: xFRF of the locations (scalar or array)
+        yFRF: yFRF of the locations (scalar or array)
+
+    Returns:
+        ind, dist - index of the closest node and the distance to it for each location
+
+    """
+    key = _meshKey(np.ravel(cmsfDict['xFRF']), np.ravel(cmsfDict['yFRF']))
+    if key not in _meshTreeCache:
+        from scipy.spatial import cKDTree
+        _meshTreeCache[key] = cKDTree(np.column_stack((np.ravel(cmsfDict['xFRF']), np.ravel(cmsfDict['yFRF']))))
+    locations = [(float(xx), float(yy)) for xx, yy in zip(np.atleast_1d(xFRF), np.atleast_1d(yFRF))]
+    missing = [loc for loc in locations if (key, loc) not in _stationNodeCache]
+    if len(missing) > 0:
+        dist, ind = _meshTreeCache[key].query(np.array(missing))
+        for loc, ii, dd in zip(missing, ind, dist):
+            _stationNodeCache[(key, loc)] = (int(ii), float(dd))
+    ind, dist = zip(*[_stationNodeCache[(key, loc)] for loc in locations])
+    return np.array(ind), np.array(dist)
+
+
+def timeMatchIndex(obsTime, modTime, obsValid=None, modValid=None):
+    """Vectorized version of sb.timeMatch, that returns the indices of the matched records rather than the data, so
+    one match can be used for every variable on the same time axes.
+
+    Each model time is paired with the closest observation time.  As in sb.timeMatch, model times outside of the
+    span of the observations are skipped, pairs further apart than just under half of the smallest (median) sampling
+    interval are dropped (exact matches are always kept) and pairs with invalid data are dropped.
+
+    Args:
+        obsTime: sorted observation epoch times
+        modTime: sorted model epoch times
+        obsValid: boolean array, False for observation records without valid data (default=None, all valid)
+        modValid: boolean array, False for model records without valid data (default=None, all valid)
+
+    Returns:
+        modIdx, obsIdx - indices of the matched model and observation records
+
+    """
+    obsTime = np.asarray(obsTime, dtype=float)
+    modTime = np.asarray(modTime, dtype=float)
+    if obsTime.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    # 43 seconds here makes it 43 seconds less than 1/2 of smallest increment (as in sb.timeMatch)
+    threshold = min([np.median(np.diff(tt)) / 2.0 - 43 for tt in (obsTime, modTime) if tt.size > 1] or [0])
+    obsIdx = _nearestIndex(obsTime, modTime)
+    dist = np.abs(obsTime[obsIdx] - modTime)
+    keep = (modTime >= obsTime[0]) & (modTime <= obsTime[-1]) & ((dist <= threshold) | (dist == 0))
+    if obsValid is not None:
+        keep &= np.asarray(obsValid, dtype=bool)[obsIdx]
+    if modValid is not None:
+        keep &= np.asarray(modValid, dtype=bool)
+    modIdx = np.flatnonzero(keep)
+    return modIdx, obsIdx[modIdx]
+
+
+def _validRecords(*records):
+    """True for the records (first dimension) where every one of the arrays is unmasked and finite"""
+    valid = np.ones(np.shape(records[0])[0], dtype=bool)
+    for record in records:
+        record = np.ma.masked_invalid(np.ma.asarray(record, dtype=float))
+        valid &= ~np.ma.getmaskarray(record).reshape(record.shape[0], -1).any(axis=1)
+    return valid
+
+
+def CMSF_pairData(cmsfDict, stations, dataType='vel', dThresh=None, THREDDS='FRF'):
+    """Pairs CMS-Flow output with the observations at many stations, this is the engine behind CMSF_velData and
+    CMSF_wlData.
+
+    The observations are pulled with one getObs, all stations are put on mesh nodes with one (cached) KD-tree
+    query, then each station is time matched once and the match is used for every variable.
+
+    Args:
+        cmsfDict: keys (that are used...):
+                    'time' - this needs to be in epochtime
+                    'xFRF', 'yFRF' - mesh node locations
+                    'aveE', 'aveN' - average eastward/northward velocity [time, node], for dataType 'vel'
+                    'waterLevel' - water level [time, node], for dataType 'wl'
+        stations: list of station names handed to getCurrents or getGaugeWL
+        dataType: 'vel' for currents, 'wl' for water level (default='vel')
+        dThresh: largest allowed distance between a gage and its model node (default=None)
+        THREDDS: which THREDDS server to pull the observations from (default='FRF')
+
+    Returns:
+        dictionary keyed by station of the dictionaries returned by CMSF_velData or CMSF_wlData (None for stations
+        without data)
+
+    """
+    timeunits = 'seconds since 1970-01-01 00:00:00'
+    if dataType == 'vel':
+        variables = {'aveU': ('aveEobs', 'aveEmod', 'aveE'), 'aveV': ('aveNobs', 'aveNmod', 'aveN')}
+    elif dataType == 'wl':
+        variables = {'wl': ('obsWL', 'modWL', 'waterLevel')}
+    else:
+        raise NotImplementedError('dataType must be one of vel or wl')
+    modTime = nc.num2date(cmsfDict['time'], timeunits)
+    go = getObs(modTime[0] - plotPadding, modTime[-1] + plotPadding, THREDDS)
+
+    # get my obs_dicts
+    obs = {}
+    for station in stations:
+        obsDict = go.getCurrents(station) if dataType == 'vel' else go.getGaugeWL(station)
+        if obsDict is not None and all(var in obsDict for var in variables):
+            obs[station] = obsDict
+    out = dict.fromkeys(stations)
+    if len(obs) == 0:
+        return out
+
+    # find the closest nodes for all of the stations
+    inds, dists = nearestMeshNodes(cmsfDict, [obs[station]['xFRF'] for station in obs],
+                                   [obs[station]['yFRF'] for station in obs])
+    for station, ind, dist in zip(obs, inds, dists):
+        if dThresh is not None:
+            assert dist <= dThresh, 'Error: this grid has no nodes within %s of gage %s.' % (dThresh, station)
+        # run the time matching once for all variables, pairs are dropped if any of the variables is invalid
+        obsValid = _validRecords(*[obs[station][var] for var in variables])
+        modValid = _validRecords(*[np.ma.asanyarray(cmsfDict[modVar])[:, ind] for _, _, modVar in variables.values()])
+        modIdx, obsIdx = timeMatchIndex(obs[station]['epochtime'], cmsfDict['time'], obsValid=obsValid,
+                                        modValid=modValid)
+        out[station] = {'time': nc.num2date(np.asarray(cmsfDict['time'])[modIdx], timeunits)}
+        for var, (obsKey, modKey, modVar) in variables.items():
+            out[station][obsKey] = obs[station][var][obsIdx]
+            out[station][modKey] = cmsfDict[modVar][modIdx, ind]
+    return out
+
 def CMSF_velData(cmsfDict, station, dThresh=None):
     """this is a little function I wrote that will do the heavy lifting of pulling the current data from a particular gage,
         finds the closest model node to that gage, time matches the data, and returns the variables that need to be
@@ -180,43 +553,7 @@ def CMSF_velData(cmsfDict, station, dThresh=None):
              'aveNmod' - time-matched model northward velocity
 
     """
-    # initialize this class
-    timeunits = 'seconds since 1970-01-01 00:00:00'
-    modTime = nc.num2date(cmsfDict['time'], timeunits)
-    go = getObs(modTime[0] - DT.timedelta(minutes=3), modTime[-1] + DT.timedelta(minutes=3))
-
-    # get my obs_dict
-    obsV = go.getCurrents(station)
-    if obsV is None:
-        out = None
-    elif 'aveU' not in obsV:
-        out = None
-    else:
-        aveUobs = obsV['aveU']
-        aveVobs = obsV['aveV']
-        obsTime = obsV['time']
-        xFRFobs = obsV['xFRF']
-        yFRFobs = obsV['yFRF']
-
-        # find the closest node and pull that data
-        ind, dist = findNearestUnstructNode(xFRFobs, yFRFobs, cmsfDict)
-        if dThresh is not None:
-            assert dist <= dThresh, 'Error: this grid has no nodes within %s of gage %s.' %(dThresh, station)
-
-        modTime = cmsfDict['time']
-        aveUmod = cmsfDict['aveE'][:, ind]
-        aveVmod = cmsfDict['aveN'][:, ind]
-
-        # run the time matching.
-        out = {}
-        out['time'], out['aveEobs'], out['aveEmod'] = sb.timeMatch(obsTime, aveUobs, modTime, aveUmod)
-        time, out['aveNobs'], out['aveNmod'] = sb.timeMatch(obsTime, aveVobs, modTime, aveVmod)
-
-        # make it output a datetime
-        if not isinstance(out['time'][0], DT.datetime):
-            out['time'] = [nc.num2date(ii, timeunits) for ii in out['time']]
-
-    return out
+    return CMSF_pairData(cmsfDict, [station], dataType='vel', dThresh=dThresh)[station]
 
 def CMSF_wlData(cmsfDict, station, dThresh=None):
     """
@@ -232,42 +569,4 @@ def CMSF_wlData(cmsfDict, station, dThresh=None):
              'obsWL' - time-matched observed eastward velocity
              'modWL' - time-matched model northward velocity
     """
-    # initialize this class
-    timeunits = 'seconds since 1970-01-01 00:00:00'
-    modTime = nc.num2date(cmsfDict['time'], timeunits)
-    go = getObs(modTime[0] - DT.timedelta(minutes=3), modTime[-1] + DT.timedelta(minutes=3))
-
-    # get my obs_dict
-    obsWLdict = go.getGaugeWL(station)
-    if 'wl' not in obsWLdict.keys():
-        out = None
-    else:
-        obsWL = obsWLdict['wl']
-        obsTime = obsWLdict['time']
-        xFRFobs = obsWLdict['xFRF']
-        yFRFobs = obsWLdict['yFRF']
-
-        # find the closest node and pull that data
-        ind, dist = findNearestUnstructNode(xFRFobs, yFRFobs, cmsfDict)
-        if dThresh is None:
-            pass
-        else:
-            assert dist <= dThresh, 'Error: this grid has no nodes within %s of gage %s.' %(dThresh, station)
-
-        modTime = cmsfDict['time']
-        modWL = cmsfDict['waterLevel'][:, ind]
-
-        # run the time matching.
-        out = {}
-        out['time'], out['obsWL'], out['modWL'] = sb.timeMatch(obsTime, obsWL, modTime, modWL)
-
-        # make it output a datetime
-        if isinstance(out['time'][0], DT.datetime):
-            pass
-        else:
-            modTime = [nc.num2date(ii, timeunits) for ii in out['time']]
-            del out['time']
-            out['time'] = modTime
-
-    return out
-
+    return CMSF_pairData(cmsfDict, [station], dataType='wl', dThresh=dThresh)[station]
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Interpolation of bathymetry (transects or integrated grids) onto model grids with cached interpolation weights.
+
+The triangulation (or KD-tree) of a source geometry is only built once per (source geometry, target grid) pair, the
+resulting weights are kept as a sparse matrix in memory and on disk.  Each new survey on the same geometry is then
+interpolated with a single sparse matrix-vector product.
+
+"""
+import hashlib
+import os
+import numpy as np
+
+_weightCache = {}  # sparse weight matrices keyed by geometry hash
+
+
+def _geometryKey(xSource, ySource, xTarget, yTarget, method):
+    """Creates a hash of the source and target coordinates that is used as the cache key
+
+    Args:
+        xSource (array): flattened source x coordinates
+        ySource (array): flattened source y coordinates
+        xTarget (array): flattened target x coordinates
+        yTarget (array): flattened target y coordinates
+        method (str): interpolation method
+
+    Returns:
+        key (str): hex digest of the geometry
+
+    """
+    geometryHash = hashlib.sha1()
+    for coord in (xSource, ySource, xTarget, yTarget):
+        geometryHash.update(np.ascontiguousarray(coord, dtype=np.float64).tobytes())
+        geometryHash.update(b'|')
+    geometryHash.update(method.encode())
+    return geometryHash.hexdigest()
+
+
+def buildInterpWeights(xSource, ySource, xTarget, yTarget, method='linear', fillNearest=False):
+    """Builds sparse interpolation weights from scattered source points to target points
+
+    Args:
+        xSource (array): source x coordinates (any shape, flattened)
+        ySource (array): source y coordinates (same shape as xSource)
+        xTarget (array): target x coordinates (any shape, flattened)
+        yTarget (array): target y coordinates (same shape as xTarget)
+        method (str): 'linear' for barycentric weights on a Delaunay triangulation, 'nearest' for nearest source
+            point from a KD-tree (default='linear')
+        fillNearest (bool): with method 'linear', target points outside of the convex hull of the source take the
+            nearest source point, otherwise they get no weights and will be returned as NaN (default=False)
+
+    Returns:
+        weights (scipy.sparse.csr_matrix): [nTarget, nSource] weight matrix
+
+    """
+    from scipy import sparse
+    from scipy.spatial import Delaunay, cKDTree
+    source = np.column_stack((np.ravel(xSource), np.ravel(ySource))).astype(float)
+    target = np.column_stack((np.ravel(xTarget), np.ravel(yTarget))).astype(float)
+    nTarget, nSource = target.shape[0], source.shape[0]
+
+    if method == 'nearest':
+        _, nearest = cKDTree(source).query(target)
+        return sparse.csr_matrix((np.ones(nTarget), (np.arange(nTarget), nearest)), shape=(nTarget, nSource))
+    elif method != 'linear':
+        raise NotImplementedError('method must be one of linear or nearest')
+
+    tri = Delaunay(source)
+    simplex = tri.find_simplex(target)
+    inside = simplex >= 0
+    # barycentric coordinates of target points inside of the triangulation
+    transform = tri.transform[simplex[inside]]
+    delta = target[inside] - transform[:, 2]
+    bary = np.einsum('ijk,ik->ij', transform[:, :2], delta)
+    bary = np.column_stack((bary, 1 - bary.sum(axis=1)))
+    rows = np.repeat(np.flatnonzero(inside), 3)
+    cols = tri.simplices[simplex[inside]].ravel()
+    vals = bary.ravel()
+    if fillNearest and (~inside).any():
+        _, nearest = cKDTree(source).query(target[~inside])
+        rows = np.append(rows, np.flatnonzero(~inside))
+        cols = np.append(cols, nearest)
+        vals = np.append(vals, np.ones(nearest.size))
+    return sparse.csr_matrix((vals, (rows, cols)), shape=(nTarget, nSource))
+
+
+def getInterpWeights(xSource, ySource, xTarget, yTarget, method='linear', fillNearest=False, cacheDir=None):
+    """Gets interpolation weights from memory, then from cacheDir, building (and caching) them if needed
+
+    Args:
+        xSource (array): source x coordinates
+        ySource (array): source y coordinates
+        xTarget (array): target x coordinates
+        yTarget (array): target y coordinates
+        method (str): 'linear' or 'nearest' see buildInterpWeights (default='linear')
+        fillNearest (bool): see buildInterpWeights (default=False)
+        cacheDir (str): folder to keep weights in between sessions, if None weights are only kept in memory
+            (default=None)
+
+    Returns:
+        weights (scipy.sparse.csr_matrix): [nTarget, nSource] weight matrix
+
+    """
+    from scipy import sparse
+    key = _geometryKey(np.ravel(xSource), np.ravel(ySource), np.ravel(xTarget), np.ravel(yTarget),
+                       '{}{}'.format(method, fillNearest))
+    if key in _weightCache:
+        return _weightCache[key]
+    fname = None
+    if cacheDir is not None:
+        fname = os.path.join(cacheDir, 'interpWeights_{}.npz'.format(key))
+    if fname is not None and os.path.isfile(fname):
+        weights = sparse.load_npz(fname).tocsr()
+    else:
+        weights = buildInterpWeights(xSource, ySource, xTarget, yTarget, method=method, fillNearest=fillNearest)
+        if fname is not None:
+            if not os.path.exists(cacheDir):
+                os.makedirs(cacheDir)
+            tmpName = fname + '.{}.tmp'.format(os.getpid())
+            with open(tmpName, 'wb') as fid:  # write then rename so other processes never see a partial file
+                sparse.save_npz(fid, weights)
+            os.replace(tmpName, fname)
+    _weightCache[key] = weights
+    return weights
+
+
+class gridInterpolator:
+    """Interpolates values on a fixed source geometry onto a fixed target grid.
+
+    Rectilinear grids given as 1D axes (eg. xFRF, yFRF from getBathyIntegratedTransect) need to be expanded with
+    np.meshgrid before they are handed in.
+
+    Example:
+        xx, yy = np.meshgrid(bathy['xFRF'], bathy['yFRF'])
+        interp = gridInterpolator(xx, yy, modelGrid['xFRF'], modelGrid['yFRF'], cacheDir='weights')
+        modelElevation = interp(bathy['elevation'])
+
+    """
+
+    def __init__(self, xSource, ySource, xTarget, yTarget, method='linear', fillNearest=False, cacheDir=None):
+        """Builds or loads the interpolation weights
+
+        Args:
+            xSource (array): source x coordinates
+            ySource (array): source y coordinates (same shape as xSource)
+            xTarget (array): target x coordinates
+            yTarget (array): target y coordinates (same shape as xTarget)
+            method (str): 'linear' or 'nearest' (default='linear')
+            fillNearest (bool): fill target points outside of the source with the nearest source value (default=False)
+            cacheDir (str): folder to keep weights in between sessions (default=None)
+
+        """
+        self.sourceSize = np.size(xSource)
+        self.targetShape = np.shape(xTarget)
+        self.weights = getInterpWeights(xSource, ySource, xTarget, yTarget, method=method, fillNearest=fillNearest,
+                                        cacheDir=cacheDir)
+
+    def __call__(self, values):
+        """Interpolates values onto the target grid
+
+        Masked or NaN source values are left out, and the weights of their neighbors are re-normalized
+
+        Args:
+            values (array): values on the source geometry, same size as xSource (a leading dimension with the same
+                trailing size is treated as multiple surveys [t, ...])
+
+        Returns:
+            masked array of values on the target grid, masked where there are no valid source values
+
+        """
+        values = np.ma.masked_invalid(np.ma.asarray(values, dtype=float))
+        nt = values.size // self.sourceSize
+        assert nt * self.sourceSize == values.size, 'values do not match the source geometry'
+        values = values.reshape(nt, self.sourceSize)
+        valid = (~np.ma.getmaskarray(values)).astype(float)
+        numerator = self.weights.dot(values.filled(0).T)
+        if valid.all():  # the weights already sum to one (or zero outside of the source)
+            inRange = np.asarray(self.weights.sum(axis=1)).ravel() > 0.5
+            out = np.ma.array(numerator, mask=~np.repeat(inRange[:, np.newaxis], nt, axis=1))
+        else:
+            denominator = self.weights.dot(valid.T)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out = np.ma.masked_invalid(numerator / np.where(denominator > 1e-12, denominator, np.nan))
+        out = out.T.reshape((nt,) + self.targetShape)
+        if nt == 1:
+            out = out[0]
+        return out
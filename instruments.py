@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the FRF instruments served by the THREDDS servers.
+
+Each instrument is described once in _instruments: its aliases (gauge numbers and names that are accepted by the
+getters), the dataset path of each product it is found in, the variable name variants used in its files, and what is
+known about its nominal location, deployments and sampling cadence.  The alias index is built once on import, so a
+lookup is a single dictionary access.
+
+Products:
+    'waves': wave data (getObs.getWaveSpec, getWaveGaugeLoc)
+
+    'waterLevel': water level at a gauge (getObs.getGaugeWL)
+
+    'currents': currents (getObs.getCurrents)
+
+    'wind': wind (getObs.getWind)
+
+    'altimeter': altimeters (getObs.getALT)
+
+    'modelWaves': model output at a gauge, the path is relative to the model run (getDataTestBed.getWaveSpecModel)
+
+Numbers are only unique within a product (eg. wind gauge 1 is not wave gauge 1), so aliases are indexed per product.
+A product entry may be a dictionary with its own aliases, which take priority over the instrument aliases for that
+product only (the model output of the 8m array is also asked for as gauge 3 or awac-8m), and its own gname (the getters
+have always called that model output 'AWAC 8m', and the 11m AWAC water level 'AWAC 11m').
+
+locationStore keeps harvested gauge locations in SQLite as time intervals, so "where was gauge X at time T" is answered
+without the server.
+
+"""
+import calendar
+import os
+import pickle
+import sqlite3
+
+# variable name variants, the first one found in a file is used (see ncVariable)
+variableNames = {'lat': ('latitude', 'lat'),
+                 'lon': ('longitude', 'lon'),
+                 'depth': ('nominalDepth', 'gaugeDepth'), }
+
+_waves = 'oceanography/waves/{0}/{0}.ncml'
+_currents = 'oceanography/currents/{0}/{0}.ncml'
+_altimeter = 'geomorphology/altimeter/{0}-altimeter/{0}-altimeter.ncml'
+
+# name: the instrument key, gname: descriptive gauge name, depth: nominal depth [m], location: nominal position in
+# FRF coordinates, deployments: list of (start, end) datetimes the instrument was in the water (None if unknown),
+# cadence: nominal sampling interval in seconds (None if unknown)
+_instruments = [
+    {'name': 'waverider-26m', 'gname': '26m Waverider Buoy', 'aliases': [0, 'waverider-26m', '26m'], 'depth': 26,
+     'datasets': {'waves': _waves.format('waverider-26m'), 'modelWaves': 'waverider-26m/waverider-26m.ncml'}},
+    {'name': 'waverider-17m', 'gname': '17m Waverider Buoy', 'aliases': [1, 'waverider-17m', '17m'], 'depth': 17,
+     'datasets': {'waves': _waves.format('waverider-17m'), 'modelWaves': 'waverider-17m/waverider-17m.ncml'}},
+    {'name': 'awac-11m', 'gname': 'AWAC04 - 11m', 'aliases': [2, 'awac-11m', '11m'], 'depth': 11,
+     'datasets': {'waves': _waves.format('awac-11m'),
+                  'waterLevel': {'dataloc': _waves.format('awac-11m'), 'gname': 'AWAC 11m'},
+                  'currents': _currents.format('awac-11m'), 'modelWaves': 'awac-11m/awac-11m.ncml'}},
+    {'name': 'awac-8m', 'gname': 'AWAC 8m', 'aliases': [3, 'awac-8m'], 'depth': 8,
+     'datasets': {'waves': _waves.format('awac-8m'), 'waterLevel': _waves.format('awac-8m'),
+                  'currents': _currents.format('awac-8m')}},
+    {'name': 'awac-6m', 'gname': 'AWAC 6m', 'aliases': [4, 'awac-6m', 'awac 6m'], 'depth': 6,
+     'datasets': {'waves': _waves.format('awac-6m'), 'waterLevel': _waves.format('awac-6m'),
+                  'currents': _currents.format('awac-6m'), 'modelWaves': 'awac-6m/awac-6m.ncml'}},
+    {'name': 'awac-4.5m', 'gname': 'AWAC 4.5m', 'aliases': [5, 'awac-4.5m', 'awac_4.5m'], 'depth': 4.5,
+     'datasets': {'waves': _waves.format('awac-4.5m'), 'waterLevel': _waves.format('awac-4.5m'),
+                  'currents': _currents.format('awac-4.5m'), 'modelWaves': 'awac-4.5m/awac-4.5m.ncml'}},
+    {'name': 'adop-3.5m', 'gname': 'Aquadopp 3.5m', 'aliases': [6, 'adop-3.5m', 'aquadopp 3.5m'], 'depth': 3.5,
+     'datasets': {'waves': _waves.format('adop-3.5m'), 'waterLevel': _waves.format('adop-3.5m'),
+                  'currents': _currents.format('adop-3.5m'), 'modelWaves': 'adop-3.5m/adop-3.5m.ncml'}},
+    {'name': 'adop-2m', 'gname': 'Aquadopp01 - 2m', 'aliases': [7, 'adop-2m'], 'depth': 2,
+     'datasets': {'waves': _waves.format('adop01'), 'waterLevel': _waves.format('adop01')}},
+    {'name': 'xp200m', 'gname': 'Paros xp200m', 'aliases': [8, 'xp200m', 'xp200'], 'location': {'xFRF': 200.},
+     'datasets': {'waves': _waves.format('xp200m'), 'waterLevel': _waves.format('xp200m'),
+                  'modelWaves': 'xp200m/xp200m.ncml'}},
+    {'name': 'xp150m', 'gname': 'Paros xp150m', 'aliases': [9, 'xp150m', 'xp150'], 'location': {'xFRF': 150.},
+     'datasets': {'waves': _waves.format('xp150m'), 'waterLevel': _waves.format('xp150m'),
+                  'modelWaves': 'xp150m/xp150m.ncml'}},
+    {'name': 'xp125m', 'gname': 'Paros xp125m', 'aliases': [10, 'xp125m', 'xp125'], 'location': {'xFRF': 125.},
+     'datasets': {'waves': _waves.format('xp125m'), 'waterLevel': _waves.format('xp125m'),
+                  'modelWaves': 'xp125m/xp125m.ncml'}},
+    {'name': 'xp100m', 'gname': 'Paros xp100m', 'aliases': [11, 'xp100m'], 'location': {'xFRF': 100.},
+     'datasets': {'waves': _waves.format('xp100m'), 'waterLevel': _waves.format('xp100m'),
+                  'modelWaves': 'xp100m/xp100m.ncml'}},
+    {'name': '8m-array', 'gname': '8m array', 'aliases': [12, '8m-array', '8m array'], 'depth': 8,
+     'datasets': {'waves': _waves.format('8m-array'), 'waterLevel': _waves.format('8m-array'),
+                  'modelWaves': {'dataloc': '8m-array/8m-array.ncml', 'gname': 'AWAC 8m',
+                                 'aliases': [3, 'awac-8m', 'awac 8m', '8m-array', '8m array']}}},
+    {'name': 'oregonInlet', 'gname': 'Oregon Inlet Waverider', 'aliases': ['oregoninlet', 'oi'],
+     'datasets': {'waves': _waves.format('waverider-oregon-inlet-nc')}},
+    # lidar wave gauges are named by their cross-shore position
+    {'name': 'lidarWaveGauge140', 'gname': 'Lidar wave gauge 140m', 'location': {'xFRF': 140.},
+     'aliases': ['lidarwavegauge140', 'lidargauge140', 'lidarwavegauge140m', 'lidargauge140m'],
+     'datasets': {'waves': _waves.format('lidarWaveGauge140')}},
+    {'name': 'lidarWaveGauge110', 'gname': 'Lidar wave gauge 110m', 'location': {'xFRF': 110.},
+     'aliases': ['lidarwavegauge110', 'lidargauge110', 'lidarwavegauge110m', 'lidargauge110m'],
+     'datasets': {'waves': _waves.format('lidarWaveGauge110')}},
+    {'name': 'lidarWaveGauge100', 'gname': 'Lidar wave gauge 100m', 'location': {'xFRF': 100.},
+     'aliases': ['lidarwavegauge100', 'lidargauge100', 'lidarwavegauge100m', 'lidargauge100m'],
+     'datasets': {'waves': _waves.format('lidarWaveGauge100')}},
+    {'name': 'lidarWaveGauge90', 'gname': 'Lidar wave gauge 90m', 'location': {'xFRF': 90.},
+     'aliases': ['lidarwavegauge90', 'lidargauge90', 'lidarwavegauge90m', 'lidargauge90m'],
+     'datasets': {'waves': _waves.format('lidarWaveGauge90')}},
+    {'name': 'lidarWaveGauge090', 'gname': 'Lidar wave gauge 90m', 'location': {'xFRF': 90.},
+     'aliases': ['lidarwavegauge090'], 'datasets': {'waves': _waves.format('lidarWaveGauge090')}},
+    {'name': 'lidarWaveGauge80', 'gname': 'Lidar wave gauge 80m', 'location': {'xFRF': 80.},
+     'aliases': ['lidarwavegauge80', 'lidargauge80', 'lidarwavegauge80m', 'lidargauge80m'],
+     'datasets': {'waves': _waves.format('lidarWaveGauge80')}},
+    {'name': 'lidarWaveGauge080', 'gname': 'Lidar wave gauge 80m', 'location': {'xFRF': 80.},
+     'aliases': ['lidarwavegauge080'], 'datasets': {'waves': _waves.format('lidarWaveGauge080')}},
+    # wind, data are collected in 10 minute increments
+    {'name': 'derived', 'gname': 'Derived wind gauge', 'aliases': [0, 'derived'], 'cadence': 600,
+     'datasets': {'wind': 'meteorology/wind/derived/derived.ncml'}},
+    {'name': 'D932', 'gname': '932 wind gauge', 'aliases': [1, 'd932'], 'cadence': 600,
+     'datasets': {'wind': 'meteorology/wind/D932/D932.ncml'}},
+    {'name': 'D832', 'gname': '832 wind gauge', 'aliases': [2, 'd832'], 'cadence': 600,
+     'datasets': {'wind': 'meteorology/wind/D832/D832.ncml'}},
+    {'name': 'D732', 'gname': '732 wind gauge', 'aliases': [3, 'd732'], 'cadence': 600,
+     'datasets': {'wind': 'meteorology/wind/D732/D732.ncml'}},
+    # altimeters
+    {'name': 'Alt03', 'aliases': ['Alt03'], 'datasets': {'altimeter': _altimeter.format('Alt03')}},
+    {'name': 'Alt04', 'aliases': ['Alt04'], 'datasets': {'altimeter': _altimeter.format('Alt04')}},
+    {'name': 'Alt05', 'aliases': ['Alt05'], 'datasets': {'altimeter': _altimeter.format('Alt05')}},
+] + [{'name': 'Alt{}-{}'.format(line, xx), 'aliases': ['Alt{}-{}'.format(line, xx)],
+      'datasets': {'altimeter': _altimeter.format('Alt{}-{}'.format(line, xx))}}
+     for line in (769, 861) for xx in (150, 200, 250, 300, 350)]
+
+_index = {}  # (product, alias): instrument record
+
+
+def _aliasKey(alias):
+    """Aliases are matched as case insensitive strings, so 4, '4' and 'AWAC-6m' find the same gauge"""
+    return str(alias).strip().lower()
+
+
+def _buildIndex():
+    """Fills _index from _instruments, this is done once on import"""
+    for instrument in _instruments:
+        for product, dataset in instrument['datasets'].items():
+            dataset = dataset if isinstance(dataset, dict) else {'dataloc': dataset}
+            record = {'name': instrument['name'],
+                      'gname': dataset.get('gname', instrument.get('gname', instrument['name'])),
+                      'product': product,
+                      'dataloc': dataset['dataloc'],
+                      'depth': instrument.get('depth'),
+                      'location': instrument.get('location'),
+                      'deployments': instrument.get('deployments'),
+                      'cadence': instrument.get('cadence'),
+                      'variables': dict(variableNames, **instrument.get('variables', {})), }
+            for alias in dataset.get('aliases', []):  # product specific aliases win
+                _index[(product, _aliasKey(alias))] = record
+            for alias in list(instrument['aliases']) + [instrument['name']]:
+                _index.setdefault((product, _aliasKey(alias)), record)
+
+
+_buildIndex()
+
+
+def lookup(product, alias):
+    """Finds an instrument
+
+    Args:
+        product (str): one of 'waves', 'waterLevel', 'currents', 'wind', 'altimeter', 'modelWaves'
+        alias (str, int): gauge number or name
+
+    Returns:
+        dictionary with keys
+            'name': instrument key
+
+            'gname': descriptive gauge name
+
+            'product': product
+
+            'dataloc': dataset path on the THREDDS server (after the server and 'FRF/' or 'frf/')
+
+            'depth': nominal depth [m] (None if unknown)
+
+            'location': nominal location eg. {'xFRF': 200.} (None if unknown)
+
+            'deployments': list of (start, end) datetimes (None if unknown)
+
+            'cadence': nominal sampling interval [s] (None if unknown)
+
+            'variables': variable name variants {key: (name, ...)}
+
+    """
+    try:
+        return _index[(product, _aliasKey(alias))]
+    except KeyError:
+        raise NameError('Bad Gauge name {} for {}, specify one of {}'.format(alias, product, names(product)))
+
+
+def names(product):
+    """Returns the instrument names that have the product"""
+    return sorted(set(record['name'] for (prod, _), record in _index.items() if prod == product))
+
+
+def isDeployed(record, time):
+    """Checks a time against the deployments of an instrument record, instruments with unknown deployments are
+    always assumed to be deployed
+
+    Args:
+        record (dict): instrument record from lookup
+        time (datetime): time of interest
+
+    Returns:
+        bool
+
+    """
+    if record['deployments'] is None:
+        return True
+    return any(start <= time and (end is None or time <= end) for start, end in record['deployments'])
+
+
+def ncVariable(ncfile, key, record=None):
+    """Returns the variable of a netCDF file under the first of its name variants that is in the file
+
+    Args:
+        ncfile (netCDF4.Dataset): open file
+        key (str): generic variable name eg. 'lat'
+        record (dict): instrument record with its own variants (default=None, use variableNames)
+
+    Returns:
+        netCDF4.Variable
+
+    """
+    variants = (record['variables'] if record is not None else variableNames).get(key, (key,))
+    for name in variants:
+        if name in ncfile.variables:
+            return ncfile[name]
+    raise KeyError('none of {} are in the file'.format(variants))
+
+
+class locationStore:
+    """Gauge locations kept in SQLite as time intervals.
+
+    Each harvest of a gauge location at time T is valid for [T - window, T + window].  A harvest that finds a gauge
+    where an overlapping interval already has it extends that interval, so a gauge that did not move is one row no
+    matter how often it is asked for.  Gauges that were not on the server are kept as rows without coordinates, so
+    they are not asked for again within the window.  Writes are done in immediate transactions, so many processes can
+    update the same store at once.
+
+    """
+
+    columns = ('lat', 'lon', 'spE', 'spN', 'xFRF', 'yFRF')
+    header = b'SQLite format 3\x00'  # first bytes of an SQLite file
+
+    def __init__(self, fname, timeout=60):
+        """Opens (creating on first use) a location store
+
+        Args:
+            fname (str): SQLite file of the store
+            timeout (float): seconds to wait for other processes writing to the store (default=60)
+
+        """
+        self.fname = fname
+        self.db = sqlite3.connect(fname, timeout=timeout, isolation_level=None)  # transactions are explicit
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS locations (gauge TEXT, start REAL, end REAL, '
+                        'lat REAL, lon REAL, spE REAL, spN REAL, xFRF REAL, yFRF REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS gaugeTime ON locations (gauge, start, end)')
+
+    def close(self):
+        """Closes the connection to the store"""
+        self.db.close()
+
+    def __enter__(self):
+        """Used as a context manager, the store is closed on exit"""
+        return self
+
+    def __exit__(self, *args):
+        """Closes the store"""
+        self.close()
+
+    @classmethod
+    def isStore(cls, fname):
+        """True if fname is missing, empty or an SQLite file, False otherwise (eg. a pickle of earlier versions)"""
+        if not os.path.isfile(fname) or os.path.getsize(fname) == 0:
+            return True
+        with open(fname, 'rb') as fid:
+            return fid.read(len(cls.header)) == cls.header
+
+    def importPickle(self, fname, window):
+        """Adds the locations of a pickle written by earlier versions of get_sensor_locations
+
+        Args:
+            fname (str): pickle of {datetime: {gauge: {'lat', 'lon', 'spE', 'spN', 'xFRF', 'yFRF'}}}
+            window (float): seconds either side of each time that its locations are valid for
+
+        Returns:
+            number of times imported
+
+        """
+        with open(fname, 'rb') as fid:
+            legacy = pickle.load(fid)
+        for timestamp, locations in sorted(legacy.items()):
+            self.add(locations, calendar.timegm(timestamp.timetuple()), window)
+        return len(legacy)
+
+    def locations(self, gauges, epochTime):
+        """Finds where gauges were at a time
+
+        Args:
+            gauges (list): gauge names
+            epochTime (float): time of interest in seconds since 1970-01-01
+
+        Returns:
+            dictionary {gauge: {'lat', 'lon', 'spE', 'spN', 'xFRF', 'yFRF'}} of the gauges in the store at that time,
+            an empty dictionary for gauges that are known not to be on the server
+
+        """
+        epochTime = float(epochTime)  # numpy numbers are not sqlite types
+        out = {}
+        for gauge in gauges:
+            row = self.db.execute('SELECT {} FROM locations WHERE gauge = ? AND start <= ? AND ? <= end '
+                                  'ORDER BY start DESC LIMIT 1'.format(', '.join(self.columns)),
+                                  (str(gauge), epochTime, epochTime)).fetchone()
+            if row is not None:
+                out[gauge] = dict(zip(self.columns, row)) if row[0] is not None else {}
+        return out
+
+    def add(self, locations, epochTime, window, tolerance=1.0):
+        """Adds harvested locations
+
+        Args:
+            locations (dict): {gauge: {'lat', 'lon', 'spE', 'spN', 'xFRF', 'yFRF'}} harvested at epochTime, an empty
+                dictionary for a gauge that is not on the server
+            epochTime (float): time of the harvest in seconds since 1970-01-01
+            window (float): seconds either side of epochTime that the locations are valid for
+            tolerance (float): an interval that overlaps the new one is extended when the gauge is within this many
+                meters (in FRF coordinates) of it (default=1.0)
+
+        """
+        start, end = float(epochTime) - window, float(epochTime) + window
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            for gauge, loc in locations.items():
+                if not loc:  # not on the server, extend an overlapping entry without coordinates
+                    row = self.db.execute('SELECT rowid, start, end FROM locations WHERE gauge = ? AND start <= ? AND '
+                                          '? <= end AND xFRF IS NULL ORDER BY start LIMIT 1',
+                                          (str(gauge), end, start)).fetchone()
+                else:
+                    row = self.db.execute('SELECT rowid, start, end FROM locations WHERE gauge = ? AND start <= ? AND '
+                                          '? <= end AND abs(xFRF - ?) <= ? AND abs(yFRF - ?) <= ? ORDER BY start '
+                                          'LIMIT 1', (str(gauge), end, start, loc['xFRF'], tolerance, loc['yFRF'],
+                                                      tolerance)).fetchone()
+                if row is not None:
+                    self.db.execute('UPDATE locations SET start = ?, end = ? WHERE rowid = ?',
+                                    (min(start, row[1]), max(end, row[2]), row[0]))
+                else:
+                    self.db.execute('INSERT INTO locations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (str(gauge), start, end) + tuple(float(loc[key]) if loc else None
+                                                                     for key in self.columns))
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
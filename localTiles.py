@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Local stores of static (historical) products, so they are only pulled from the THREDDS server once.
+
+tileStore: memory-mapped tiles of static 2D gridded products (eg. the regional background DEM).  Each 2D variable of
+a remote netCDF file is kept as square blocks saved in .npy files with an index file that holds the grid shape, tile
+size and the 1D coordinate axes.  Tiles are downloaded the first time they are touched, so the store fills up with
+only the regions that are used.  Windows that fall in a single tile are returned as views of the memory-mapped file
+(no copy), other windows are assembled from the tiles that cover them.
+
+imageStore: Argus images kept in a local netCDF (HDF5) file as uint8 frames, compressed in one chunk per frame and
+indexed by the full time axis of the server product, so any cached frame is read (and decompressed) on its own without
+touching the server.  The time axis is unlimited, frames published on the server later are appended to it.
+
+"""
+import os
+import pickle
+import numpy as np
+import netCDF4 as nc
+
+
+class tileStore:
+    """Memory-mapped tiles of 2D variables on a shared [y, x] grid."""
+
+    indexName = 'tileIndex.pkl'
+
+    def __init__(self, tileDir, ncfileURL=None, variables=None, axes=None, tileSize=512):
+        """Opens a tile store, creating the index from ncfileURL if this is the first time the store is used.
+
+        Args:
+            tileDir (str): folder where tiles and the tile index are kept
+            ncfileURL (str): url (or file name) of the netCDF file with the 2D variables, only needed when tiles are
+                missing (Default value = None)
+            variables (list): names of 2D variables to keep, all variables share the same [y, x] shape, needed on
+                first use (Default value = None)
+            axes (dict): name: function(ncfile) of 1D coordinate axes to keep in the index, eg. the first row of a 2D
+                coordinate (Default value = None)
+            tileSize (int): number of grid nodes on each side of a tile (Default value = 512)
+
+        """
+        self.tileDir = tileDir
+        self.ncfileURL = ncfileURL
+        self._ncfile = None
+        indexFile = os.path.join(tileDir, self.indexName)
+        if os.path.isfile(indexFile):
+            with open(indexFile, 'rb') as fid:
+                self.index = pickle.load(fid)
+        else:
+            assert ncfileURL is not None and variables is not None, 'a new tile store needs ncfileURL and variables'
+            if not os.path.exists(tileDir):
+                os.makedirs(tileDir)
+            ncfile = self._getncfile()
+            self.index = {'url': ncfileURL,
+                          'shape': ncfile[variables[0]].shape,
+                          'tileSize': tileSize,
+                          'variables': list(variables),
+                          'dtypes': {var: np.dtype(ncfile[var].dtype).str for var in variables},
+                          'axes': {}}
+            if axes is not None:
+                for name, getAxis in axes.items():
+                    self.index['axes'][name] = np.array(getAxis(ncfile))
+            self._atomicWrite(indexFile, lambda fid: pickle.dump(self.index, fid))
+
+    def _getncfile(self):
+        """Opens the remote file on first use"""
+        if self._ncfile is None:
+            self._ncfile = nc.Dataset(self.ncfileURL if self.ncfileURL is not None else self.index['url'])
+        return self._ncfile
+
+    @staticmethod
+    def _atomicWrite(fname, writer):
+        """Writes to a temporary file then renames it, so other processes never see a partial file"""
+        tmpName = fname + '.{}.tmp'.format(os.getpid())
+        with open(tmpName, 'wb') as fid:
+            writer(fid)
+        os.replace(tmpName, fname)
+
+    def axis(self, name):
+        """Returns a 1D coordinate axis kept in the index"""
+        return self.index['axes'][name]
+
+    def _tileFile(self, var, tj, ti):
+        return os.path.join(self.tileDir, '{}_{:04d}_{:04d}.npy'.format(var, tj, ti))
+
+    def _tileSlices(self, tj, ti):
+        ts = self.index['tileSize']
+        ny, nx = self.index['shape']
+        return slice(tj * ts, min((tj + 1) * ts, ny)), slice(ti * ts, min((ti + 1) * ts, nx))
+
+    def getTile(self, var, tj, ti):
+        """Returns a memory-mapped tile, downloading it first if it is not in the store
+
+        Args:
+            var (str): variable name
+            tj (int): tile row
+            ti (int): tile column
+
+        Returns:
+            read only memory-mapped array of the tile, fill values are NaN for floating point variables
+
+        """
+        fname = self._tileFile(var, tj, ti)
+        if not os.path.isfile(fname):
+            ys, xs = self._tileSlices(tj, ti)
+            data = self._getncfile()[var][ys, xs]
+            if np.issubdtype(data.dtype, np.floating):
+                data = np.ma.filled(data, np.nan)
+            else:
+                data = np.ma.getdata(data)
+            self._atomicWrite(fname, lambda fid: np.save(fid, np.ascontiguousarray(data)))
+        return np.load(fname, mmap_mode='r')
+
+    def build(self, variables=None):
+        """Downloads all of the tiles, this is the one time local tiling of the whole product
+
+        Args:
+            variables (list): variables to tile (default is all variables in the index)
+
+        """
+        ts = self.index['tileSize']
+        ny, nx = self.index['shape']
+        for var in (variables or self.index['variables']):
+            for tj in range(int(np.ceil(ny / ts))):
+                for ti in range(int(np.ceil(nx / ts))):
+                    self.getTile(var, tj, ti)
+
+    def getWindow(self, var, ys, xs):
+        """Gets a [y, x] window of a variable from local tiles
+
+        Args:
+            var (str): variable name
+            ys (slice): rows of the window (unit step)
+            xs (slice): columns of the window (unit step)
+
+        Returns:
+            masked array of the window, the data are a view of the memory-mapped tile when the window is inside of
+            a single tile
+
+        """
+        ts = self.index['tileSize']
+        ny, nx = self.index['shape']
+        y0, y1, _ = ys.indices(ny)
+        x0, x1, _ = xs.indices(nx)
+        tRows = range(y0 // ts, (max(y1, y0 + 1) - 1) // ts + 1)
+        tCols = range(x0 // ts, (max(x1, x0 + 1) - 1) // ts + 1)
+        if len(tRows) == 1 and len(tCols) == 1:  # zero copy
+            tj, ti = tRows[0], tCols[0]
+            out = self.getTile(var, tj, ti)[y0 - tj * ts:y1 - tj * ts, x0 - ti * ts:x1 - ti * ts]
+        else:
+            out = np.empty((y1 - y0, x1 - x0), dtype=np.dtype(self.index['dtypes'][var]))
+            for tj in tRows:
+                for ti in tCols:
+                    tys, txs = self._tileSlices(tj, ti)
+                    oy0, oy1 = max(y0, tys.start), min(y1, tys.stop)
+                    ox0, ox1 = max(x0, txs.start), min(x1, txs.stop)
+                    out[oy0 - y0:oy1 - y0, ox0 - x0:ox1 - x0] = \
+                        self.getTile(var, tj, ti)[oy0 - tys.start:oy1 - tys.start, ox0 - txs.start:ox1 - txs.start]
+        if np.issubdtype(out.dtype, np.floating):
+            return np.ma.masked_invalid(out, copy=False)
+        return np.ma.array(out, copy=False)
+
+
+class imageStore:
+    """Local, compressed store of Argus image frames [t, x, y, rgb] with random access by time.
+
+    The store is opened read only, and re-opened for writing only when frames are added.  Use it as a context manager
+    (or call close) so the file is not left open.
+
+    Example:
+        with imageStore('argus_timex.nc') as store:
+            frames = store.getFrames(idx)
+
+    """
+
+    def __init__(self, fname):
+        """Opens an image store, the store file is created with create on first use
+
+        Args:
+            fname (str): netCDF file name of the store
+
+        """
+        self.fname = fname
+        self.ncfile = None
+        self.mode = 'r'
+        if os.path.isfile(fname):
+            self.ncfile = nc.Dataset(fname, self.mode)
+
+    def __enter__(self):
+        """Used as a context manager, the store is closed on exit"""
+        return self
+
+    def __exit__(self, *args):
+        """Closes the store"""
+        self.close()
+
+    def close(self):
+        """Closes the netCDF file of the store"""
+        if self.ncfile is not None:
+            self.ncfile.close()
+            self.ncfile = None
+
+    def _writable(self):
+        """Re-opens the store for writing"""
+        if self.mode != 'a':
+            self.ncfile.close()
+            self.ncfile = nc.Dataset(self.fname, 'a')
+            self.mode = 'a'
+
+    @property
+    def exists(self):
+        """True once the store has been created"""
+        return self.ncfile is not None
+
+    def create(self, remote, allEpoch):
+        """Creates the store with the same time axis and image size as the server product, no frames are copied
+
+        Args:
+            remote (netCDF4.Dataset): server product with 'x', 'y' and 'Ip' [t, x, y, rgb]
+            allEpoch (array): (rounded) epoch times of all frames on the server
+
+        """
+        self.close()
+        folder = os.path.dirname(self.fname)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        tmpName = self.fname + '.{}.tmp'.format(os.getpid())
+        shape = remote['Ip'].shape
+        ncfile = nc.Dataset(tmpName, 'w')
+        ncfile.createDimension('time', None)  # unlimited, frames published later are appended (see extend)
+        ncfile.createDimension('x', shape[1])
+        ncfile.createDimension('y', shape[2])
+        ncfile.createDimension('rgb', shape[3])
+        ncfile.createVariable('time', 'f8', ('time',))[:] = allEpoch
+        ncfile.createVariable('x', 'f8', ('x',))[:] = remote['x'][:]
+        ncfile.createVariable('y', 'f8', ('y',))[:] = remote['y'][:]
+        ncfile.createVariable('cached', 'u1', ('time',), fill_value=0)
+        # one compressed chunk per frame, chunks that were never written take no space
+        ncfile.createVariable('Ip', 'u1', ('time', 'x', 'y', 'rgb'), zlib=True, complevel=4, shuffle=True,
+                              chunksizes=(1,) + tuple(shape[1:]))
+        ncfile.close()
+        os.replace(tmpName, self.fname)
+        self.mode = 'r'
+        self.ncfile = nc.Dataset(self.fname, self.mode)
+
+    def allEpoch(self):
+        """Returns the epoch times of all frames of the server product"""
+        return self.ncfile['time'][:]
+
+    def extend(self, allEpoch):
+        """Appends frames that were published on the server after the store was made to the time axis
+
+        Args:
+            allEpoch (array): (rounded) epoch times of all frames on the server
+
+        Returns:
+            False if the server time axis does not start with the time axis of the store (or the store has a fixed
+            time axis), then the store needs to be created again
+
+        """
+        stored = np.ma.getdata(self.allEpoch())
+        allEpoch = np.ma.getdata(np.asarray(allEpoch))
+        if allEpoch.size < stored.size or not np.array_equal(allEpoch[:stored.size], stored):
+            return False
+        if allEpoch.size > stored.size:
+            if not self.ncfile.dimensions['time'].isunlimited():
+                return False
+            self._writable()
+            self.ncfile['time'][stored.size:] = allEpoch[stored.size:]
+            self.ncfile.sync()
+        return True
+
+    def isCached(self, idx):
+        """Returns a boolean array of which time indices are already in the store"""
+        return np.ma.filled(self.ncfile['cached'][np.atleast_1d(idx)], 0).astype(bool)
+
+    def add(self, remote, idx, batchSize=24):
+        """Copies frames from the server into the store
+
+        Args:
+            remote (netCDF4.Dataset): server product
+            idx (array): time indices to copy
+            batchSize (int): number of frames per server request (default=24)
+
+        """
+        idx = np.atleast_1d(idx)
+        self._writable()
+        for b0 in range(0, idx.size, batchSize):
+            batch = idx[b0:b0 + batchSize].tolist()
+            self.ncfile['Ip'][batch] = np.ma.getdata(remote['Ip'][batch]).astype(np.uint8, copy=False)
+            self.ncfile['cached'][batch] = 1
+        self.ncfile.sync()
+
+    def getFrames(self, idx, xs=slice(None), ys=slice(None)):
+        """Reads frames from the store
+
+        Args:
+            idx (array): time indices (must be cached)
+            xs (slice): cross-shore window
+            ys (slice): alongshore window
+
+        Returns:
+            uint8 array of frames [t, x, y, rgb]
+
+        """
+        idx = np.atleast_1d(idx)
+        if idx.size > 1 and (np.diff(idx) == 1).all():
+            return np.ma.getdata(self.ncfile['Ip'][int(idx[0]):int(idx[-1]) + 1, xs, ys])
+        return np.ma.getdata(self.ncfile['Ip'][idx.tolist(), xs, ys])
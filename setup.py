@@ -8,5 +8,7 @@ setup(name='GetDataTestbed',
                    '(CMTB)'),
       author='Spicer Bak',
       modules=['getDataFRF', 'getOutsideData', 
-               'download_grid_data'],
+               'download_grid_data', 'gridInterp',
+               'localTiles', 'skillStats', 'instruments'],
+      install_requires=['numpy', 'pandas', 'netCDF4', 'scipy'],
      )
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Observation vs model skill statistics for many variables and stations at once.
+
+All of the statistics (bias, RMSE, scatter index, correlation and skill) are built from six running sums of the
+time-matched pairs (count, obs, model, obs^2, model^2, obs*model).  Invalid pairs (masked or NaN in either array) add
+nothing to the sums, so no pair is dropped with a python loop, and rolling or seasonal statistics are sums over windows
+of the same per-record terms (a difference of cumulative sums, or a sum over each group).
+
+Inputs are time-matched [time, station] arrays (eg. stacked outputs of getPlotData.CMSF_pairData or
+getDataTestBed.getModelStations with the gauge records).
+
+"""
+import numpy as np
+import pandas as pd
+
+metrics = ['count', 'bias', 'RMSE', 'RMSEdemeaned', 'scatterIndex', 'corr', 'skill']
+
+
+def _pairTerms(observations, model):
+    """Creates the per-record terms of the sums for each valid pair
+
+    The data are shifted by the mean of the valid observations of each station before they are squared, so sums over
+    long records do not lose precision (none of the statistics change with a common shift, the shift is added back
+    for the mean of the observations).
+
+    Args:
+        observations (array): [time, ...] observations, masked or NaN where there are no data
+        model (array): [time, ...] model values on the same times
+
+    Returns:
+        terms (array): [6, time, ...] count, obs, model, obs^2, model^2 and obs*model of each record (0 if invalid)
+        shift (array): [...] mean of the valid observations
+
+    """
+    obs = np.ma.masked_invalid(np.ma.asarray(observations, dtype=float))
+    mod = np.ma.masked_invalid(np.ma.asarray(model, dtype=float))
+    assert obs.shape == mod.shape, 'observations and model must be time matched (the same shape)'
+    valid = ~(np.ma.getmaskarray(obs) | np.ma.getmaskarray(mod))
+    count = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(valid, obs.filled(0), 0).sum(axis=0) / np.where(count > 0, count, np.nan)
+    shift = np.nan_to_num(shift)
+    o = np.where(valid, obs.filled(0) - shift, 0)
+    m = np.where(valid, mod.filled(0) - shift, 0)
+    return np.stack((valid.astype(float), o, m, o * o, m * m, o * m)), shift
+
+
+def _statsFromSums(sums, shift, minCount=2):
+    """Turns the six sums into statistics
+
+    Args:
+        sums (array): [6, ...] sums of the terms from _pairTerms
+        shift (array): mean observation used for the shift, broadcast against sums[0]
+        minCount (int): statistics with fewer valid pairs than this are NaN (default=2)
+
+    Returns:
+        dictionary of arrays [...] keyed by metric
+
+    """
+    n, so, sm, soo, smm, som = sums
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = np.where(n >= minCount, n, np.nan)
+        bias = (sm - so) / n
+        mse = np.maximum((smm - 2 * som + soo) / n, 0)
+        varObs = soo - so ** 2 / n  # n times the variance
+        varMod = smm - sm ** 2 / n
+        rmseDemeaned = np.sqrt(np.maximum(mse - bias ** 2, 0))
+        stats = {'count': np.nan_to_num(sums[0]).astype(int),
+                 'bias': bias,
+                 'RMSE': np.sqrt(mse),
+                 'RMSEdemeaned': rmseDemeaned,
+                 'scatterIndex': rmseDemeaned / np.abs(so / n + shift),
+                 'corr': (som - so * sm / n) / np.sqrt(varObs * varMod),
+                 'skill': 1 - n * mse / varObs, }
+    return stats
+
+
+def skillStatistics(observations, model, minCount=2):
+    """Computes bias, RMSE, demeaned RMSE, scatter index, correlation and skill over the whole record
+
+    Args:
+        observations (array): [time, ...] observations (masked or NaN where there are no data)
+        model (array): [time, ...] time-matched model values
+        minCount (int): stations with fewer valid pairs get NaN statistics (default=2)
+
+    Returns:
+        dictionary keyed by metric of arrays [...] (eg. [station]):
+            'count': number of valid pairs
+
+            'bias': mean(model - obs)
+
+            'RMSE': root mean square error
+
+            'RMSEdemeaned': RMSE with the bias removed
+
+            'scatterIndex': RMSEdemeaned / |mean(obs)|
+
+            'corr': correlation coefficient
+
+            'skill': 1 - MSE / variance(obs)
+
+    """
+    terms, shift = _pairTerms(observations, model)
+    return _statsFromSums(terms.sum(axis=1), shift, minCount=minCount)
+
+
+def rollingSkillStatistics(observations, model, window, minCount=2):
+    """Computes the statistics over a moving window of records with cumulative sums
+
+    Args:
+        observations (array): [time, ...] observations
+        model (array): [time, ...] time-matched model values
+        window (int): number of records in each window
+        minCount (int): windows with fewer valid pairs get NaN statistics (default=2)
+
+    Returns:
+        dictionary keyed by metric of arrays [time - window + 1, ...], the statistics of records [i, i + window)
+
+    """
+    terms, shift = _pairTerms(observations, model)
+    cumulative = np.cumsum(terms, axis=1)
+    cumulative = np.concatenate((np.zeros_like(cumulative[:, :1]), cumulative), axis=1)
+    return _statsFromSums(cumulative[:, window:] - cumulative[:, :-window], shift, minCount=minCount)
+
+
+def _periodIndex(time, period):
+    """Labels of each record for seasonal statistics
+
+    Args:
+        time (array): epoch times or datetimes of the records
+        period (str): 'month', 'season' (DJF, MAM, JJA, SON) or 'year'
+
+    Returns:
+        labels (array), group index of each record (array)
+
+    """
+    time = np.asarray(time)
+    if np.issubdtype(time.dtype, np.number):
+        time = pd.to_datetime(time, unit='s')
+    else:
+        time = pd.to_datetime([str(tt) for tt in time])
+    if period == 'month':
+        key = np.asarray(time.month)
+    elif period == 'season':
+        key = np.asarray(time.month) % 12 // 3  # 0: DJF, 1: MAM, 2: JJA, 3: SON
+    elif period == 'year':
+        key = np.asarray(time.year)
+    else:
+        raise NotImplementedError('period must be one of month, season or year')
+    labels, groups = np.unique(key, return_inverse=True)
+    if period == 'season':
+        labels = np.array(['DJF', 'MAM', 'JJA', 'SON'])[labels]
+    return labels, groups
+
+
+def periodSkillStatistics(observations, model, time, period='season', minCount=2):
+    """Computes the statistics for each month, season or year (eg. all winters of a hindcast together)
+
+    Args:
+        observations (array): [time, ...] observations
+        model (array): [time, ...] time-matched model values
+        time (array): epoch times or datetimes of the records
+        period (str): 'month', 'season' (DJF, MAM, JJA, SON) or 'year' (default='season')
+        minCount (int): periods with fewer valid pairs get NaN statistics (default=2)
+
+    Returns:
+        labels (array) of each period, dictionary keyed by metric of arrays [period, ...]
+
+    """
+    terms, shift = _pairTerms(observations, model)
+    labels, groups = _periodIndex(time, period)
+    sums = np.zeros((terms.shape[0], labels.size) + terms.shape[2:])
+    np.add.at(sums, (slice(None), groups), terms)
+    return labels, _statsFromSums(sums, shift, minCount=minCount)
+
+
+def skillTable(pairs, stations=None, time=None, period=None, minCount=2):
+    """Scores many variables and stations at once and returns one compact table
+
+    Args:
+        pairs (dict): {variable: (observations, model)} of time-matched [time, station] arrays (a 1D pair is one
+            station)
+        stations (list): station names for the columns of the arrays (default=None, numbered)
+        time (array): epoch times or datetimes of the records, needed with period (default=None)
+        period (str): None for the whole record, or 'month', 'season' or 'year' (default=None)
+        minCount (int): fewer valid pairs than this gives NaN statistics (default=2)
+
+    Returns:
+        pandas.DataFrame with a row for each variable, station (and period) and a column for each metric
+
+    """
+    rows, index = [], []
+    for var, (observations, model) in pairs.items():
+        observations = np.ma.asarray(observations)
+        model = np.ma.asarray(model)
+        if observations.ndim == 1:
+            observations, model = observations[:, np.newaxis], model[:, np.newaxis]
+        names = stations if stations is not None else list(range(observations.shape[1]))
+        assert len(names) == observations.shape[1], 'there must be a station name for each column of %s' % var
+        if period is None:
+            stats = skillStatistics(observations, model, minCount=minCount)
+            for ss, station in enumerate(names):
+                index.append((var, station))
+                rows.append([stats[metric][ss] for metric in metrics])
+        else:
+            labels, stats = periodSkillStatistics(observations, model, time, period=period, minCount=minCount)
+            for ss, station in enumerate(names):
+                for pp, label in enumerate(labels):
+                    index.append((var, station, label))
+                    rows.append([stats[metric][pp, ss] for metric in metrics])
+    names = ['variable', 'station'] if period is None else ['variable', 'station', period]
+    return pd.DataFrame(rows, index=pd.MultiIndex.from_tuples(index, names=names), columns=metrics)
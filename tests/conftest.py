@@ -0,0 +1,13 @@
+"""Makes the repository importable as the getdatatestbed package when it is not installed."""
+import importlib.util
+import os
+import sys
+
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if importlib.util.find_spec('getdatatestbed') is None:
+    spec = importlib.util.spec_from_file_location('getdatatestbed', os.path.join(repoRoot, '__init__.py'),
+                                                  submodule_search_locations=[repoRoot])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['getdatatestbed'] = package
+    spec.loader.exec_module(package)
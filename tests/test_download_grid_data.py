@@ -0,0 +1,181 @@
+"""Tests of download_grid_data against local stand-ins of the FRF survey services."""
+import calendar
+import datetime as DT
+import gzip
+import http.server
+import io
+import json
+import re
+import threading
+import urllib.parse
+import zipfile
+
+import pytest
+
+from getdatatestbed import download_grid_data as DGD
+
+
+def _surveyText(survey_filename):
+    """Contents of the survey file served for survey_filename"""
+    return ('x,y,z\n1.0,2.0,-%d.5\n' % len(survey_filename)).encode()
+
+
+class _gpHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in for the Download Source Data GPServer task: submitJob, job status, results and the zip files"""
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        """Submits a job, objectid 'down' answers as a service that is down"""
+        form = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        objectid = form['objectid'][0]
+        if objectid == 'down':
+            return self._json({'error': 'down'}, status=503)
+        with self.server.lock:
+            jobId = 'job%d' % len(self.server.jobs)
+            self.server.jobs[jobId] = objectid
+        self._json({'jobId': jobId, 'jobStatus': 'esriJobSubmitted'})
+
+    def do_GET(self):
+        """Job status, job results and the zip files of the results"""
+        path = urllib.parse.urlsplit(self.path).path.split('/')
+        if path[1] == 'files':  # /files/<jobId>.zip
+            survey_filename = self.server.jobs[path[2][:-len('.zip')]]
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w') as z:
+                z.writestr(survey_filename + '.gz', gzip.compress(_surveyText(survey_filename)))
+            body = archive.getvalue()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif len(path) == 3:  # /jobs/<jobId>
+            self._json({'jobId': path[2], 'jobStatus': 'esriJobSucceeded',
+                        'results': {'Output_File': {'paramUrl': 'results/Output_File'}}})
+        else:  # /jobs/<jobId>/results/Output_File
+            self._json({'value': {'url': 'http://127.0.0.1:%d/files/%s.zip'
+                                  % (self.server.server_address[1], path[2])}})
+
+    def log_message(self, *args):
+        """Keeps the test output quiet"""
+
+
+@pytest.fixture
+def gpServer():
+    """Local http server standing in for the GPServer job endpoints"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _gpHandler)
+    server.jobs, server.lock = {}, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_surveys_against_a_local_gpserver(gpServer, tmpdir):
+    taskURL = 'http://127.0.0.1:%d' % gpServer.server_address[1]
+    # objectid is sent back as the survey file name by the stand-in, two jobs share a file name
+    objectids = ['FRF_20200101_1.txt', 'down', 'FRF_20200102_2.txt', 'FRF_20200101_1.txt']
+    out = DGD.download_surveys(objectids, objectids, str(tmpdir), workers=4, task_url=taskURL, maxPollInterval=0.5)
+
+    assert out[1] is None  # the failed submit does not stop the batch
+    for objectid, fname in zip(objectids, out):
+        if objectid == 'down':
+            continue
+        assert fname == str(tmpdir.join(objectid))
+        with open(fname, 'rb') as fid:
+            assert fid.read() == _surveyText(objectid)
+    assert sorted(name.basename for name in tmpdir.listdir()) == ['FRF_20200101_1.txt', 'FRF_20200102_2.txt']
+
+
+def test_download_survey_raises_when_the_service_is_down(gpServer, tmpdir):
+    taskURL = 'http://127.0.0.1:%d' % gpServer.server_address[1]
+    with pytest.raises(IOError):
+        DGD.download_survey('down', 'FRF_20200101_1.txt', str(tmpdir), task_url=taskURL)
+
+
+class _featureService:
+    """Stand-in for the survey feature service query endpoint, used in place of urlopen"""
+
+    def __init__(self, features):
+        self.features = features
+        self.queries = []
+
+    def urlopen(self, url, timeout=None):
+        """Answers a query url like the feature service: filtered on SURVEYDATE, sorted, paged"""
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).items()}
+        self.queries.append(query)
+        features = sorted(self.features, key=lambda att: (att['SURVEYDATE'], att['OBJECTID']))
+        since = re.search(r"SURVEYDATE (>=?) timestamp '([^']+)'", query['where'])
+        if since is not None:
+            epoch = 1000 * calendar.timegm(DT.datetime.strptime(since.group(2), '%Y-%m-%d %H:%M:%S').timetuple())
+            features = [att for att in features
+                        if att['SURVEYDATE'] > epoch or (since.group(1) == '>=' and att['SURVEYDATE'] == epoch)]
+        offset = int(query.get('resultOffset', 0))
+        count = int(query.get('resultRecordCount', len(features)))
+        page = {'features': [{'attributes': att} for att in features[offset:offset + count]],
+                'exceededTransferLimit': offset + count < len(features)}
+        return io.BytesIO(json.dumps(page).encode())
+
+
+def _survey(objectid, date):
+    """Attributes of a survey on the feature service"""
+    return {'OBJECTID': objectid, 'TEXTFILENAME': 'FRF_%d.txt' % objectid,
+            'SURVEYDATE': 1000 * calendar.timegm(date.timetuple())}
+
+
+def test_surveyCatalog_sync_pages_and_picks_up_surveys_on_the_newest_date(monkeypatch, tmpdir):
+    dates = [DT.datetime(2020, 1, day, 12) for day in (3, 1, 2, 5, 4)]
+    service = _featureService([_survey(objectid, date) for objectid, date in zip(range(10, 15), dates)])
+    monkeypatch.setattr(DGD.urllib.request, 'urlopen', service.urlopen)
+    catalogFile = str(tmpdir.join('catalog.pkl'))
+
+    catalog = DGD.surveyCatalog('http://surveys', catalogFile=catalogFile)
+    assert catalog.sync(pageSize=2) == 5
+    assert [int(query['resultOffset']) for query in service.queries] == [0, 2, 4]
+    assert catalog.objectid.tolist() == [11, 12, 10, 14, 13]  # sorted by survey date
+    assert (catalog.surveydate == sorted(catalog.surveydate)).all()
+
+    # a survey posted later on the newest date, and a newer one
+    service.features += [_survey(20, DT.datetime(2020, 1, 5, 12)), _survey(21, DT.datetime(2020, 1, 6))]
+    service.queries = []
+    catalog = DGD.surveyCatalog('http://surveys', catalogFile=catalogFile)  # from the file
+    assert catalog.sync(pageSize=2) == 2
+    assert ">= timestamp '2020-01-05 12:00:00'" in service.queries[0]['where']
+    assert catalog.objectid.tolist() == [11, 12, 10, 14, 13, 20, 21]
+    assert catalog.latestBefore(calendar.timegm(DT.datetime(2020, 1, 5, 18).timetuple())).tolist() == [4, 5]
+
+    assert catalog.sync(pageSize=2) == 0
+
+
+@pytest.mark.parametrize('contents', ['', '\n\n', 'Survey of the FRF\nx, y, z\n'])
+def test_read_survey_file_without_data_lines(tmpdir, contents):
+    fname = tmpdir.join('empty.txt')
+    fname.write(contents)
+    with pytest.raises(ValueError):
+        DGD.read_survey_file(str(fname), sidecar=False)
+
+
+def test_read_survey_file_header_with_a_year(tmpdir):
+    fname = tmpdir.join('FRF_20200101.txt')
+    fname.write('FRF survey 2020 of the pier\n\nxFRF, yFRF, elevation\n100.0, 2.0, -1.5\n110.0, 2.0, -2.0\n'
+                '120.0, 2.0, -2.5\n')
+    for _ in range(2):  # parsed, then from the sidecar
+        survey = DGD.read_survey_file(str(fname), chunkSize=16)
+        assert sorted(survey) == ['elevation', 'xFRF', 'yFRF']
+        assert survey['xFRF'].tolist() == [100., 110., 120.]
+        assert survey['elevation'].tolist() == [-1.5, -2.0, -2.5]
+
+
+def test_read_survey_file_text_columns(tmpdir):
+    fname = tmpdir.join('FRF_20200102.txt')
+    fname.write('Locality Profile xFRF elevation\nFRF 1 100.0 -1.5\nFRF 1 110.0 -2.0\n')
+    survey = DGD.read_survey_file(str(fname), sidecar=False)
+    assert survey['Locality'].tolist() == ['FRF', 'FRF']
+    assert survey['elevation'].tolist() == [-1.5, -2.0]
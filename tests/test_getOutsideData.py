@@ -0,0 +1,122 @@
+"""Tests of getOutsideData that run offline, on synthetic bulletins and a local http server."""
+import datetime as DT
+import http.server
+import io
+import threading
+
+import numpy as np
+import pytest
+
+from getdatatestbed import getOutsideData
+
+
+def _bulletin(times, frequencies, directions, spectra, station='44100', valuesPerLine=7):
+    """Writes a WAVEWATCH III spectral bulletin, spectra are [t, dir, freq] in the units on the server"""
+    lines = ["'WAVEWATCH III SPECTRA'     %d    %d     1 'spectral resolution for points'"
+             % (len(frequencies), len(directions))]
+    lines += [' '.join('%.3e' % ff for ff in frequencies[ii:ii + 8]) for ii in range(0, len(frequencies), 8)]
+    lines += [' '.join('%.4e' % dd for dd in directions[ii:ii + 7]) for ii in range(0, len(directions), 7)]
+    for time, spectrum in zip(times, spectra):
+        lines.append(time.strftime('%Y%m%d %H%M%S'))
+        lines.append("'%-10s'  284.30  36.20   26.0   8.68 171.3   0.00 270.0" % station)
+        values = spectrum.ravel()
+        lines += [' '.join('%.3e' % vv for vv in values[ii:ii + valuesPerLine])
+                  for ii in range(0, values.size, valuesPerLine)]
+    return '\n'.join(lines) + '\n'
+
+
+def test_parseWW3Spectra_converts_and_sorts_every_time(tmpdir):
+    times = [DT.datetime(2020, 1, 1) + DT.timedelta(hours=3 * ii) for ii in range(3)]
+    frequencies = np.array([0.05, 0.1, 0.2])
+    directions = np.deg2rad([90., 0., 270., 180.])  # oceanographic, not sorted
+    spectra = np.arange(len(times) * directions.size * frequencies.size, dtype=float).reshape(
+        len(times), directions.size, frequencies.size) / 100.
+    bulletin = _bulletin(times, frequencies, directions, spectra)
+
+    out = getOutsideData.parseWW3Spectra(bulletin)
+    assert out['buoyNum'] == 44100
+    assert (out['lon'], out['lat'], out['Depth']) == (284.3, 36.2, 26.)
+    assert list(out['time']) == times
+    assert np.allclose(out['wavefreqbin'], frequencies)
+    assert np.allclose(out['wavedirbin'], [0., 90., 180., 270.], atol=0.01)
+    # meteorological 0, 90, 180, 270 were oceanographic 180, 270, 0, 90: rows 3, 2, 1, 0 of the bulletin
+    expected = spectra[:, [3, 2, 1, 0], :].transpose(0, 2, 1) * 2 * np.pi / 180.
+    assert out['dWED'].shape == (3, 3, 4)
+    assert np.allclose(out['dWED'], expected, rtol=1e-3)
+
+    # the same answer from bytes, a stream and a file
+    fname = str(tmpdir.join('multi_1.44100.spec'))
+    with open(fname, 'w') as fid:
+        fid.write(bulletin)
+    for source in (bulletin.encode(), io.BytesIO(bulletin.encode()), fname):
+        assert np.allclose(getOutsideData.parseWW3Spectra(source)['dWED'], out['dWED'])
+
+
+class _bulletinHandler(http.server.BaseHTTPRequestHandler):
+    """Serves server.files (path: body) with an ETag, answers 304 when If-None-Match matches"""
+
+    def do_GET(self):
+        """Answers a GET request and records its headers"""
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path not in self.server.files:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.server.files[self.path]
+        etag = '"%d"' % hash(body)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keeps the test output quiet"""
+
+
+@pytest.fixture
+def bulletinServer():
+    """Local http server standing in for the NCEP bulletin server"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _bulletinHandler)
+    server.files, server.requests = {}, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_getCachedURL_revalidates_with_the_etag(bulletinServer, tmpdir):
+    url = 'http://127.0.0.1:%d/multi_1.44100.spec' % bulletinServer.server_address[1]
+    cacheFile = str(tmpdir.join('cache', 'multi_1.44100.spec'))
+    pool = getOutsideData.httpPool(timeout=5)
+    bulletinServer.files['/multi_1.44100.spec'] = b'first cycle'
+
+    assert getOutsideData.getCachedURL(url, cacheFile=cacheFile, pool=pool) == b'first cycle'
+    assert bulletinServer.requests[-1] == ('/multi_1.44100.spec', None)
+    with open(cacheFile, 'rb') as fid:
+        assert fid.read() == b'first cycle'
+
+    # unchanged on the server: a conditional request, answered from the cache
+    assert getOutsideData.getCachedURL(url, cacheFile=cacheFile, pool=pool) == b'first cycle'
+    assert bulletinServer.requests[-1][1] is not None
+
+    # changed on the server: the new file is sent and cached
+    bulletinServer.files['/multi_1.44100.spec'] = b'second cycle'
+    assert getOutsideData.getCachedURL(url, cacheFile=cacheFile, pool=pool) == b'second cycle'
+    with open(cacheFile, 'rb') as fid:
+        assert fid.read() == b'second cycle'
+
+    # without revalidation the server is not asked at all
+    nRequests = len(bulletinServer.requests)
+    assert getOutsideData.getCachedURL(url, cacheFile=cacheFile, pool=pool, revalidate=False) == b'second cycle'
+    assert len(bulletinServer.requests) == nRequests
+
+    assert getOutsideData.getCachedURL(url.replace('44100', '44056'), pool=pool) is None
+    assert not [name for name in tmpdir.join('cache').listdir() if name.basename.endswith('.tmp')]
@@ -0,0 +1,43 @@
+"""Tests of the CMS-Flow pairing in getPlotData, the observations are a local stand-in for getObs."""
+import numpy as np
+import pytest
+
+pytest.importorskip('testbedutils')
+from getdatatestbed import getPlotData  # noqa: E402
+
+
+def _fakeGetObs(obsTime):
+    """Builds a stand-in for getObs that returns one current meter record on obsTime"""
+    class fakeGetObs:
+        """Stand-in for getObs, with only getCurrents"""
+
+        def __init__(self, *args):
+            pass
+
+        def getCurrents(self, station):
+            """Returns a record at (10, 20) with U = V = the record number"""
+            return {'epochtime': obsTime, 'aveU': np.arange(obsTime.size, dtype=float),
+                    'aveV': np.arange(obsTime.size, dtype=float), 'xFRF': 10., 'yFRF': 20.}
+    return fakeGetObs
+
+
+def test_timeMatchIndex_keeps_close_pairs_inside_the_observations():
+    obsTime = np.arange(0, 3600 * 6, 3600.)
+    modTime = np.array([-3600., 0., 3600. + 60, 7200. + 1800, 3600. * 5, 3600. * 7])
+    modIdx, obsIdx = getPlotData.timeMatchIndex(obsTime, modTime)
+    assert modIdx.tolist() == [1, 2, 4]
+    assert obsIdx.tolist() == [0, 1, 5]
+
+
+def test_CMSF_pairData_drops_masked_model_steps(monkeypatch):
+    obsTime = np.arange(1.5e9, 1.5e9 + 3600 * 6, 3600.)
+    monkeypatch.setattr(getPlotData, 'getObs', _fakeGetObs(obsTime))
+    nodes = np.array([[0., 0.], [10., 20.], [50., 50.]])
+    aveE = np.ma.masked_array(np.ones((obsTime.size, 3)), mask=False)
+    aveE.mask[2, 1] = True  # one masked model step at the station node
+    aveE.mask[3, 0] = True  # masked at another node, the pair is kept
+    cmsfDict = {'time': obsTime, 'xFRF': nodes[:, 0], 'yFRF': nodes[:, 1], 'aveE': aveE,
+                'aveN': np.ma.masked_array(np.ones((obsTime.size, 3)))}
+    paired = getPlotData.CMSF_pairData(cmsfDict, ['adop-3.5m'])['adop-3.5m']
+    assert paired['aveEobs'].tolist() == [0., 1., 3., 4., 5.]
+    assert not np.ma.getmaskarray(paired['aveEmod']).any()